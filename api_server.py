@@ -0,0 +1,481 @@
+# HTTP/JSON API.
+# Lets any number of terminals (or other programs) work with the inventory
+# through one service instead of each holding its own database connection.
+# It runs the inventory_core operations, so the answers are the same as in
+# the window and the command line.
+#
+# The server is a single asyncio event loop; database calls run on a small
+# thread pool (POOL_SIZE threads, each borrowing from a connection pool), so a
+# slow query never holds up the other requests. GET responses carry an ETag
+# (If-None-Match gets a 304) and are cached for CACHE_TTL seconds; every write
+# through the API clears the cache, and identical GETs arriving together share
+# one database call. Writes made elsewhere show up once the TTL runs out.
+# Writes arriving together share one transaction and commit (group commit).
+#
+#   GET    /medicines?start=ID&limit=N    one page by id, with the id of the next one
+#   GET    /medicines/ID
+#   POST   /medicines                     JSON body: name, category, price, quantity, mfg_date, exp_date, supplier
+#   PUT    /medicines/ID                  same body, plus an optional reorder_point
+#   DELETE /medicines/ID
+#   GET    /medicines/ID/lots             lots, in the order they are dispensed
+#   POST   /medicines/ID/lots             receive a lot, JSON body: lot_number, quantity, exp_date
+#   POST   /medicines/ID/dispense         first-expired-first-out, JSON body: quantity
+#   GET    /search?q=TEXT
+#   GET    /expiry                        expired and expiring medicines
+#   GET    /low-stock
+#   GET    /history?ids=1,2&from=YYYY-MM-DD&to=YYYY-MM-DD
+#   GET    /metrics                       timings in Prometheus text format (see instrumentation.py)
+#
+# Reads accept ?days=N for the expiring-soon horizon.
+#
+#   python api_server.py --port 8765
+
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+import inventory_core
+from medicine_lots import LotError
+from db_config import DB_CONFIG, LOCAL_DB_PATH, STORAGE_MODE
+from inventory_queries import DEFAULT_EXPIRY_HORIZON
+
+HOST = "127.0.0.1"
+PORT = 8765
+POOL_SIZE = 8  # Database threads, each with its own connection
+CACHE_TTL = 2.0  # Seconds a GET response is served from memory
+PAGE_LIMIT = 200  # Default (and largest) page for /medicines
+MAX_BODY = 64 * 1024  # Largest request body accepted
+GROUP_COMMIT_MS = 2  # How long the first of a group of writes waits for others
+GROUP_LIMIT = 100  # Most writes committed together
+REASONS = {200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Database Pool ---
+store = None
+executor = None
+pool = None  # MySQL connection pool; SQLite keeps one connection per thread instead
+local = threading.local()
+local_path = None
+
+
+def init_database(storage_mode=None, local_db_path=None, pool_size=POOL_SIZE):
+    """Opens the backend. A replica serves from the MySQL server here, the API is where the writes go."""
+    global store, executor, pool, local_path
+    storage_mode = storage_mode or STORAGE_MODE
+    if storage_mode == "sqlite":
+        import sqlite_store
+        store, local_path = sqlite_store, local_db_path or LOCAL_DB_PATH
+        sqlite_store.connect(local_path).close()  # Creates the file up front
+    else:
+        from mysql.connector import pooling
+        import mysql_store
+        store = mysql_store
+        pool = pooling.MySQLConnectionPool(pool_name="api", pool_size=pool_size, **DB_CONFIG)
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-db")
+
+
+def run_job(job):
+    """Pool thread body: runs job(connection)."""
+    if pool is None:
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = store.connect(local_path)
+        return job(connection)
+    connection = pool.get_connection()
+    try:
+        return job(connection)
+    finally:
+        connection.close()  # Back to the pool
+
+
+def read_job(task):
+    """Runs a GET's task and encodes the answer, both off the event loop; returns (body, etag)."""
+    def job(connection):
+        cursor = instrumentation.timed_cursor(connection.cursor())
+        try:
+            body = encode(task(store, cursor))
+        finally:
+            cursor.close()
+        return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+    return job
+
+
+async def in_pool(job):
+    return await asyncio.get_running_loop().run_in_executor(executor, run_job, job)
+
+
+# --- Group Commit ---
+# Writes go through one writer on the event loop. The first write waits
+# GROUP_COMMIT_MS for others to arrive, and writes that arrive while a group
+# is committing wait for the next group. Each group is one transaction with a
+# single commit (store.run_group: a failing write is rolled back alone), so a
+# burst of writes from many clients costs one fsync instead of one each.
+# Only touched from the event loop thread, so no locking.
+pending_writes = []  # (operation, future) waiting for the next group
+writer = None  # Task committing groups while there are writes waiting
+
+
+async def grouped_write(operation):
+    """Runs operation(store, cursor) in the next group commit; returns its result or raises its error."""
+    global writer
+    future = asyncio.get_running_loop().create_future()
+    pending_writes.append((operation, future))
+    if writer is None:
+        writer = asyncio.ensure_future(commit_groups())
+    return await future
+
+
+async def commit_groups():
+    global writer
+    try:
+        await asyncio.sleep(GROUP_COMMIT_MS / 1000)
+        while pending_writes:
+            group = pending_writes[:GROUP_LIMIT]
+            del pending_writes[:GROUP_LIMIT]
+            operations = [lambda cursor, operation=operation: operation(store, cursor) for operation, _ in group]
+            try:
+                outcomes = await in_pool(lambda connection: store.run_group(connection, operations))
+            except Exception as err:  # The commit failed, so did every write in the group
+                outcomes = [(None, err)] * len(group)
+            for (_, future), (result, err) in zip(group, outcomes):
+                if future.done():  # The client went away
+                    continue
+                if err is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(err)
+    finally:
+        writer = None
+
+
+# --- Response Cache ---
+# Only touched from the event loop thread, so no locking
+cache = {}  # request target -> (expires, body, etag)
+in_flight = {}  # request target -> future of the read running for it
+cache_generation = 0  # Bumped by every write, reads started before it are not cached
+
+
+def invalidate():
+    global cache_generation
+    cache_generation += 1
+    cache.clear()
+
+
+async def cached_read(target, task):
+    """Body and ETag of a GET, from the cache or from one shared database call."""
+    entry = cache.get(target)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1], entry[2]
+    if target in in_flight:
+        return await asyncio.shield(in_flight[target])
+
+    future = asyncio.get_running_loop().create_future()
+    in_flight[target] = future
+    generation = cache_generation
+    try:
+        body, etag = await in_pool(read_job(task))
+        if generation == cache_generation:
+            cache[target] = (time.monotonic() + CACHE_TTL, body, etag)
+        future.set_result((body, etag))
+        return body, etag
+    except BaseException as err:
+        future.set_exception(err)
+        future.exception()  # Marks it retrieved when nobody else was waiting
+        raise
+    finally:
+        del in_flight[target]
+
+
+def encode(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+# --- Request Parsing ---
+def int_param(params, name, default=None):
+    value = params.get(name, [None])[0]
+    if value is None or value == "":
+        if default is None:
+            raise HTTPError(400, f"missing parameter {name!r}")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a whole number")
+
+
+def date_param(params, name):
+    value = params.get(name, [""])[0]
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a date (YYYY-MM-DD)")
+
+
+def json_object(body):
+    try:
+        data = json.loads(body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError
+    except ValueError:
+        raise HTTPError(400, "body must be a JSON object")
+    return data
+
+
+def medicine_values(body):
+    """(values, reorder_point) from a POST/PUT body, in the order inventory_core's writes take them.
+
+    reorder_point is inventory_core.UNCHANGED when the body has no such key;
+    an explicit null (or "") puts the medicine back on its category's.
+    """
+    data = json_object(body)
+    missing = [field for field in ("name", "price", "quantity", "mfg_date", "exp_date") if data.get(field) in (None, "")]
+    if missing:
+        raise HTTPError(400, f"missing field(s): {', '.join(missing)}")
+    try:
+        values = (str(data["name"]), data.get("category") or "", float(data["price"]), int(data["quantity"]),
+                  date.fromisoformat(data["mfg_date"]), date.fromisoformat(data["exp_date"]),
+                  data.get("supplier") or "")
+        reorder_point = data.get("reorder_point", inventory_core.UNCHANGED)
+        if reorder_point is not inventory_core.UNCHANGED:
+            reorder_point = None if reorder_point in (None, "") else int(reorder_point)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "price, quantity and reorder_point must be numbers, dates YYYY-MM-DD")
+    return values, reorder_point
+
+
+def lot_values(body, fields):
+    """The fields of a lot POST body: quantity as a whole number, exp_date as a date."""
+    data = json_object(body)
+    missing = [field for field in fields if data.get(field) in (None, "")]
+    if missing:
+        raise HTTPError(400, f"missing field(s): {', '.join(missing)}")
+    try:
+        values = {"quantity": int(data["quantity"])}
+        if "lot_number" in fields:
+            values["lot_number"] = str(data["lot_number"])
+            values["exp_date"] = date.fromisoformat(data["exp_date"])
+    except (TypeError, ValueError):
+        raise HTTPError(400, "quantity must be a whole number, exp_date a date (YYYY-MM-DD)")
+    return values
+
+
+def records(rows):
+    return [inventory_core.record(row) for row in rows]
+
+
+def one_record(row):
+    if row is None:
+        raise HTTPError(404, "no such medicine")
+    return inventory_core.record(row)
+
+
+# --- Routes ---
+def read_task(path, params):
+    """The (store, cursor) task answering a GET, or None if the path is not a read."""
+    horizon = int_param(params, "days", DEFAULT_EXPIRY_HORIZON)
+    parts = path.strip("/").split("/")
+    if parts == ["medicines"]:
+        start, limit = int_param(params, "start", 0), min(int_param(params, "limit", PAGE_LIMIT), PAGE_LIMIT)
+
+        def page(store, cursor):
+            rows = store.read_page(cursor, start, limit, horizon)
+            return {"medicines": records(rows), "next": rows[-1][0] + 1 if len(rows) == limit else None}
+        return page
+    if len(parts) == 2 and parts[0] == "medicines":
+        medicine_id = medicine_id_of(parts[1])
+        return lambda store, cursor: one_record(store.read_medicine(cursor, medicine_id, horizon))
+    if len(parts) == 3 and parts[0] == "medicines" and parts[2] == "lots":
+        medicine_id = medicine_id_of(parts[1])
+
+        def lots(store, cursor):
+            one_record(store.read_medicine(cursor, medicine_id, horizon))
+            return [inventory_core.lot_record(lot) for lot in inventory_core.lots(store, cursor, medicine_id)]
+        return lots
+    if parts == ["search"]:
+        query = params.get("q", [""])[0]
+        if not query.strip():
+            raise HTTPError(400, "missing parameter 'q'")
+        return lambda store, cursor: records(inventory_core.search(store, cursor, query, horizon))
+    if parts == ["expiry"]:
+        return lambda store, cursor: records(inventory_core.expiring(store, cursor, horizon))
+    if parts == ["low-stock"]:
+        return lambda store, cursor: records(inventory_core.low_stock(store, cursor, horizon))
+    if parts == ["history"]:
+        try:
+            ids = [int(part) for part in params.get("ids", [""])[0].split(",") if part.strip()]
+        except ValueError:
+            raise HTTPError(400, "ids must be a comma separated list of numbers")
+        if not ids:
+            raise HTTPError(400, "missing parameter 'ids'")
+        start, end = date_param(params, "from"), date_param(params, "to")
+
+        def history(store, cursor):
+            series = inventory_core.stock_history(store, cursor, ids, start, end)
+            return {str(medicine_id): [[str(day), int(quantity)] for day, quantity in zip(dates, quantities)]
+                    for medicine_id, (dates, quantities) in series.items()}
+        return history
+    return None
+
+
+def medicine_id_of(part):
+    try:
+        return int(part)
+    except ValueError:
+        raise HTTPError(404, "no such medicine")
+
+
+async def write(method, path, body):
+    """Runs a POST/PUT/DELETE on /medicines; returns (status, body)."""
+    parts = path.strip("/").split("/")
+    if parts == ["medicines"] and method == "POST":
+        values, _ = medicine_values(body)
+        row = await grouped_write(lambda store, cursor: inventory_core.add_medicine(store, cursor, values))
+        return 201, encode(inventory_core.record(row))
+    if len(parts) == 2 and parts[0] == "medicines" and method in ("PUT", "DELETE"):
+        medicine_id = medicine_id_of(parts[1])
+        if method == "PUT":
+            values, reorder_point = medicine_values(body)
+            row = await grouped_write(lambda store, cursor: inventory_core.update_medicine(
+                store, cursor, medicine_id, values, reorder_point))
+            return 200, encode(one_record(row))
+        if not await grouped_write(lambda store, cursor: inventory_core.delete_medicine(store, cursor, medicine_id)):
+            raise HTTPError(404, "no such medicine")
+        return 200, encode({"deleted": medicine_id})
+    if len(parts) == 3 and parts[0] == "medicines" and parts[2] in ("lots", "dispense") and method == "POST":
+        medicine_id = medicine_id_of(parts[1])
+        if parts[2] == "lots":
+            lot = lot_values(body, ("lot_number", "quantity", "exp_date"))
+            row = await grouped_write(lambda store, cursor: inventory_core.receive_lot(
+                store, cursor, medicine_id, lot["lot_number"], lot["quantity"], lot["exp_date"]))
+            return 201, encode(one_record(row))
+        quantity = lot_values(body, ("quantity",))["quantity"]
+        result = await grouped_write(lambda store, cursor: inventory_core.dispense(store, cursor, medicine_id,
+                                                                                   quantity))
+        if result is None:
+            raise HTTPError(404, "no such medicine")
+        taken, row = result
+        return 200, encode({"dispensed": [{"lot_number": lot_number, "exp_date": str(exp_date), "quantity": count}
+                                          for lot_number, exp_date, count in taken],
+                            "medicine": inventory_core.record(row)})
+    raise HTTPError(405 if parts[0] == "medicines" else 404, "not supported")
+
+
+async def dispatch(method, target, headers, body):
+    """Answers one request; returns (status, body, extra headers)."""
+    split = urlsplit(target)
+    params = parse_qs(split.query)
+    try:
+        if method == "GET" and split.path == "/metrics":
+            return 200, instrumentation.prometheus_text().encode(), {"Content-Type": "text/plain; version=0.0.4"}
+        if method == "GET":
+            task = read_task(split.path, params)
+            if task is None:
+                raise HTTPError(404, "not found")
+            payload, etag = await cached_read(target, task)
+            if headers.get("if-none-match") == etag:
+                return 304, b"", {"ETag": etag}
+            return 200, payload, {"ETag": etag}
+        if method in ("POST", "PUT", "DELETE"):
+            status, payload = await write(method, split.path, body)
+            invalidate()
+            return status, payload, {}
+        raise HTTPError(405, "not supported")
+    except HTTPError as err:
+        return err.status, encode({"error": str(err)}), {}
+    except LotError as err:
+        return 409, encode({"error": str(err)}), {}
+    except inventory_core.database_errors() as err:
+        if method != "GET":
+            invalidate()  # A failed write may still have changed something before it was rolled back
+        return 500, encode({"error": f"database error: {err}"}), {}
+    except Exception:  # A bug must cost this request a 500, not the client its connection
+        traceback.print_exc()
+        if method != "GET":
+            invalidate()
+        return 500, encode({"error": "internal error"}), {}
+
+
+# --- HTTP ---
+async def handle_connection(reader, writer):
+    """Serves the requests of one client connection (HTTP/1.1 keep-alive)."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                await send(writer, 400, encode({"error": "bad request line"}), {}, False)
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY:
+                await send(writer, 413, encode({"error": "body too large"}), {}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+            status, payload, extra = await dispatch(method, target, headers, body)
+            await send(writer, status, payload, extra, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def send(writer, status, payload, extra_headers, keep_alive):
+    headers = {"Content-Type": "application/json", "Content-Length": len(payload),
+               "Connection": "keep-alive" if keep_alive else "close"}
+    headers.update(extra_headers)
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"] + [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+async def serve(host=HOST, port=PORT):
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"Serving the inventory API on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the inventory as an HTTP/JSON API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--storage", choices=("mysql", "sqlite", "replica"), help="default: STORAGE_MODE")
+    parser.add_argument("--db", help="SQLite file for the sqlite mode (default: LOCAL_DB_PATH)")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE)
+    args = parser.parse_args()
+
+    init_database(args.storage, args.db, args.pool_size)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,102 @@
+# Benchmark: stock-out forecast over a big StockHistory.
+# Fills a throwaway SQLite store (sqlite_store.py) with MEDICINES medicines and
+# HISTORY_ROWS history rows, then times the first full forecast pass, an
+# incremental pass after a day of new history, and the "Stock Out In" sort.
+# The incremental result is checked against a full pass from scratch.
+#
+#   python benchmarks/bench_forecast.py
+#   python benchmarks/bench_forecast.py --history 200000 --medicines 2000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import sqlite_store  # noqa: E402
+import stock_forecast  # noqa: E402
+
+MEDICINES = 10000
+HISTORY_ROWS = 1000000
+DAYS = 365  # History spread over the last year
+NEW_ROWS = 5000  # History added before the incremental pass
+SEED = 7
+
+
+def fill(connection, medicines, history_rows, rng):
+    today = date.today()
+    exp_dates = [today + timedelta(days=int(days)) for days in rng.integers(-30, 720, medicines)]
+    connection.executemany("INSERT INTO Medicines (id, name, category, price, quantity, mfg_date, exp_date, supplier) "
+                           "VALUES (?, ?, 'Bench', 1.0, ?, '2024-01-01', ?, NULL)",
+                           [(i + 1, f"Medicine {i + 1}", int(rng.integers(0, 500)), exp_dates[i].isoformat())
+                            for i in range(medicines)])
+    # Every medicine sells a little every day and gets restocked now and then
+    med_ids = np.sort(rng.integers(1, medicines + 1, history_rows))
+    days = np.sort(rng.integers(0, DAYS, history_rows))
+    quantities = np.maximum(500 - (np.arange(history_rows) % 97) * 5, 0)
+    start = today - timedelta(days=DAYS)
+    order = np.lexsort((days, med_ids))
+    connection.executemany("INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (?, ?, ?)",
+                           ((int(med_ids[i]), (start + timedelta(days=int(days[i]))).isoformat(), int(quantities[i]))
+                            for i in order))
+    connection.commit()
+
+
+def add_history(connection, medicines, rows, rng):
+    today = date.today().isoformat()
+    connection.executemany("INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (?, ?, ?)",
+                           [(int(medicine_id), today, int(quantity)) for medicine_id, quantity
+                            in zip(rng.integers(1, medicines + 1, rows), rng.integers(0, 300, rows))])
+    connection.commit()
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f"{label:<28}{time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the stock-out forecast over a big history.")
+    parser.add_argument("--medicines", type=int, default=MEDICINES)
+    parser.add_argument("--history", type=int, default=HISTORY_ROWS)
+    args = parser.parse_args()
+    rng = np.random.default_rng(SEED)
+
+    with tempfile.TemporaryDirectory() as folder:
+        connection = sqlite_store.connect(os.path.join(folder, "forecast.db"))
+        print(f"Filling {args.medicines:,} medicines / {args.history:,} history rows...")
+        fill(connection, args.medicines, args.history, rng)
+        cursor = connection.cursor()
+
+        timed("full pass", lambda: stock_forecast.update(sqlite_store, cursor))
+        history_ids, med_ids, days, quantities = stock_forecast.read_history(sqlite_store, cursor, 0)
+        order = np.lexsort((history_ids, med_ids))
+        timed("  of which arithmetic", lambda: stock_forecast.consumption(
+            med_ids[order], days[order], quantities[order], stock_forecast.today_number()))
+        add_history(connection, args.medicines, NEW_ROWS, rng)
+        timed(f"incremental (+{NEW_ROWS:,} rows)", lambda: stock_forecast.update(sqlite_store, cursor))
+        incremental = stock_forecast.state
+
+        levels = sqlite_store.read_stock_levels(cursor)
+        ids, stock, exp_dates = zip(*levels)
+        timed("stock-out sort", lambda: stock_forecast.stockout_order(ids, stock, exp_dates, 200))
+
+        # Same state from scratch, the incremental pass must not drift from it
+        stock_forecast.state = dict(stock_forecast.state, ids=np.empty(0, dtype=np.int64), ew_sum=np.empty(0),
+                                    first_day=np.empty(0, dtype=np.int64), last_day=np.empty(0, dtype=np.int64),
+                                    last_quantity=np.empty(0, dtype=np.int64), last_history_id=0)
+        stock_forecast.update(sqlite_store, cursor)
+        same = (np.array_equal(incremental["ids"], stock_forecast.state["ids"])
+                and np.allclose(incremental["ew_sum"], stock_forecast.state["ew_sum"]))
+        print(f"incremental matches full pass: {same}")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
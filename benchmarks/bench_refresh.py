@@ -0,0 +1,86 @@
+# Benchmark: full Treeview reload vs. incremental patching.
+# Shows that after an add/update/delete the grid refresh costs O(changed rows)
+# instead of O(table). Uses a real (hidden) Tk Treeview with in-memory rows,
+# so no MySQL server is needed, but a display is.
+#
+#   python benchmarks/bench_refresh.py
+
+import os
+import sys
+import time
+import tkinter as tk
+from datetime import date, timedelta
+from tkinter import ttk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import medicine_grid  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+PATCHES = 200  # Patch operations timed per table size
+COLUMNS = ("id", "name", "category", "price", "quantity", "mfg_date", "exp_date", "supplier")
+
+
+def make_rows(n):
+    today = date.today()
+    return [(i, f"Medicine {i}", "Tablet", 10.0, i % 50, today, today + timedelta(days=i % 400), "Supplier")
+            for i in range(1, n + 1)]
+
+
+def full_reload(tree, rows):
+    """What every mutation used to do: clear the tree and insert every row again."""
+    for item in tree.get_children():
+        tree.delete(item)
+    for row in rows:
+        tree.insert("", "end", values=row)
+
+
+def bench_size(root, n):
+    rows = make_rows(n)
+    tree = ttk.Treeview(root, columns=COLUMNS, show="headings", height=20)
+    scrollbar = tk.Scrollbar(root)
+
+    start = time.perf_counter()
+    full_reload(tree, rows)
+    root.update_idletasks()
+    reload_ms = (time.perf_counter() - start) * 1000
+    tree.delete(*tree.get_children())
+
+    # Same data served page by page, like the keyset queries do
+    def load_page(first_id, limit, on_loaded):
+        on_loaded(rows[first_id - 1:first_id - 1 + limit])
+
+    medicine_grid.attach(tree, scrollbar, load_page)
+    medicine_grid.offset = 0
+    medicine_grid.reload([rows[i][0] for i in range(0, len(rows), medicine_grid.PAGE_SIZE)], len(rows), rows[-1][0])
+    next_id = n + 1
+
+    start = time.perf_counter()
+    for i in range(PATCHES):
+        row = rows[i]
+        medicine_grid.patch_update_row((row[0], row[1], row[2], row[3], row[4] + 1) + row[5:])
+        new_row = (next_id,) + rows[0][1:]
+        rows.append(new_row)
+        medicine_grid.patch_insert_row(new_row)
+        medicine_grid.patch_remove_row(next_id)
+        rows.pop()
+        next_id += 1
+    root.update_idletasks()
+    patch_ms = (time.perf_counter() - start) * 1000 / (PATCHES * 3)
+
+    tree.destroy()
+    scrollbar.destroy()
+    return reload_ms, patch_ms
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+    print(f"{'rows':>10} {'full reload (ms)':>18} {'patch (ms/op)':>15}")
+    for n in SIZES:
+        reload_ms, patch_ms = bench_size(root, n)
+        print(f"{n:>10} {reload_ms:>18.1f} {patch_ms:>15.3f}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
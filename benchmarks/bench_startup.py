@@ -0,0 +1,64 @@
+# Benchmark: cold start of a headless query vs. the window.
+# Runs each command in a fresh interpreter RUNS times and reports the best and
+# median wall time. "cli" is a full inventory_cli search against a small
+# throwaway SQLite store (start, query, JSON out); "gui imports" is only the
+# modules main.py loads before it can draw anything (Tk, NumPy, the MySQL
+# driver, plus matplotlib as main.py used to import it up front), so the real
+# window takes longer still.
+#
+#   python benchmarks/bench_startup.py
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import sqlite_store  # noqa: E402
+
+RUNS = 7
+MEDICINES = 1000
+GUI_IMPORTS = "import tkinter, tkinter.ttk, storage, medicine_grid, stock_forecast, bulk_import"
+
+
+def fill(path):
+    connection = sqlite_store.connect(path)
+    connection.executemany("INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier) "
+                           "VALUES (?, 'Tablets', 5.0, ?, '2025-01-01', '2027-01-01', 'Bench')",
+                           [(f"Amoxicillin {i}", i % 50) for i in range(MEDICINES)])
+    connection.commit()
+    connection.close()
+
+
+def time_command(command):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "startup.db")
+        fill(path)
+        commands = {
+            "cli search (json)": [sys.executable, "-m", "inventory_cli", "--storage", "sqlite", "--db", path,
+                                  "search", "amox"],
+            "cli low-stock (csv)": [sys.executable, "-m", "inventory_cli", "--storage", "sqlite", "--db", path,
+                                    "low-stock", "--format", "csv"],
+            "gui imports": [sys.executable, "-c", GUI_IMPORTS],
+            "gui imports + pyplot": [sys.executable, "-c", GUI_IMPORTS + ", matplotlib.pyplot"],
+        }
+        print(f"{'command':<24}{'best':>9}{'median':>9}")
+        for label, command in commands.items():
+            best, median = time_command(command)
+            print(f"{label:<24}{best * 1000:7.0f}ms{median * 1000:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
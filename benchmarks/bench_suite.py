@@ -0,0 +1,241 @@
+# Benchmark suite: the window's main read paths against synthetic data.
+# Times the headless equivalents of what main.py does on a generated inventory
+# (synthetic_data.py, same seed and sizes every time):
+#   fetch_all_medicines      page index + first page of the virtual grid
+#   search_medicine          a handful of typical prefix searches
+#   check_expiry_status      expired / expiring soon list
+#   view_low_stock           low-stock list
+#   generate_timeline_graph  history of the busiest medicines, downsampled and
+#                            drawn to a PNG (timeline_chart.py, uncached)
+#   timeline_toggle          dropping them from the chart one at a time, from the cache
+#   forecast                 full stock-out forecast pass (stock_forecast.py)
+#   treeview                 filling a hidden Treeview through medicine_grid
+#                            (skipped without a display)
+# Every case runs --repeat times; the JSON written has the runs plus their
+# min and median, and the seed, sizes and commit they came from, so two result
+# files can be compared to catch regressions:
+#
+#   python benchmarks/bench_suite.py --size medium --sqlite bench-medium.db --output before.json
+#   python benchmarks/bench_suite.py --size medium --sqlite bench-medium.db --compare before.json
+#
+# The SQLite file is generated if it does not exist yet (or if --regenerate);
+# a MySQL database (--mysql) has to be filled with synthetic_data.py first.
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import inventory_core  # noqa: E402
+import stock_forecast  # noqa: E402
+import synthetic_data  # noqa: E402
+import timeline_chart  # noqa: E402
+from inventory_queries import DEFAULT_EXPIRY_HORIZON  # noqa: E402
+
+REPEAT = 5
+TOLERANCE = 0.2  # A case more than 20% slower (median) than in the compared file is a regression
+SEARCHES = ["amox", "para 500", "vit", "syrup", "supplier 07", "zzz"]
+GRAPH_MEDICINES = 5  # Busiest medicines drawn by the timeline case
+PAGE_SIZE = 200  # Same as medicine_grid.py
+TREEVIEW_ROWS = 5000  # Rows put into the hidden Treeview
+BLANK_FORECAST = dict(stock_forecast.state)
+
+
+# --- Cases ---
+def fetch_all_medicines(store, cursor):
+    _, starts, _, _, _ = store.read_page_index(cursor, PAGE_SIZE)
+    return store.read_page(cursor, starts[0], PAGE_SIZE, DEFAULT_EXPIRY_HORIZON) if starts else []
+
+
+def search_medicine(store, cursor):
+    return [inventory_core.search(store, cursor, query) for query in SEARCHES]
+
+
+def check_expiry_status(store, cursor):
+    return inventory_core.expiring(store, cursor)
+
+
+def view_low_stock(store, cursor):
+    return inventory_core.low_stock(store, cursor)
+
+
+def generate_timeline_graph(store, cursor, medicine_ids):
+    timeline_chart.cache.clear()  # From the database every time
+    timeline_chart.export_png(store, cursor, medicine_ids, io.BytesIO())
+
+
+def timeline_toggle(store, cursor, medicine_ids):
+    """What toggling medicines in the open chart costs: cached series, reused lines, one canvas draw per toggle."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=timeline_chart.GRAPH_SIZE, dpi=timeline_chart.DPI)
+    FigureCanvasAgg(figure)
+    ax, drawn = timeline_chart.new_axes(figure), {}
+
+    def toggle():
+        for count in range(len(medicine_ids), 0, -1):
+            series = timeline_chart.prepare(store, cursor, medicine_ids[:count])
+            timeline_chart.update_lines(ax, drawn, series, {})
+            figure.canvas.draw()
+    return toggle
+
+
+def forecast(store, cursor):
+    stock_forecast.state = dict(BLANK_FORECAST)
+    return stock_forecast.update(store, cursor)
+
+
+def treeview_case(rows):
+    """A function filling a hidden Treeview with rows, or None without a display."""
+    import tkinter as tk
+    from tkinter import ttk
+
+    import medicine_grid
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    columns = ("id", "name", "category", "price", "quantity", "mfg_date", "exp_date", "supplier")
+    tree = ttk.Treeview(root, columns=columns, show="headings", height=30)
+    medicine_grid.attach(tree, tk.Scrollbar(root), lambda first_id, limit, on_loaded: None)
+
+    def fill():
+        medicine_grid.show_rows([])  # Start from an empty tree, so every run inserts the items
+        medicine_grid.show_rows(rows)
+        root.update_idletasks()
+    return fill
+
+
+def busiest_medicines(cursor):
+    cursor.execute("SELECT medicine_id FROM StockHistory GROUP BY medicine_id ORDER BY COUNT(*) DESC, medicine_id "
+                   f"LIMIT {GRAPH_MEDICINES}")
+    return [row[0] for row in cursor.fetchall()]
+
+
+# --- Running ---
+def measure(function, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {"runs_ms": [round(ms, 3) for ms in runs], "min_ms": round(min(runs), 3),
+            "median_ms": round(statistics.median(runs), 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    items, history_rows = synthetic_data.sizes(args)
+    if args.sqlite:
+        import sqlite_store as store
+        fresh = not os.path.exists(args.sqlite)
+        connection = synthetic_data.connect(sqlite_path=args.sqlite)
+        if fresh or args.regenerate:
+            synthetic_data.generate(connection, items, history_rows, args.seed)
+    else:
+        import mysql_store as store
+        connection = synthetic_data.connect(mysql_database=args.mysql)
+        if args.regenerate:
+            synthetic_data.generate(connection, items, history_rows, args.seed)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM Medicines")
+        counts = {"medicines": cursor.fetchone()[0]}
+        cursor.execute("SELECT COUNT(*) FROM StockHistory")
+        counts["history"] = cursor.fetchone()[0]
+        if counts != {"medicines": items, "history": history_rows}:
+            print(f"Note: the database holds {counts}, not the {items:,}/{history_rows:,} asked for; "
+                  f"use --regenerate to rebuild it.")
+        graph_ids = busiest_medicines(cursor)
+        cases = {
+            "fetch_all_medicines": lambda: fetch_all_medicines(store, cursor),
+            "search_medicine": lambda: search_medicine(store, cursor),
+            "check_expiry_status": lambda: check_expiry_status(store, cursor),
+            "view_low_stock": lambda: view_low_stock(store, cursor),
+            "generate_timeline_graph": lambda: generate_timeline_graph(store, cursor, graph_ids),
+            "timeline_toggle": timeline_toggle(store, cursor, graph_ids),
+            "forecast": lambda: forecast(store, cursor),
+        }
+        if not args.no_treeview:
+            cases["treeview"] = treeview_case(store.read_page(cursor, 0, TREEVIEW_ROWS, DEFAULT_EXPIRY_HORIZON))
+        results = {}
+        for name, function in cases.items():
+            if function is None:
+                results[name] = {"skipped": "no display"}
+                print(f"{name:<26}skipped (no display)")
+                continue
+            function()  # Warm up: statement caches, imports, the OS page cache
+            results[name] = measure(function, args.repeat)
+            print(f"{name:<26}{results[name]['median_ms']:10.2f} ms median {results[name]['min_ms']:10.2f} ms min")
+    finally:
+        cursor.close()
+        connection.close()
+
+    return {
+        "meta": {"seed": args.seed, "medicines": counts["medicines"], "history": counts["history"],
+                 "backend": "sqlite" if args.sqlite else "mysql", "repeat": args.repeat, "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(current, previous, tolerance):
+    """Prints the median of every case against previous; returns the names of the cases that regressed."""
+    if {k: previous["meta"].get(k) for k in ("seed", "medicines", "history", "backend")} != \
+            {k: current["meta"][k] for k in ("seed", "medicines", "history", "backend")}:
+        print("Note: the compared file was run on different data or another backend.")
+    regressed = []
+    print(f"{'case':<26}{'before ms':>11}{'now ms':>11}{'ratio':>8}")
+    for name, result in current["results"].items():
+        before = previous["results"].get(name, {})
+        if "median_ms" not in result or "median_ms" not in before:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        flag = "  slower" if ratio > 1 + tolerance else ""
+        print(f"{name:<26}{before['median_ms']:11.2f}{result['median_ms']:11.2f}{ratio:8.2f}{flag}")
+        if flag:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the main read paths on synthetic pharmacy data.")
+    synthetic_data.add_arguments(parser)
+    parser.add_argument("--regenerate", action="store_true", help="fill the database again before timing")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--no-treeview", action="store_true", help="skip the Treeview case")
+    parser.add_argument("--output", help="write the results here (default bench_<backend>_<size>.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    current = run(args)
+    output = args.output or f"bench_{current['meta']['backend']}_{args.items or args.size}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(current, json.load(f), args.tolerance)
+        if regressed:
+            raise SystemExit(f"Slower than {args.compare}: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
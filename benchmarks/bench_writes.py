@@ -0,0 +1,152 @@
+# Benchmark: add/update write paths, one commit per statement vs. one per operation.
+# "before" is what add_medicine()/update_medicine() used to do (the Medicines
+# row and its StockHistory row committed separately), "single" is one
+# transaction per operation, "group" commits GROUP_SIZE operations at once.
+#
+# By default it runs on a throwaway SQLite file with synchronous=FULL as a
+# stand-in, so every commit pays a real fsync. With --mysql it runs the real
+# medicine_writes operations against the database in db_config.py, on rows in
+# a "__bench__" category that are deleted again afterwards.
+#
+#   python benchmarks/bench_writes.py
+#   python benchmarks/bench_writes.py --mysql --ops 500
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import medicine_writes  # noqa: E402
+
+OPS = 1000  # Operations timed per mode (half adds, half quantity updates)
+GROUP_SIZE = 20
+CATEGORY = "__bench__"
+VALUES = ("Bench medicine", CATEGORY, 9.5, 100, date(2025, 1, 1), date(2027, 1, 1), "Bench supplier")
+
+
+# --- SQLite stand-in ---
+def sqlite_connection(path):
+    connection = sqlite3.connect(path, isolation_level="DEFERRED")
+    connection.execute("PRAGMA journal_mode=DELETE")
+    connection.execute("PRAGMA synchronous=FULL")
+    connection.execute("""CREATE TABLE Medicines (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL,
+                          quantity INTEGER, mfg_date TEXT, exp_date TEXT, supplier TEXT)""")
+    connection.execute("""CREATE TABLE StockHistory (id INTEGER PRIMARY KEY, medicine_id INTEGER,
+                          change_date TEXT, quantity INTEGER)""")
+    connection.commit()
+    return connection
+
+
+def sqlite_add(cursor, quantity):
+    cursor.execute("INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)", VALUES[:3] + (quantity,) + VALUES[4:])
+    return cursor.lastrowid
+
+
+def sqlite_history(cursor, medicine_id, quantity):
+    cursor.execute("INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (?, ?, ?)",
+                   (medicine_id, date.today(), quantity))
+
+
+def sqlite_update(cursor, medicine_id, quantity):
+    cursor.execute("UPDATE Medicines SET quantity = ? WHERE id = ?", (quantity, medicine_id))
+
+
+def run_sqlite(mode, ops):
+    with tempfile.TemporaryDirectory() as folder:
+        connection = sqlite_connection(os.path.join(folder, "bench.db"))
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        medicine_id = None
+        for i in range(ops):
+            if i % 2 == 0:
+                medicine_id = sqlite_add(cursor, 100)
+            else:
+                sqlite_update(cursor, medicine_id, 100 - i)
+            if mode == "before":
+                connection.commit()
+            sqlite_history(cursor, medicine_id, 100 if i % 2 == 0 else 100 - i)
+            if mode != "group" or (i + 1) % GROUP_SIZE == 0:
+                connection.commit()
+        connection.commit()
+        seconds = time.perf_counter() - start
+        connection.close()
+    return ops / seconds
+
+
+# --- MySQL ---
+def run_mysql(connection, mode, ops):
+    last = {}  # Id of the latest added medicine, read by the update after it
+
+    def add(cursor):
+        last["id"] = medicine_writes.add_medicine(cursor, *VALUES)
+
+    def update(cursor, quantity):
+        medicine_writes.update_medicine(cursor, last["id"], *VALUES[:3], quantity, *VALUES[4:],
+                                        original_quantity=VALUES[3], original_category=CATEGORY)
+
+    start = time.perf_counter()
+    pending = []
+    for i in range(ops):
+        quantity = VALUES[3] if i % 2 == 0 else 100 - i
+        if mode == "before":
+            # Old path: the Medicines row and the history row each get their own commit
+            cursor = connection.cursor()
+            if i % 2 == 0:
+                cursor.execute("INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier) "
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s)", VALUES)
+                last["id"] = cursor.lastrowid
+            else:
+                cursor.execute("UPDATE Medicines SET quantity = %s WHERE id = %s", (quantity, last["id"]))
+            connection.commit()
+            cursor.execute(medicine_writes.HISTORY_SQL, (last["id"], date.today(), quantity))
+            connection.commit()
+            cursor.close()
+            continue
+
+        pending.append(add if i % 2 == 0 else lambda cursor, quantity=quantity: update(cursor, quantity))
+        if mode == "single" or len(pending) >= GROUP_SIZE:
+            medicine_writes.run_transaction(connection, *pending)
+            pending = []
+    if pending:
+        medicine_writes.run_transaction(connection, *pending)
+    return ops / (time.perf_counter() - start)
+
+
+def clean_up_mysql(connection):
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM Medicines WHERE category = %s", (CATEGORY,))
+    cursor.execute("DELETE FROM CategoryDailySnapshot WHERE category = %s", (CATEGORY,))
+    connection.commit()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the medicine write paths.")
+    parser.add_argument("--mysql", action="store_true", help="use the database in db_config.py")
+    parser.add_argument("--ops", type=int, default=OPS)
+    args = parser.parse_args()
+
+    modes = ("before", "single", "group")
+    print(f"{'mode':>8} {'ops/sec':>10}")
+    if args.mysql:
+        import mysql.connector
+        from db_config import DB_CONFIG
+        connection = mysql.connector.connect(**DB_CONFIG)
+        try:
+            for mode in modes:
+                print(f"{mode:>8} {run_mysql(connection, mode, args.ops):>10,.0f}")
+        finally:
+            clean_up_mysql(connection)
+            connection.close()
+    else:
+        for mode in modes:
+            print(f"{mode:>8} {run_sqlite(mode, args.ops):>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
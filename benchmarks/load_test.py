@@ -0,0 +1,136 @@
+# Load test for api_server.py.
+# Opens CONNECTIONS keep-alive connections to a running API server and has
+# each send requests back to back for DURATION seconds: a mix of page reads,
+# single medicines, searches, expiry and low-stock lists, and (with --writes)
+# a share of PUT updates. Reports requests/sec and p50/p99 latency, overall and
+# per kind of request.
+#
+#   python api_server.py --storage sqlite --db bench.db &
+#   python benchmarks/load_test.py --connections 32 --duration 15 --writes 0.05
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+CONNECTIONS = 16
+DURATION = 10.0  # Seconds
+SEED = 7
+SEARCHES = ["amox", "para", "ibu", "cet", "vit c", "azi", "met", "syrup"]
+READ_MIX = [("page", 4), ("medicine", 4), ("search", 3), ("expiry", 1), ("low-stock", 1), ("revalidate", 2)]
+
+
+async def request(reader, writer, method, target, headers=None, body=b""):
+    """Sends one request on a keep-alive connection; returns (status, headers, body)."""
+    lines = [f"{method} {target} HTTP/1.1", "Host: load-test", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    length = int(response_headers.get("content-length", 0))
+    return status, response_headers, await reader.readexactly(length)
+
+
+async def discover(host, port):
+    """Ids of the medicines the server has (first pages), so the requests hit real rows."""
+    reader, writer = await asyncio.open_connection(host, port)
+    ids, start = [], 0
+    try:
+        while start is not None and len(ids) < 5000:
+            status, _, body = await request(reader, writer, "GET", f"/medicines?start={start}")
+            if status != 200:
+                raise SystemExit(f"GET /medicines answered {status}: {body[:200]!r}")
+            page = json.loads(body)
+            ids += [medicine["id"] for medicine in page["medicines"]]
+            start = page["next"]
+    finally:
+        writer.close()
+    if not ids:
+        raise SystemExit("The server has no medicines to load test against.")
+    return ids
+
+
+async def client(host, port, ids, deadline, write_share, rng, timings, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    kinds, weights = zip(*READ_MIX)
+    etags = {}
+    try:
+        while time.perf_counter() < deadline:
+            kind = "update" if rng.random() < write_share else rng.choices(kinds, weights)[0]
+            method, headers, body = "GET", {}, b""
+            if kind == "page":
+                target = f"/medicines?start={rng.choice(ids)}&limit=50"
+            elif kind in ("medicine", "revalidate"):
+                target = f"/medicines/{rng.choice(ids[:200])}"
+                if kind == "revalidate" and target in etags:
+                    headers["If-None-Match"] = etags[target]
+            elif kind == "search":
+                target = f"/search?q={rng.choice(SEARCHES).replace(' ', '+')}"
+            elif kind == "update":
+                medicine_id = rng.choice(ids)
+                target = f"/medicines/{medicine_id}"
+                status, _, current = await request(reader, writer, "GET", target)
+                if status != 200:
+                    continue
+                medicine = json.loads(current)
+                medicine["quantity"] = max(0, medicine["quantity"] + rng.randint(-5, 5))
+                method, body = "PUT", json.dumps(medicine).encode()
+            else:
+                target = f"/{kind}"
+
+            started = time.perf_counter()
+            status, response_headers, _ = await request(reader, writer, method, target, headers, body)
+            timings.setdefault(kind, []).append(time.perf_counter() - started)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            if "etag" in response_headers:
+                etags[target] = response_headers["etag"]
+    finally:
+        writer.close()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the inventory API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--writes", type=float, default=0.0, help="share of requests that are updates (0-1)")
+    args = parser.parse_args()
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+    ids = await discover(host, port)
+    timings, errors = {}, {}
+    rng = random.Random(SEED)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(client(host, port, ids, deadline, args.writes, random.Random(rng.random()), timings,
+                                  errors) for _ in range(args.connections)))
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in timings.values() for value in values]
+    print(f"{len(everything):,} requests in {elapsed:.1f}s over {args.connections} connections: "
+          f"{len(everything) / elapsed:,.0f} req/s")
+    print(f"{'request':<12}{'count':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for kind, values in sorted(timings.items()) + [("all", everything)]:
+        print(f"{kind:<12}{len(values):>9,}{percentile(values, 0.5) * 1000:>9.2f}{percentile(values, 0.99) * 1000:>9.2f}")
+    if errors:
+        print("errors: " + ", ".join(f"{count} x {status}" for status, count in sorted(errors.items())))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
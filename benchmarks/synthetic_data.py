@@ -0,0 +1,225 @@
+# Synthetic pharmacy data for the benchmarks.
+# Fills Medicines and StockHistory with a reproducible (seeded) inventory of
+# any size, on SQLite or MySQL. The same seed and sizes always give the same
+# rows, so results from different runs are comparable.
+#
+# What it looks like:
+#   - names from common drug stems, strengths and forms, so searches hit
+#     realistic prefixes ("amox", "para 500", "syrup")
+#   - categories and suppliers with skewed (Zipf-like) popularity
+#   - made in the last two years with 1-3 year shelf lives, so about a sixth
+#     are expired and a few percent more expire within a month
+#   - history: a sawtooth of sales and occasional restocks per medicine, popular
+#     medicines having far more rows than the rest; Medicines.quantity is the
+#     last history quantity, like the app leaves it
+#
+#   python benchmarks/synthetic_data.py --size small --sqlite bench-small.db
+#   python benchmarks/synthetic_data.py --items 100000 --history 2000000 --sqlite bench.db
+#   python benchmarks/synthetic_data.py --size medium --mysql pharmacy_bench
+#
+# MySQL needs an empty scratch database with the tables from schema.sql (the
+# one in db_config.py is refused), e.g.
+#   sed 's/pharmacy-final/pharmacy_bench/g' schema.sql | mysql -u root -p
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+
+SIZES = {  # name -> (medicines, history rows)
+    "small": (1_000, 100_000),
+    "medium": (100_000, 2_000_000),
+    "large": (1_000_000, 10_000_000),
+}
+SEED = 42
+HISTORY_DAYS = 730  # History covers the last two years
+INSERT_BATCH = 50_000  # Rows per executemany
+RESTOCK_EVERY = 40  # History changes per restock, on average
+
+STEMS = ["Amoxicillin", "Paracetamol", "Ibuprofen", "Cetirizine", "Azithromycin", "Metformin", "Atorvastatin",
+         "Omeprazole", "Pantoprazole", "Amlodipine", "Losartan", "Ciprofloxacin", "Doxycycline", "Diclofenac",
+         "Ranitidine", "Levocetirizine", "Montelukast", "Salbutamol", "Prednisolone", "Insulin Glargine",
+         "Vitamin C", "Vitamin D3", "Calcium Carbonate", "Folic Acid", "Iron Sucrose", "Ondansetron",
+         "Domperidone", "Loperamide", "Clopidogrel", "Aspirin", "Telmisartan", "Glimepiride", "Metronidazole",
+         "Fluconazole", "Clotrimazole", "Mupirocin", "Betamethasone", "Ofloxacin", "Cefixime", "Dextromethorphan"]
+STRENGTHS = ["5mg", "10mg", "20mg", "40mg", "100mg", "250mg", "500mg", "650mg", "1g", "5ml", "100ml"]
+CATEGORIES = [("Tablets", 40), ("Capsules", 15), ("Syrup", 12), ("Injection", 8), ("Ointment", 7), ("Drops", 6),
+              ("Powder", 4), ("Inhaler", 3), ("Vaccine", 2), ("", 3)]
+SUPPLIERS = 60
+SHELF_LIVES = ([365, 547, 730, 1095], [0.2, 0.3, 0.35, 0.15])  # Days, share of medicines
+CATEGORY_REORDER_POINTS = {"Vaccine": 5, "Injection": 20, "Tablets": 25}
+
+
+def zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def medicines(rng, count):
+    """Columns of count medicines (quantity is filled in from the history later)."""
+    stem = rng.choice(len(STEMS), count, p=zipf_weights(len(STEMS), 0.8))
+    strength = rng.integers(0, len(STRENGTHS), count)
+    names, shares = zip(*CATEGORIES)
+    category = rng.choice(len(names), count, p=np.array(shares) / sum(shares))
+    supplier = rng.choice(SUPPLIERS, count, p=zipf_weights(SUPPLIERS))
+    today = np.datetime64(date.today(), "D")
+    mfg = today - rng.integers(0, HISTORY_DAYS, count).astype("timedelta64[D]")
+    exp = mfg + rng.choice(SHELF_LIVES[0], count, p=SHELF_LIVES[1]).astype("timedelta64[D]")
+    price = np.round(rng.lognormal(3.5, 1.0, count), 2)
+    own_point = np.where(rng.random(count) < 0.1, rng.integers(5, 100, count), -1)
+    return {
+        "name": [f"{STEMS[s]} {STRENGTHS[k]} #{i + 1}" for i, (s, k) in enumerate(zip(stem.tolist(), strength.tolist()))],
+        "category": [names[c] or None for c in category.tolist()],
+        "supplier": [f"Supplier {s + 1:02d} Pharma" for s in supplier.tolist()],
+        "price": price.tolist(),
+        "mfg_date": mfg.astype(str).tolist(),
+        "exp_date": exp.astype(str).tolist(),
+        "reorder_point": [None if point < 0 else point for point in own_point.tolist()],
+    }
+
+
+def history(rng, items, rows):
+    """(medicine ids, ISO dates, quantities) of rows history rows, sorted by medicine and date.
+
+    Returns the last quantity of every medicine too (0-based index, -1 without history).
+    """
+    popularity = rng.lognormal(0, 1.2, items)
+    counts = rng.multinomial(rows, popularity / popularity.sum())
+    med_ids = np.repeat(np.arange(1, items + 1), counts)
+    days = rng.integers(0, HISTORY_DAYS, rows)
+    order = np.lexsort((days, med_ids))
+    med_ids, days = med_ids[order], days[order]
+
+    # A sawtooth: a restock (about one change in RESTOCK_EVERY, and each medicine's
+    # first row) sets the stock to a few hundred, every sale after it takes a few units
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    restock = rng.random(rows) < 1 / RESTOCK_EVERY
+    restock[starts[counts > 0]] = True
+    sold = np.where(restock, 0, rng.poisson(4, rows) + 1)
+    segment = np.cumsum(restock) - 1
+    level = rng.integers(100, 500, segment[-1] + 1 if rows else 0)
+    running = np.cumsum(sold)
+    # Sold since the segment's restock: the running total minus what it was at the restock
+    since_restock = running - running[np.flatnonzero(restock)][segment]
+    quantities = np.maximum(level[segment] - since_restock, 0)
+
+    first_day = np.datetime64(date.today(), "D") - HISTORY_DAYS
+    dates = (first_day + days.astype("timedelta64[D]")).astype(str)
+    last = np.full(items, -1)
+    has_rows = counts > 0
+    last[has_rows] = quantities[(starts + counts - 1)[has_rows]]
+    return med_ids, dates, quantities, last
+
+
+# --- Loading ---
+def placeholder(connection):
+    return "?" if connection.__class__.__module__.startswith("sqlite3") else "%s"
+
+
+def insert(connection, sql, rows):
+    cursor = connection.cursor()
+    try:
+        for i in range(0, len(rows), INSERT_BATCH):
+            cursor.executemany(sql, rows[i:i + INSERT_BATCH])
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def generate(connection, items, history_rows, seed=SEED, progress=print):
+    """Replaces the contents of Medicines/StockHistory with the synthetic data; returns seconds taken."""
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    p = placeholder(connection)
+    cursor = connection.cursor()
+    for table in ("StockHistory", "Medicines", "CategoryReorderPoints"):
+        cursor.execute(f"DELETE FROM {table}")
+    if p == "%s":
+        for table in ("StockDailySnapshot", "CategoryDailySnapshot", "MedicineDeletions"):
+            cursor.execute(f"DELETE FROM {table}")
+    else:
+        cursor.execute("DELETE FROM MedicineDeletions")
+    connection.commit()
+    cursor.close()
+
+    insert(connection, f"INSERT INTO CategoryReorderPoints (category, reorder_point) VALUES ({p}, {p})",
+           list(CATEGORY_REORDER_POINTS.items()))
+    columns = medicines(rng, items)
+    med_ids, dates, quantities, last = history(rng, items, history_rows)
+    stock = np.where(last >= 0, last, rng.integers(0, 300, items)).tolist()
+
+    progress(f"Inserting {items:,} medicines...")
+    rows = list(zip(range(1, items + 1), columns["name"], columns["category"], columns["price"], stock,
+                    columns["mfg_date"], columns["exp_date"], columns["supplier"], columns["reorder_point"]))
+    sql = ("INSERT INTO Medicines (id, name, category, price, quantity, mfg_date, exp_date, supplier, reorder_point"
+           "{}) VALUES (" + ", ".join([p] * 9) + "{})")
+    if p == "?":
+        # MySQL's triggers work reorder_level out, SQLite gets it in the INSERT like sqlite_store does
+        import sqlite_store
+        sql = sql.format(", reorder_level", ", " + sqlite_store.reorder_level_sql("?", "?"))
+        rows = [row + (row[8], row[2]) for row in rows]
+    else:
+        sql = sql.format("", "")
+    insert(connection, sql, rows)
+
+    progress(f"Inserting {history_rows:,} history rows...")
+    for i in range(0, history_rows, INSERT_BATCH * 4):
+        chunk = slice(i, i + INSERT_BATCH * 4)
+        insert(connection, f"INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES ({p}, {p}, {p})",
+               list(zip(med_ids[chunk].tolist(), dates[chunk].tolist(), quantities[chunk].tolist())))
+
+    if p == "%s":
+        progress("Rebuilding the daily snapshots...")
+        import stock_snapshots
+        cursor = connection.cursor()
+        try:
+            stock_snapshots.rebuild_snapshots(cursor)
+            connection.commit()
+        finally:
+            cursor.close()
+    return time.perf_counter() - started
+
+
+def connect(sqlite_path=None, mysql_database=None):
+    if sqlite_path:
+        import sqlite_store
+        return sqlite_store.connect(sqlite_path)
+    if mysql_database == DB_CONFIG.get("database"):
+        raise SystemExit(f"Refusing to overwrite {mysql_database}, the database the app uses; pick a scratch one.")
+    import mysql.connector
+    return mysql.connector.connect(**dict(DB_CONFIG, database=mysql_database))
+
+
+def add_arguments(parser):
+    """Size and target options, shared with bench_suite.py."""
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--items", type=int, help="medicines (overrides --size)")
+    parser.add_argument("--history", type=int, help="history rows (overrides --size)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", metavar="FILE", help="SQLite file to fill")
+    target.add_argument("--mysql", metavar="DATABASE", help="scratch MySQL database (tables from schema.sql)")
+
+
+def sizes(args):
+    items, history_rows = SIZES[args.size]
+    return args.items or items, args.history or history_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a database with reproducible synthetic pharmacy data.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    items, history_rows = sizes(args)
+    connection = connect(args.sqlite, args.mysql)
+    try:
+        seconds = generate(connection, items, history_rows, args.seed)
+    finally:
+        connection.close()
+    print(f"Generated {items:,} medicines and {history_rows:,} history rows in {seconds:.1f}s.")
@@ -0,0 +1,239 @@
+# Bulk import of supplier delivery files.
+# Reads a delivery CSV in one streaming pass, validates every line and writes
+# the good rows in batches. Each batch is a single transaction:
+#   - one lookup for medicines that already exist (same name and supplier, in any case)
+#   - one multi-row INSERT ... ON DUPLICATE KEY UPDATE for those, one multi-row INSERT for new ones
+#   - one executemany for the matching StockHistory rows, plus the snapshot rollups
+# Bad lines are skipped and reported with their line numbers, and so are lines
+# for medicines whose stock is kept in lots (medicine_lots.py): their stock only
+# changes by receiving or dispensing a lot.
+#
+#   python bulk_import.py delivery.csv            # delivered quantities are added to stock
+#   python bulk_import.py stocktake.csv --set     # quantities replace the current stock
+#
+# Expected columns (header names are case-insensitive, "MFG Date" works as well as mfg_date):
+#   name, category, price, quantity, mfg_date, exp_date, supplier
+
+import argparse
+import csv
+import time
+from datetime import date, datetime
+
+import mysql.connector
+
+import stock_snapshots
+from db_config import DB_CONFIG
+
+BATCH_SIZE = 1000  # Rows per transaction
+REQUIRED_COLUMNS = ("name", "price", "quantity", "mfg_date", "exp_date")
+OPTIONAL_COLUMNS = ("category", "supplier")
+COLUMN_WIDTHS = {"name": 100, "category": 50, "supplier": 100}  # VARCHAR sizes in schema.sql
+
+
+def normalise_header(name):
+    return name.strip().lower().replace(" ", "_")
+
+
+def parse_line(record):
+    """Validates one CSV record, returns the medicine tuple or raises ValueError with the reason."""
+    name = (record.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is empty")
+    try:
+        price = float(record["price"])
+    except (TypeError, ValueError):
+        raise ValueError(f"price {record.get('price')!r} is not a number")
+    try:
+        quantity = int(record["quantity"])
+    except (TypeError, ValueError):
+        raise ValueError(f"quantity {record.get('quantity')!r} is not a whole number")
+    if price < 0 or quantity < 0:
+        raise ValueError("price and quantity cannot be negative")
+    try:
+        mfg_date = datetime.strptime(record["mfg_date"].strip(), '%Y-%m-%d').date()
+        exp_date = datetime.strptime(record["exp_date"].strip(), '%Y-%m-%d').date()
+    except (AttributeError, ValueError):
+        raise ValueError("dates must be YYYY-MM-DD")
+    if exp_date < mfg_date:
+        raise ValueError("exp_date is before mfg_date")
+    category = (record.get("category") or "").strip()
+    supplier = (record.get("supplier") or "").strip()
+    # Strict mode would fail the whole batch on it
+    for column, value in (("name", name), ("category", category), ("supplier", supplier)):
+        if len(value) > COLUMN_WIDTHS[column]:
+            raise ValueError(f"{column} is longer than {COLUMN_WIDTHS[column]} characters")
+    return name, category, price, quantity, mfg_date, exp_date, supplier
+
+
+def read_batches(f, errors, batch_size=BATCH_SIZE):
+    """Streams validated rows from an open CSV file as (line numbers, rows) batches; bad lines go to errors."""
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None:
+        raise ValueError("the file is empty")
+    reader.fieldnames = [normalise_header(name) for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+
+    lines, batch = [], []
+    for record in reader:
+        try:
+            batch.append(parse_line(record))
+        except ValueError as err:
+            errors.append((reader.line_num, str(err)))
+            continue
+        lines.append(reader.line_num)
+        if len(batch) >= batch_size:
+            yield lines, batch
+            lines, batch = [], []
+    if batch:
+        yield lines, batch
+
+
+def medicine_key(name, supplier):
+    """What tells medicines apart, compared the way the table's case-insensitive collation does."""
+    return name.strip().casefold(), (supplier or "").strip().casefold()
+
+
+def find_existing(cursor, keys):
+    """Locks the medicines that already exist for the (name, supplier) keys.
+
+    Returns {medicine_key(name, supplier): (id, quantity, category)}.
+    """
+    if not keys:
+        return {}
+    # Plain columns, so both halves are ranges on idx_medicines_name_supplier; a
+    # blank supplier in the file also matches rows whose supplier is NULL
+    where = f"(name, supplier) IN ({', '.join(['(%s, %s)'] * len(keys))})"
+    params = [value for key in keys for value in key]
+    no_supplier = [name for name, supplier in keys if supplier == '']
+    if no_supplier:
+        where += f" OR (supplier IS NULL AND name IN ({', '.join(['%s'] * len(no_supplier))}))"
+        params += no_supplier
+    cursor.execute(f"SELECT id, name, supplier, quantity, category FROM Medicines WHERE {where} FOR UPDATE", params)
+    return {medicine_key(name, supplier): (medicine_id, quantity, category)
+            for medicine_id, name, supplier, quantity, category in cursor.fetchall()}
+
+
+def lot_tracked(cursor, medicine_ids):
+    """The ids among medicine_ids that have lots."""
+    if not medicine_ids:
+        return set()
+    cursor.execute(f"SELECT DISTINCT medicine_id FROM MedicineLots "
+                   f"WHERE medicine_id IN ({', '.join(['%s'] * len(medicine_ids))})", list(medicine_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def write_batch(cursor, batch, add_quantities=True, today=None):
+    """Upserts one batch of parsed rows plus their history; returns (inserted, updated, skipped).
+
+    skipped holds the medicine_key() of the rows left out because the
+    medicine's stock is kept in lots.
+    """
+    today = today or date.today()
+    # The same medicine twice in one batch (in any case): later lines win, delivered quantities add up
+    merged = {}
+    for row in batch:
+        key = medicine_key(row[0], row[6])
+        if key in merged and add_quantities:
+            row = row[:3] + (merged[key][3] + row[3],) + row[4:]
+        merged[key] = row
+
+    existing = find_existing(cursor, [(row[0], row[6]) for row in merged.values()])
+    # The rows are locked by now, and lot operations lock them first too
+    with_lots = lot_tracked(cursor, [medicine_id for medicine_id, _, _ in existing.values()])
+    updates, inserts, changes, skipped = [], [], [], set()
+    for key, row in merged.items():
+        if key in existing and existing[key][0] in with_lots:
+            skipped.add(key)
+        elif key in existing:
+            medicine_id, old_quantity, old_category = existing[key]
+            quantity = old_quantity + row[3] if add_quantities else row[3]
+            updates.append((medicine_id,) + row[:3] + (quantity,) + row[4:])
+            changes.append((medicine_id, quantity, row[1], old_quantity, old_category))
+        else:
+            inserts.append(row)
+
+    if updates:
+        cursor.executemany("""
+            INSERT INTO Medicines (id, name, category, price, quantity, mfg_date, exp_date, supplier)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE category = VALUES(category), price = VALUES(price), quantity = VALUES(quantity),
+                mfg_date = VALUES(mfg_date), exp_date = VALUES(exp_date)
+        """, updates)
+    if inserts:
+        cursor.executemany("""
+            INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, inserts)
+        # Ids of a multi-row insert are not guaranteed to be consecutive, so read them back
+        created = find_existing(cursor, [(row[0], row[6]) for row in inserts])
+        for row in inserts:
+            medicine_id = created[medicine_key(row[0], row[6])][0]
+            changes.append((medicine_id, row[3], row[1], 0, None))
+
+    history = [(medicine_id, today, quantity) for medicine_id, quantity, _, old_quantity, _ in changes
+               if quantity != old_quantity]
+    if history:
+        cursor.executemany("INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (%s, %s, %s)",
+                           history)
+    stock_snapshots.record_changes(cursor, today, changes)
+    return len(inserts), len(updates), skipped
+
+
+def import_csv(connection, path, add_quantities=True, batch_size=BATCH_SIZE):
+    """Imports a delivery file. Returns a summary dict with counts, bad lines and rows/sec."""
+    errors = []
+    inserted = updated = 0
+    started = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for lines, batch in read_batches(f, errors, batch_size):
+                try:
+                    batch_inserted, batch_updated, skipped = write_batch(cursor, batch, add_quantities)
+                    connection.commit()
+                except mysql.connector.Error:
+                    connection.rollback()
+                    raise
+                inserted += batch_inserted
+                updated += batch_updated
+                errors.extend((line, "stock is kept in lots, receive it as a lot instead")
+                              for line, row in zip(lines, batch) if medicine_key(row[0], row[6]) in skipped)
+    finally:
+        cursor.close()
+    errors.sort()
+    seconds = time.perf_counter() - started
+    rows = inserted + updated
+    return {"inserted": inserted, "updated": updated, "errors": errors, "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds else 0.0}
+
+
+def format_summary(summary, max_errors=20):
+    lines = [f"{summary['inserted']} new and {summary['updated']} existing medicines imported "
+             f"in {summary['seconds']:.2f}s ({summary['rows_per_sec']:,.0f} rows/sec)."]
+    if summary["errors"]:
+        lines.append(f"{len(summary['errors'])} line(s) skipped:")
+        lines.extend(f"  line {line}: {reason}" for line, reason in summary["errors"][:max_errors])
+        if len(summary["errors"]) > max_errors:
+            lines.append(f"  ... and {len(summary['errors']) - max_errors} more")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a supplier delivery CSV into the inventory.")
+    parser.add_argument("path", help="CSV file with name, category, price, quantity, mfg_date, exp_date, supplier")
+    parser.add_argument("--set", action="store_true", help="replace stock quantities instead of adding to them")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        summary = import_csv(connection, args.path, add_quantities=not args.set, batch_size=args.batch_size)
+    except (mysql.connector.Error, ValueError, OSError) as err:
+        raise SystemExit(f"Import failed: {err}")
+    finally:
+        connection.close()
+    print(format_summary(summary))
+    if summary["errors"]:
+        raise SystemExit(1)
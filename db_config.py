@@ -0,0 +1,16 @@
+# MySQL connection settings, shared by the app and the command line tools.
+# --- IMPORTANT ---
+# Replace with your own MySQL credentials before running.
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",  # <-- Change this to your MySQL username
+    "password": "daniel",  # <-- Change this to your MySQL password
+    "database": "pharmacy-final",
+}
+
+# Where the app keeps its data (see storage.py):
+#   "mysql"   - the MySQL server above
+#   "sqlite"  - a local SQLite file only, for terminals without the server
+#   "replica" - writes go to MySQL, reads are served from a local SQLite copy
+STORAGE_MODE = "mysql"
+LOCAL_DB_PATH = "pharmacy-local.db"  # SQLite file for the "sqlite" and "replica" modes
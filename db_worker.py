@@ -0,0 +1,228 @@
+# Background database worker.
+# Queries run on a small thread pool with connections from a
+# mysql.connector.pooling pool, so a slow query or a lock wait never freezes
+# the Tk window. Tk is not thread safe, so workers never touch widgets: they
+# put their results on a queue, and poll() hands them to the callbacks on the
+# Tk thread through root.after.
+#
+# Jobs can be given a key (like "view" for whatever fills the main table).
+# Submitting a new job with the same key supersedes the old one: its result
+# is thrown away, and if it is still running in MySQL it gets a KILL QUERY.
+#
+# Reads of the local SQLite file (sqlite and replica modes, see storage.py) go
+# through here too, on their own threads with one SQLite connection each;
+# a superseded one is stopped with connection.interrupt().
+
+import queue
+import sqlite3
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+from mysql.connector import pooling
+
+import instrumentation
+
+WORKER_THREADS = 4
+# Two per worker (a job's own, plus the one an import delivery takes inside its
+# job to commit batch by batch), one kept by the UI for writes, one for KILL QUERY
+POOL_SIZE = WORKER_THREADS * 2 + 2
+LOCAL_THREADS = 2  # SQLite reader threads; WAL lets them read while the Tk thread writes
+POLL_INTERVAL_MS = 30  # How often the Tk thread checks for finished jobs
+
+# --- Worker State ---
+root = None
+pool = None
+executor = None
+local_executor = None
+local_open = None  # () -> new SQLite connection, called once per reader thread
+local = threading.local()  # .connection of the reader thread
+results = queue.Queue()  # (key, generation, callback, value) from the workers
+generations = {}  # key -> generation of the newest job submitted with that key
+running = {}  # key -> (generation, MySQL connection id or SQLite connection) of the job running now
+lock = threading.Lock()
+pending = 0  # Jobs submitted but not yet delivered (drives the busy indicator)
+busy_callback = None  # Called with True/False when the worker becomes busy/idle
+
+
+def init(tk_root, on_busy_change=None, **db_config):
+    """Creates the connection pool and the worker threads, then starts polling."""
+    global pool, executor
+    start_polling(tk_root, on_busy_change)
+    pool = pooling.MySQLConnectionPool(pool_name="pharmacy", pool_size=POOL_SIZE, **db_config)
+    executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="db-worker")
+
+
+def init_local(tk_root, open_connection, on_busy_change=None):
+    """Starts the SQLite reader threads; open_connection() gives each of them its connection."""
+    global local_executor, local_open
+    start_polling(tk_root, on_busy_change)
+    local_open = open_connection
+    local_executor = ThreadPoolExecutor(max_workers=LOCAL_THREADS, thread_name_prefix="sqlite-reader")
+
+
+def start_polling(tk_root, on_busy_change):
+    global root, busy_callback
+    if root is None:
+        root = tk_root
+        busy_callback = on_busy_change
+        root.after(POLL_INTERVAL_MS, poll)
+
+
+def get_connection():
+    """Borrows a connection from the pool (remember to close() it to give it back)."""
+    return pool.get_connection()
+
+
+def submit(task, on_done, on_error=None, key=None):
+    """Runs task(cursor) on a worker thread and calls on_done(result) on the Tk thread.
+
+    on_error(err) is called instead if the task raises a mysql.connector.Error.
+    If key is given, any earlier job with the same key is superseded.
+    """
+    queue_job(executor, task, on_done, on_error, key, False)
+
+
+def submit_local(task, on_done, on_error=None, key=None):
+    """Same as submit(), with task(cursor) on the local SQLite file (on_error gets sqlite3.Error)."""
+    queue_job(local_executor, task, on_done, on_error, key, True)
+
+
+def queue_job(pool_executor, task, on_done, on_error, key, is_local):
+    global pending
+    generation = None
+    if key is not None:
+        generation = supersede(key)
+    pending += 1
+    if pending == 1 and busy_callback:
+        busy_callback(True)
+    pool_executor.submit(run_job, task, on_done, on_error, key, generation, is_local)
+
+
+def cancel(key):
+    """Supersedes the job with this key without starting a new one."""
+    supersede(key)
+
+
+def supersede(key):
+    """Bumps the generation of key and stops the job running under it, if any; returns the new generation."""
+    with lock:
+        generation = generations.get(key, 0) + 1
+        generations[key] = generation
+        in_flight = running.get(key)
+        if in_flight is not None and isinstance(in_flight[1], sqlite3.Connection):
+            # Under the lock: the reader thread cannot move on to another job meanwhile
+            in_flight[1].interrupt()
+            in_flight = None
+    if in_flight is not None:
+        start_kill(key, in_flight)
+    return generation
+
+
+def is_current(key, generation):
+    return key is None or generations.get(key) == generation
+
+
+def run_job(task, on_done, on_error, key, generation, is_local):
+    """Worker thread body: runs one task on a pooled connection (or the thread's own SQLite one)."""
+    if not is_current(key, generation):
+        results.put((key, generation, None, None))  # Superseded before it even started
+        return
+    connection = None
+    try:
+        if is_local:
+            if getattr(local, "connection", None) is None:
+                local.connection = local_open()
+            reader = handle = local.connection
+        else:
+            reader = connection = pool.get_connection()
+            handle = connection.connection_id
+        if key is not None:
+            with lock:
+                running[key] = (generation, handle)
+        cursor = instrumentation.timed_cursor(reader.cursor())
+        try:
+            value = task(cursor)
+        finally:
+            cursor.close()
+        results.put((key, generation, on_done, value))
+    except (mysql.connector.Error, sqlite3.Error) as err:
+        results.put((key, generation, on_error or report_error, err))
+    except Exception as err:  # A bug in a task must not leave the busy indicator stuck
+        results.put((key, generation, report_error, err))
+    finally:
+        if key is not None:
+            with lock:
+                if running.get(key, (None,))[0] == generation:
+                    del running[key]
+        if connection is not None:
+            connection.close()  # Back to the pool
+
+
+def report_error(err):
+    print(f"Background query failed: {err}")
+
+
+def start_kill(key, in_flight):
+    # Own thread, the worker threads may all be stuck behind the query being killed
+    threading.Thread(target=kill_query, args=(key, in_flight), daemon=True).start()
+
+
+def kill_query(key, in_flight):
+    """Stops a superseded query that is still running in MySQL.
+
+    in_flight is the (generation, connection id) the job was running as. The
+    KILL is only sent if the job is still running there, and with the lock
+    held, so the job cannot finish and hand its connection to another job in
+    between (KILL QUERY would then stop that one).
+    """
+    connection_id = in_flight[1]
+    try:
+        connection = pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            with lock:
+                if running.get(key) == in_flight:
+                    cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        finally:
+            connection.close()
+    except mysql.connector.Error as err:
+        print(f"Could not cancel query {connection_id}: {err}")
+
+
+def poll():
+    """Delivers finished jobs to their callbacks. Runs on the Tk thread."""
+    global pending
+    try:
+        while True:
+            try:
+                key, generation, callback, value = results.get_nowait()
+            except queue.Empty:
+                break
+            pending -= 1
+            if pending == 0 and busy_callback:
+                deliver(busy_callback, False)
+            if callback is not None and is_current(key, generation):
+                deliver(callback, value)
+    finally:
+        # Even if something above fails, later results must still be delivered
+        root.after(POLL_INTERVAL_MS, poll)
+
+
+def deliver(callback, value):
+    """Calls one callback; a failing one is logged, it must not hold up the results queued behind it."""
+    try:
+        callback(value)
+    except Exception:
+        print(f"Callback {getattr(callback, '__name__', callback)} failed:", file=sys.stderr)
+        traceback.print_exc()
+
+
+def shutdown():
+    """Stops accepting jobs; running queries are left to finish on their own."""
+    for pool_executor in (executor, local_executor):
+        if pool_executor is not None:
+            pool_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,143 @@
+# Expiry report exporter.
+# Writes every expired, expiring-soon and low-stock medicine to a CSV file
+# (same layout as expiry_report_20251020.csv) or, optionally, a compressed
+# Parquet file. Rows are streamed from MySQL through an unbuffered cursor in
+# fixed-size batches and written out batch by batch, so memory stays flat
+# however big the Medicines table is. No Tk needed, so it can run from cron:
+#
+#   python expiry_report.py
+#   python expiry_report.py --format parquet --days 60 --output reports/expiry.parquet
+
+import argparse
+import csv
+import time
+from datetime import date
+
+from inventory_queries import DEFAULT_EXPIRY_HORIZON, LOW_STOCK, select_medicines
+
+BATCH_SIZE = 5000  # Rows fetched from the server (and written out) at a time
+CSV_HEADER = ["Report Type", "ID", "Name", "Category", "Price", "Quantity", "MFG Date", "EXP Date", "Supplier"]
+REPORT_TYPES = {'expired': "Expired", 'expiring_soon': "Expiring Soon"}
+
+
+def classify(rows, threshold):
+    """Turns a batch of medicine rows into report rows; a row can be both expiring and low stock.
+
+    threshold None means each medicine's own reorder point.
+    """
+    report = []
+    for row in rows:
+        values = list(row[:8])
+        status = row[8]
+        if status in REPORT_TYPES:
+            report.append([REPORT_TYPES[status]] + values)
+        if row[4] < (row[9] if threshold is None else threshold):
+            report.append(["Low Stock"] + values)
+    return report
+
+
+def stream_at_risk(cursor, horizon, threshold, batch_size=BATCH_SIZE):
+    """Yields batches of at-risk medicine rows straight off an unbuffered cursor."""
+    # No ORDER BY: rows go out in scan order, so the server never has to sort the result
+    if threshold is None:
+        cursor.execute(select_medicines(f"WHERE exp_date <= CURDATE() + INTERVAL %s DAY OR {LOW_STOCK}"),
+                       (horizon, horizon))
+    else:
+        cursor.execute(select_medicines("WHERE exp_date <= CURDATE() + INTERVAL %s DAY OR quantity < %s"),
+                       (horizon, horizon, threshold))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+# --- Writers ---
+def write_csv(batches, path, threshold):
+    counts = {}
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for rows in batches:
+            report = classify(rows, threshold)
+            for line in report:
+                counts[line[0]] = counts.get(line[0], 0) + 1
+            writer.writerows(report)
+    return counts
+
+
+def write_parquet(batches, path, threshold):
+    # pyarrow is optional, only needed for this format
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow (pip install pyarrow).")
+
+    schema = pa.schema([
+        ("report_type", pa.string()), ("id", pa.int32()), ("name", pa.string()), ("category", pa.string()),
+        ("price", pa.decimal128(10, 2)), ("quantity", pa.int32()), ("mfg_date", pa.date32()),
+        ("exp_date", pa.date32()), ("supplier", pa.string()),
+    ])
+    counts = {}
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in batches:
+            report = classify(rows, threshold)
+            if not report:
+                continue
+            for line in report:
+                counts[line[0]] = counts.get(line[0], 0) + 1
+            columns = [list(column) for column in zip(*report)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    return counts
+
+
+def export_report(path, fmt="csv", horizon=DEFAULT_EXPIRY_HORIZON, threshold=None,
+                  batch_size=BATCH_SIZE):
+    """Runs the export and returns (rows scanned, rows written per report type, seconds taken)."""
+    import mysql.connector
+
+    from db_config import DB_CONFIG
+
+    connection = mysql.connector.connect(**DB_CONFIG)
+    cursor = connection.cursor(buffered=False)
+    scanned = 0
+
+    def counted(batches):
+        nonlocal scanned
+        for rows in batches:
+            scanned += len(rows)
+            yield rows
+
+    started = time.perf_counter()
+    try:
+        batches = counted(stream_at_risk(cursor, horizon, threshold, batch_size))
+        writer = write_parquet if fmt == "parquet" else write_csv
+        counts = writer(batches, path, threshold)
+    finally:
+        cursor.close()
+        connection.close()
+    return scanned, counts, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    import mysql.connector
+
+    parser = argparse.ArgumentParser(description="Export expired, expiring and low-stock medicines.")
+    parser.add_argument("--output", help="output file (default expiry_report_YYYYMMDD.csv/.parquet)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--days", type=int, default=DEFAULT_EXPIRY_HORIZON, help="expiring-soon horizon in days")
+    parser.add_argument("--threshold", type=int,
+                        help="low stock below this quantity (default: each medicine's reorder point)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    output = args.output or f"expiry_report_{date.today():%Y%m%d}.{args.format}"
+    try:
+        scanned, counts, seconds = export_report(output, args.format, args.days, args.threshold, args.batch_size)
+    except mysql.connector.Error as err:
+        raise SystemExit(f"Export failed: {err}")
+    written = sum(counts.values())
+    summary = ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())) or "nothing to report"
+    print(f"Wrote {written} report rows to {output} ({summary}).")
+    print(f"Streamed {scanned} medicines in {seconds:.2f}s ({scanned / max(seconds, 1e-9):,.0f} rows/sec).")
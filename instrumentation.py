@@ -0,0 +1,255 @@
+# Instrumentation.
+# Times the hot paths: every database statement (through timed_cursor()) and
+# every UI refresh (through the timed() decorator), with the rows and an
+# estimate of the bytes each one moved. Kept in memory:
+#   - the last RECENT_LIMIT operations, for the debug panel in main.py (F12)
+#   - per operation, cumulative histogram buckets (for Prometheus) and the last
+#     WINDOW durations (for rolling p50/p99)
+# Statements slower than SLOW_QUERY_MS are written to SLOW_LOG_PATH (JSONL)
+# together with their EXPLAIN plan, and noted on stderr. The path comes from
+# the PHARMACY_SLOW_LOG environment variable (empty: no file), else
+# slow_queries.jsonl in the working directory.
+#
+# Metrics export as Prometheus text (prometheus_text(), also served by
+# api_server.py at /metrics) or as JSONL (write_jsonl()).
+#
+# Nothing here imports Tk or a database driver; cursors of either backend work.
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache, wraps
+
+ENABLED = True  # False hands out plain cursors and skips the UI timing
+SLOW_QUERY_MS = 200  # Statements slower than this are logged with their plan
+SLOW_LOG_PATH = os.environ.get("PHARMACY_SLOW_LOG", "slow_queries.jsonl")
+RECENT_LIMIT = 500  # Operations kept for the debug panel
+WINDOW = 1000  # Durations per operation used for the rolling percentiles
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+LABEL_LENGTH = 120  # SQL is shortened to this for the operation name
+
+# --- Metrics State ---
+lock = threading.Lock()
+recent = deque(maxlen=RECENT_LIMIT)  # Newest last: (wall time, kind, name, seconds, rows, bytes)
+slow = deque(maxlen=50)  # Slow-query log entries of this session
+stats = {}  # (kind, name) -> {"buckets", "count", "sum", "rows", "bytes", "window"}
+
+
+def record(kind, name, seconds, rows=0, nbytes=0):
+    """Adds one finished operation to the metrics."""
+    with lock:
+        recent.append((time.time(), kind, name, seconds, rows, nbytes))
+        entry = stats.get((kind, name))
+        if entry is None:
+            entry = stats[(kind, name)] = {"buckets": [0] * (len(BUCKETS) + 1), "count": 0, "sum": 0.0,
+                                           "rows": 0, "bytes": 0, "window": deque(maxlen=WINDOW)}
+        entry["buckets"][bisect_left(BUCKETS, seconds)] += 1
+        entry["count"] += 1
+        entry["sum"] += seconds
+        entry["rows"] += rows
+        entry["bytes"] += nbytes
+        entry["window"].append(seconds)
+
+
+def timed(kind, name=None, rows_of=None):
+    """Decorator timing every call; rows_of(args) gives the number of rows it handled."""
+    def decorate(function):
+        label = name or f"{function.__module__}.{function.__name__}"
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(kind, label, time.perf_counter() - start, rows_of(args) if rows_of else 0)
+        return wrapper
+    return decorate
+
+
+# --- Database Statements ---
+@lru_cache(maxsize=1024)  # The same few statements run over and over
+def statement_name(sql):
+    """Short, stable name for a statement: whitespace collapsed, long column lists, IN lists and VALUES rows folded."""
+    sql = re.sub(r"\s+", " ", sql).strip()
+    sql = re.sub(r"^SELECT .{40,}? FROM ", "SELECT ... FROM ", sql)  # The WHERE is what tells statements apart
+    sql = re.sub(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)", "(...)", sql)
+    sql = re.sub(r"(\(\.\.\.\)\s*,\s*)+\(\.\.\.\)", "(...)", sql)
+    return sql if len(sql) <= LABEL_LENGTH else sql[:LABEL_LENGTH - 3] + "..."
+
+
+def row_bytes(row):
+    """Rough size of a row on the wire: text and blobs by length, anything else 8 bytes."""
+    return sum(len(value) if isinstance(value, (str, bytes, bytearray)) else 0 if value is None else 8
+               for value in row)
+
+
+def timed_cursor(cursor):
+    return TimedCursor(cursor) if ENABLED else cursor
+
+
+class TimedCursor:
+    """Wraps a DB-API cursor; each statement is one operation, including the time spent fetching its rows.
+
+    The rows' bytes are estimated from the first row of every fetch, so
+    measuring stays cheap on big results.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._current = None  # [sql, params, seconds, rows, bytes] of the statement being read
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, *args, **kwargs):
+        return self._run(self._cursor.execute, sql, args, kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._run(self._cursor.executemany, sql, args, kwargs)
+
+    def _run(self, method, sql, args, kwargs):
+        self._finish()
+        start = time.perf_counter()
+        result = method(sql, *args, **kwargs)
+        seconds = time.perf_counter() - start
+        self._current = [sql, args[0] if args and method == self._cursor.execute else None, seconds, 0, 0]
+        return self if result is self._cursor else result
+
+    def _fetched(self, start, rows):
+        if self._current is not None and rows:
+            self._current[3] += len(rows)
+            self._current[4] += row_bytes(rows[0]) * len(rows)
+        if self._current is not None:
+            self._current[2] += time.perf_counter() - start
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, [row] if row is not None else [])
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(start, rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def _finish(self):
+        """Records the previous statement once its rows have been read (the next execute or close)."""
+        if self._current is None:
+            return
+        sql, params, seconds, rows, nbytes = self._current
+        self._current = None
+        if not rows and getattr(self._cursor, "rowcount", -1) > 0:
+            rows = self._cursor.rowcount  # Rows written
+        name = statement_name(sql)
+        record("db", name, seconds, rows, nbytes)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            log_slow(self._cursor, sql, params, name, seconds, rows)
+
+
+# --- Slow Queries ---
+def explain(cursor, sql, params):
+    """The plan of a slow SELECT as a list of lines; runs on the cursor that ran it, its rows are read by now."""
+    if not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+        return []
+    try:
+        if isinstance(cursor, sqlite3.Cursor):
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params or ())
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = cursor.column_names
+        return [", ".join(f"{column}={value}" for column, value in zip(columns, row) if value is not None)
+                for row in cursor.fetchall()]
+    except Exception as err:  # Never let the profiler break the query path
+        return [f"EXPLAIN failed: {err}"]
+
+
+def log_slow(cursor, sql, params, name, seconds, rows):
+    entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "ms": round(seconds * 1000, 1), "rows": rows,
+             "sql": re.sub(r"\s+", " ", sql).strip(), "params": repr(params)[:500],
+             "plan": explain(cursor, sql, params)}
+    with lock:
+        slow.append(entry)
+        if SLOW_LOG_PATH:
+            try:
+                with open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as err:
+                print(f"Could not write the slow-query log: {err}", file=sys.stderr)
+    print(f"Slow query ({entry['ms']} ms, {rows} rows): {name}", file=sys.stderr)
+
+
+# --- Reports ---
+def percentiles(window):
+    ordered = sorted(window)
+    pick = lambda share: ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else 0.0
+    return pick(0.5), pick(0.99)
+
+
+def summary():
+    """One dict per operation: count, total/p50/p99 milliseconds, rows and bytes; biggest total time first."""
+    with lock:
+        items = [(kind, name, dict(entry, window=list(entry["window"]))) for (kind, name), entry in stats.items()]
+    result = []
+    for kind, name, entry in items:
+        p50, p99 = percentiles(entry["window"])
+        result.append({"kind": kind, "name": name, "count": entry["count"], "total_ms": round(entry["sum"] * 1000, 2),
+                       "p50_ms": round(p50 * 1000, 3), "p99_ms": round(p99 * 1000, 3), "rows": entry["rows"],
+                       "bytes": entry["bytes"]})
+    return sorted(result, key=lambda item: -item["total_ms"])
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    escape = lambda value: value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+    with lock:
+        items = sorted((key, dict(entry)) for key, entry in stats.items())
+    lines = ["# HELP pharmacy_operation_seconds Time taken by database statements and UI refreshes.",
+             "# TYPE pharmacy_operation_seconds histogram"]
+    totals = []
+    for (kind, name), entry in items:
+        labels = f'kind="{kind}",name="{escape(name)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), entry["buckets"]):
+            cumulative += count
+            lines.append(f'pharmacy_operation_seconds_bucket{{{labels},le="{"+Inf" if bound == float("inf") else bound}"}} '
+                         f'{cumulative}')
+        lines.append(f"pharmacy_operation_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+        lines.append(f"pharmacy_operation_seconds_count{{{labels}}} {entry['count']}")
+        totals.append((labels, entry))
+    for metric, field, text in (("rows", "rows", "Rows returned or written."),
+                                ("bytes", "bytes", "Estimated bytes of the rows returned.")):
+        lines += [f"# HELP pharmacy_operation_{metric}_total {text}", f"# TYPE pharmacy_operation_{metric}_total counter"]
+        lines += [f"pharmacy_operation_{metric}_total{{{labels}}} {entry[field]}" for labels, entry in totals]
+    return "\n".join(lines) + "\n"
+
+
+def write_jsonl(path):
+    """Appends the summary to path, one JSON object per operation, all stamped with the same time."""
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(path, "a", encoding="utf-8") as f:
+        for item in summary():
+            f.write(json.dumps(dict(item, time=stamp)) + "\n")
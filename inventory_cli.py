@@ -0,0 +1,141 @@
+# Inventory command line.
+# Runs the inventory_core operations headlessly and prints the result as JSON
+# (default) or CSV, for cron jobs, shell scripts and other programs. It starts
+# without Tk or matplotlib, so a query costs a fraction of opening the window:
+#
+#   python -m inventory_cli search amox
+#   python -m inventory_cli expiry --days 60 --format csv
+#   python -m inventory_cli low-stock
+#   python -m inventory_cli history 12 15 --from 2025-01-01
+#   python -m inventory_cli lots 12
+#   python -m inventory_cli total-stock --on 2025-06-30
+#   python -m inventory_cli chart 12 15 --output stock.png
+#   python -m inventory_cli export --output expiry.csv
+#
+# --storage/--db override STORAGE_MODE and LOCAL_DB_PATH from db_config.py.
+
+import argparse
+import csv
+import json
+import sys
+from datetime import date
+
+import instrumentation
+import inventory_core
+from inventory_queries import DEFAULT_EXPIRY_HORIZON, RESOLUTIONS
+
+
+def print_records(rows, fmt):
+    records = [inventory_core.record(row) for row in rows]
+    if fmt == "json":
+        json.dump(records, sys.stdout, indent=2)
+        print()
+        return
+    writer = csv.DictWriter(sys.stdout, fieldnames=inventory_core.FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(records)
+
+
+def print_history(series, fmt):
+    if fmt == "json":
+        json.dump({str(medicine_id): [[str(day), int(quantity)] for day, quantity in zip(dates, quantities)]
+                   for medicine_id, (dates, quantities) in series.items()}, sys.stdout, indent=2)
+        print()
+        return
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(["medicine_id", "date", "quantity"])
+    for medicine_id, (dates, quantities) in series.items():
+        writer.writerows([medicine_id, str(day), int(quantity)] for day, quantity in zip(dates, quantities))
+
+
+def print_lots(lots, fmt):
+    records = [inventory_core.lot_record(lot) for lot in lots]
+    if fmt == "json":
+        json.dump(records, sys.stdout, indent=2)
+        print()
+        return
+    writer = csv.DictWriter(sys.stdout, fieldnames=inventory_core.LOT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(records)
+
+
+def run(args):
+    store, connection = inventory_core.connect(args.storage, args.db)
+    cursor = instrumentation.timed_cursor(connection.cursor())
+    try:
+        if args.command == "search":
+            print_records(inventory_core.search(store, cursor, args.query, args.days), args.format)
+        elif args.command == "expiry":
+            print_records(inventory_core.expiring(store, cursor, args.days), args.format)
+        elif args.command == "low-stock":
+            print_records(inventory_core.low_stock(store, cursor, args.days), args.format)
+        elif args.command == "history":
+            print_history(inventory_core.stock_history(store, cursor, args.ids, args.start, args.end), args.format)
+        elif args.command == "lots":
+            print_lots(inventory_core.lots(store, cursor, args.id), args.format)
+        elif args.command == "total-stock":
+            total = inventory_core.total_stock_on(store, cursor, args.on)
+            if args.format == "json":
+                print(json.dumps({"date": str(args.on), "total_quantity": total}))
+            else:
+                print(f"date,total_quantity\n{args.on},{total}")
+        elif args.command == "chart":
+            import timeline_chart  # matplotlib (Agg), only loaded for charts
+            output = args.output or f"stock_chart_{date.today():%Y%m%d}.png"
+            drawn = timeline_chart.export_png(store, cursor, args.ids, output, args.start, args.end, args.resolution)
+            print(f"Drew {drawn} of {len(args.ids)} medicines to {output}.", file=sys.stderr)
+        elif args.command == "export":
+            output = args.output or f"expiry_report_{date.today():%Y%m%d}.{args.format}"
+            counts = inventory_core.export(store, cursor, output, args.format, args.days)
+            summary = ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())) or "nothing to report"
+            print(f"Wrote {sum(counts.values())} report rows to {output} ({summary}).", file=sys.stderr)
+    finally:
+        cursor.close()
+        connection.close()
+    if args.profile:
+        for item in instrumentation.summary():
+            print(f"{item['total_ms']:9.2f} ms  {item['count']:>4}x  {item['rows']:>7} rows  {item['name']}",
+                  file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m inventory_cli", description="Query the medicine inventory.")
+    parser.add_argument("--storage", choices=("mysql", "sqlite", "replica"), help="default: STORAGE_MODE")
+    parser.add_argument("--db", help="SQLite file for the sqlite/replica modes (default: LOCAL_DB_PATH)")
+    parser.add_argument("--profile", action="store_true", help="print the time each statement took to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, help_text, formats=("json", "csv")):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("--format", choices=formats, default=formats[0])
+        sub.add_argument("--days", type=int, default=DEFAULT_EXPIRY_HORIZON, help="expiring-soon horizon in days")
+        return sub
+
+    command("search", "prefix search on name, category and supplier").add_argument("query")
+    command("expiry", "expired and expiring medicines, soonest first")
+    command("low-stock", "medicines below their reorder point")
+    history = command("history", "end-of-day stock of the given medicines")
+    history.add_argument("ids", type=int, nargs="+", metavar="ID")
+    history.add_argument("--from", dest="start", type=date.fromisoformat, help="YYYY-MM-DD")
+    history.add_argument("--to", dest="end", type=date.fromisoformat, help="YYYY-MM-DD")
+    command("lots", "a medicine's lots, in the order they are dispensed").add_argument("id", type=int)
+    command("total-stock", "units in stock across all medicines at the end of a day").add_argument(
+        "--on", type=date.fromisoformat, default=date.today(), help="YYYY-MM-DD (default today)")
+    chart = command("chart", "draw the stock timeline of the given medicines to a PNG", formats=("png",))
+    chart.add_argument("ids", type=int, nargs="+", metavar="ID")
+    chart.add_argument("--from", dest="start", type=date.fromisoformat, help="YYYY-MM-DD")
+    chart.add_argument("--to", dest="end", type=date.fromisoformat, help="YYYY-MM-DD")
+    chart.add_argument("--resolution", choices=RESOLUTIONS, default="auto")
+    chart.add_argument("--output", help="default stock_chart_YYYYMMDD.png")
+    export = command("export", "write the expiry report file", formats=("csv", "parquet"))
+    export.add_argument("--output", help="default expiry_report_YYYYMMDD.csv/.parquet")
+    args = parser.parse_args(argv)
+
+    try:
+        run(args)
+    except inventory_core.database_errors() as err:
+        raise SystemExit(f"Database error: {err}")
+
+
+if __name__ == "__main__":
+    main()
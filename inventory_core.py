@@ -0,0 +1,163 @@
+# Inventory core.
+# The inventory operations (search, expiry check, low stock, stock history,
+# the expiry report, add/update/delete, lots) without any UI, so they can be used from cron jobs,
+# servers and scripts as well as from main.py. Nothing here imports Tk or
+# matplotlib, and the heavier modules (the MySQL driver, NumPy) are only
+# loaded by the operations that need them.
+#
+# Every operation takes (store, cursor) first, the same shape as the tasks
+# main.py hands to storage.submit(), so the window and the command line
+# (inventory_cli.py) run the exact same code.
+
+import sqlite3
+import sys
+from datetime import date
+from decimal import Decimal
+
+from db_config import DB_CONFIG, LOCAL_DB_PATH, STORAGE_MODE
+from inventory_queries import DEFAULT_EXPIRY_HORIZON
+
+FIELDS = ("id", "name", "category", "price", "quantity", "mfg_date", "exp_date", "supplier", "expiry_status",
+          "reorder_level", "reorder_point")  # What every medicine row holds, in order
+LOT_FIELDS = ("id", "lot_number", "quantity", "exp_date")
+REPORT_BATCH_SIZE = 5000  # Rows read (and written out) at a time by export()
+UNCHANGED = object()  # update_medicine(reorder_point=UNCHANGED) keeps the medicine's own reorder point
+
+
+def connect(storage_mode=None, local_db_path=None):
+    """Opens the database picked in db_config.py (or the mode given); returns (store, connection).
+
+    A replica is read from its local SQLite copy, like the window does.
+    """
+    storage_mode = storage_mode or STORAGE_MODE
+    if storage_mode in ("sqlite", "replica"):
+        import sqlite_store
+        return sqlite_store, sqlite_store.connect(local_db_path or LOCAL_DB_PATH)
+    import mysql.connector
+    import mysql_store
+    return mysql_store, mysql.connector.connect(**DB_CONFIG)
+
+
+def database_errors():
+    """The database error types of the drivers loaded so far, for except clauses."""
+    errors = [sqlite3.Error]
+    if "mysql.connector" in sys.modules:
+        errors.append(sys.modules["mysql.connector"].Error)
+    return tuple(errors)
+
+
+def record(row):
+    """A medicine row as a dict of plain JSON values (price as a number, dates as YYYY-MM-DD)."""
+    values = dict(zip(FIELDS, row))
+    values["price"] = float(values["price"])
+    values["mfg_date"] = str(values["mfg_date"])
+    values["exp_date"] = str(values["exp_date"])
+    return values
+
+
+# --- Operations ---
+def search(store, cursor, query, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Prefix search over name, category and supplier, best matches first."""
+    return store.search(cursor, query, horizon)
+
+
+def expiring(store, cursor, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Expired medicines and those expiring within horizon days, soonest first."""
+    return store.read_at_risk(cursor, horizon)
+
+
+def low_stock(store, cursor, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Medicines below their reorder point, furthest below first."""
+    return store.read_low_stock(cursor, horizon)
+
+
+def stock_history(store, cursor, medicine_ids, start=None, end=None):
+    """{medicine id: (dates, quantities)} with the end-of-day stock of each medicine, optionally within [start, end]."""
+    import stock_history as history  # NumPy
+    return history.group_series(*store.read_stock_history(cursor, medicine_ids, start, end))
+
+
+def total_stock_on(store, cursor, day):
+    """Units in stock across all medicines at the end of day."""
+    return store.read_total_stock_on(cursor, day)
+
+
+def lots(store, cursor, medicine_id):
+    """A medicine's lots, soonest expiry first (the order they are dispensed in)."""
+    return store.read_lots(cursor, medicine_id)
+
+
+def lot_record(lot):
+    values = dict(zip(LOT_FIELDS, lot))
+    values["exp_date"] = str(values["exp_date"])
+    return values
+
+
+def export(store, cursor, path, fmt="csv", horizon=DEFAULT_EXPIRY_HORIZON):
+    """Writes the expiry report (expired, expiring soon and low stock) to path; returns rows written per type."""
+    import expiry_report
+    batches = store.read_report_batches(cursor, horizon, REPORT_BATCH_SIZE)
+    if fmt == "parquet":
+        # Parquet columns are typed, SQLite hands back text
+        batches = ([typed(row) for row in rows] for rows in batches)
+        return expiry_report.write_parquet(batches, path, None)
+    return expiry_report.write_csv(batches, path, None)
+
+
+def typed(row):
+    """Row with a Decimal price and date objects, whatever the backend returned."""
+    day = lambda value: value if isinstance(value, date) else date.fromisoformat(str(value))
+    return row[:3] + (Decimal(str(row[3])), row[4], day(row[5]), day(row[6])) + tuple(row[7:])
+
+
+# --- Writes ---
+# Run inside store.run_transaction(), e.g.
+#   store.run_transaction(connection, lambda cursor: add_medicine(store, cursor, values))
+def add_medicine(store, cursor, values, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Adds a medicine; values are name, category, price, quantity, mfg_date, exp_date, supplier. Returns its row."""
+    medicine_id = store.add_medicine(cursor, *values)
+    return store.read_medicine(cursor, medicine_id, horizon)
+
+
+def update_medicine(store, cursor, medicine_id, values, reorder_point=UNCHANGED, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Updates a medicine and its own reorder point (None follows the category); returns its row, None if missing."""
+    current = store.read_medicine(cursor, medicine_id, horizon)
+    if current is None:
+        return None
+    store.update_medicine(cursor, medicine_id, *values, current[4], current[2])
+    if reorder_point is not UNCHANGED:
+        store.set_reorder_point(cursor, medicine_id, reorder_point)
+    return store.read_medicine(cursor, medicine_id, horizon)
+
+
+def delete_medicine(store, cursor, medicine_id):
+    """Deletes a medicine with its history; False if there was no such medicine."""
+    current = store.read_medicine(cursor, medicine_id, DEFAULT_EXPIRY_HORIZON)
+    if current is None:
+        return False
+    store.delete_medicine(cursor, medicine_id, current[2], current[4])
+    return True
+
+
+def receive_lot(store, cursor, medicine_id, lot_number, quantity, exp_date, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Adds quantity of a lot to a medicine's stock; returns the medicine's row, None if missing.
+
+    Raises medicine_lots.LotError if the lot is already in stock with another expiry.
+    """
+    if store.read_medicine(cursor, medicine_id, horizon) is None:
+        return None
+    store.receive_lot(cursor, medicine_id, lot_number, quantity, exp_date)
+    return store.read_medicine(cursor, medicine_id, horizon)
+
+
+def dispense(store, cursor, medicine_id, quantity, horizon=DEFAULT_EXPIRY_HORIZON):
+    """Takes quantity from a medicine's unexpired lots, first-expired-first-out.
+
+    Returns ([(lot_number, exp_date, taken), ...], the medicine's row), None if
+    there is no such medicine. Raises medicine_lots.LotError (and changes
+    nothing) if there is not enough stock.
+    """
+    if store.read_medicine(cursor, medicine_id, horizon) is None:
+        return None
+    taken = store.dispense(cursor, medicine_id, quantity)
+    return taken, store.read_medicine(cursor, medicine_id, horizon)
@@ -0,0 +1,32 @@
+# SQL shared by the app and the command line tools (no Tk in here).
+
+# Explicit column list, so extra bookkeeping columns (like updated_at) never reach the grid
+MEDICINE_COLUMNS = "id, name, category, price, quantity, mfg_date, exp_date, supplier"
+
+DEFAULT_EXPIRY_HORIZON = 30  # Days ahead that count as "expiring soon"
+LOW_STOCK_THRESHOLD = 10  # Default reorder point (also the schema default), below it counts as low stock
+# How far back a sync re-reads before its mark: a transaction that was open at
+# the mark commits rows stamped before it. Longer than any write transaction runs.
+SYNC_OVERLAP_SECONDS = 60
+# Ways stock_history.downsample() can reduce a timeline, here so the command line can offer them without NumPy
+RESOLUTIONS = ("auto", "raw", "daily", "weekly", "monthly", "envelope", "lttb")
+
+# MySQL works out the expiry status, so rows arrive ready to tag.
+# Its only parameter is the horizon in days.
+EXPIRY_STATUS = """CASE
+        WHEN exp_date < CURDATE() THEN 'expired'
+        WHEN exp_date <= CURDATE() + INTERVAL %s DAY THEN 'expiring_soon'
+        ELSE 'ok'
+    END"""
+
+# Below the reorder point, written so idx_medicines_stock_margin is used
+LOW_STOCK = "quantity - reorder_level < 0"
+
+
+def select_medicines(rest):
+    """SELECT for the grid columns plus the expiry status, reorder level and reorder point (values 9 to 11).
+
+    The first query parameter is always the expiry horizon, then whatever rest needs.
+    """
+    return (f"SELECT {MEDICINE_COLUMNS}, {EXPIRY_STATUS} AS expiry_status, reorder_level, reorder_point "
+            f"FROM Medicines {rest}")
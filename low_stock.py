@@ -0,0 +1,77 @@
+# Low-stock tracking.
+# Every medicine has a reorder point: its own, else its category's
+# (CategoryReorderPoints), else LOW_STOCK_THRESHOLD. The database keeps the
+# one that applies in reorder_level, and "quantity - reorder_level < 0" is an
+# index range, so finding low stock never scans the table.
+#
+# The app also keeps the set of low medicines in memory. It is updated from
+# every row the grid gets patched with, and reconciled against the index by a
+# periodic background check, so the alert badge costs nothing to redraw and
+# newly low medicines can be announced as they cross their reorder point.
+#
+# Reorder points per category are set from the command line:
+#
+#   python low_stock.py --category Tablets 25
+#   python low_stock.py --category Tablets --clear
+
+import argparse
+
+from db_config import DB_CONFIG, LOCAL_DB_PATH, STORAGE_MODE
+
+LOW_STOCK_CHECK_MS = 60000  # How often the background check reconciles with the database
+
+low_ids = set()  # Medicines below their reorder point, as far as this terminal knows
+checked = False  # True once the first background check has filled low_ids
+
+
+def is_low(row):
+    """row is a grid row with the reorder level as its tenth value."""
+    return row[4] < row[9]
+
+
+def apply_rows(rows, deleted_ids=()):
+    """Updates the set from patched rows; returns the rows that have just gone low."""
+    newly_low = []
+    for row in rows:
+        if is_low(row):
+            if row[0] not in low_ids:
+                low_ids.add(row[0])
+                newly_low.append(row)
+        else:
+            low_ids.discard(row[0])
+    low_ids.difference_update(deleted_ids)
+    return newly_low if checked else []
+
+
+def reconcile(ids):
+    """Replaces the set with the ids the background check found; returns the ids that are new."""
+    global checked
+    new_ids = ids - low_ids if checked else set()
+    low_ids.clear()
+    low_ids.update(ids)
+    checked = True
+    return new_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set the reorder point of a category.")
+    parser.add_argument("--category", required=True, help="category name ('' for medicines without one)")
+    parser.add_argument("reorder_point", type=int, nargs="?", help="new reorder point")
+    parser.add_argument("--clear", action="store_true", help="remove it, the default applies again")
+    args = parser.parse_args()
+    if (args.reorder_point is None) != args.clear:
+        parser.error("give either a reorder point or --clear")
+
+    if STORAGE_MODE == "sqlite":
+        import sqlite_store as store
+        connection = store.connect(LOCAL_DB_PATH)
+    else:
+        import mysql.connector
+        import mysql_store as store
+        connection = mysql.connector.connect(**DB_CONFIG)
+    try:
+        count, = store.run_transaction(
+            connection, lambda cursor: store.set_category_reorder_point(cursor, args.category, args.reorder_point))
+    finally:
+        connection.close()
+    print(f"{count} medicine(s) in {args.category or '(no category)'} follow the category reorder point.")
@@ -3,34 +3,49 @@
 # This project uses Python with Tkinter for the UI and MySQL for the database.
 
 import tkinter as tk
-from tkinter import ttk, messagebox
-import mysql.connector
-from datetime import date, timedelta, datetime
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from tkinter import ttk, messagebox, filedialog
+import time
+from datetime import datetime
+import medicine_grid
+import db_worker
+import storage
+import stock_history
+import medicine_search
+import inventory_core
+import instrumentation
+import bulk_import
+import low_stock
+import stock_forecast
+import timeline_chart
+from db_config import DB_CONFIG, LOCAL_DB_PATH, STORAGE_MODE
+from inventory_queries import DEFAULT_EXPIRY_HORIZON
 
 # --- Global Variables ---
 # I'm keeping these global for simplicity, as per the function-based approach.
-db_connection = None
-db_cursor = None
+expiry_highlight = False  # True after "Check Expiry", rows then get coloured as they are drawn
+sync_mark = None  # Database time of the last sync, rows changed after it get patched in
+
+expiry_horizon = DEFAULT_EXPIRY_HORIZON  # Days ahead that count as "expiring soon", set from the control bar
+
+SYNC_INTERVAL_MS = 5000  # How often rows changed by other terminals are pulled in
+SEARCH_DEBOUNCE_MS = 250  # Search-as-you-type waits this long after the last key press
+LOW_STOCK_TOAST_MS = 6000  # How long a low-stock note stays up
+FORECAST_INTERVAL_MS = 60000  # How often the stock-out forecast takes in new history
+STOCKOUT_LIMIT = 200  # Medicines listed by "Stock Out In", most urgent first
+DEBUG_PANEL_ROWS = 200  # Latest operations shown in the debug panel
+DEBUG_REFRESH_MS = 1000
+search_after_id = None  # Pending debounced search, if any
 
 
 # --- Database Connection ---
 def connect_to_database():
-    """Establishes connection to the MySQL database."""
-    global db_connection, db_cursor
+    """Opens the storage backend picked in db_config.py (MySQL, local SQLite or a replica of MySQL)."""
     try:
         # --- IMPORTANT ---
-        # Replace with your own MySQL credentials before running.
-        db_connection = mysql.connector.connect(
-            host="localhost",
-            user="root",  # <-- Change this to your MySQL username
-            password="daniel",  # <-- Change this to your MySQL password
-            database="pharmacy-final"
-        )
-        db_cursor = db_connection.cursor()
+        # Put your own MySQL credentials in db_config.py before running.
+        storage.init(root, STORAGE_MODE, LOCAL_DB_PATH, on_busy_change=show_busy, **DB_CONFIG)
         print("Database connection successful.")
-    except mysql.connector.Error as err:
+    except storage.Error as err:
         print(f"Error: {err}")
         messagebox.showerror("Database Error",
                              f"Could not connect to the database: {err}\nPlease ensure MySQL is running and credentials are correct.")
@@ -44,25 +59,167 @@ def clear_entry_fields(widgets):
         widget.delete(0, tk.END)
 
 
-def populate_treeview(tree, records):
-    """Clears and populates the treeview with new records."""
-    # Clear existing items
-    for item in tree.get_children():
-        tree.delete(item)
-    # Insert new items
-    for row in records:
-        tree.insert("", "end", values=row)
+def populate_treeview(tree, records, keep=None):
+    """Shows a list of records in the treeview, reusing the existing items."""
+    medicine_grid.show_rows(records, keep)
+
+
+def show_busy(busy):
+    """Busy indicator while background queries are running."""
+    status_label.config(text="Working..." if busy else "")
+    root.config(cursor="watch" if busy else "")
+
+
+# --- Paged Loading for the Virtual Grid ---
+# Reads go through storage.submit() as tasks taking (store, cursor). They may
+# run on a db_worker thread and must not touch Tk; their results come back to
+# a callback on the Tk thread.
+def read_page_index(store, cursor):
+    """Returns the sync mark, the first id of every page, the row count, the highest id and the recently deleted ids."""
+    return store.read_page_index(cursor, medicine_grid.PAGE_SIZE)
+
+
+def show_page_index(result):
+    """Switches the grid to virtual mode once the page index has arrived."""
+    global sync_mark
+    sync_mark, page_starts, total, max_id, gone_ids = result
+    medicine_grid.reload(page_starts, total, max_id, gone_ids)
+
+
+def load_page(first_id, limit, on_loaded):
+    """Page loader for the grid, the query runs in the background."""
+    horizon = expiry_horizon
+    storage.submit(lambda store, cursor: store.read_page(cursor, first_id, limit, horizon), on_loaded)
+
+
+def show_load_error(err):
+    messagebox.showerror("Database Error", f"Failed to load medicines: {err}")
+
+
+# --- Incremental Refresh ---
+def apply_sync(result):
+    global sync_mark
+    sync_mark, changed, deleted = result
+    medicine_grid.apply_changes(changed, deleted)
+    note_rows(changed, deleted)
+
+
+def sync_changes():
+    """Patches in rows added, changed or deleted since the last sync (by any terminal)."""
+    if sync_mark is not None:
+        since, horizon = sync_mark, expiry_horizon
+        storage.sync(since, horizon, apply_sync, on_error=lambda err: print(f"Sync failed: {err}"))
+    root.after(SYNC_INTERVAL_MS, sync_changes)
+
+
+def expiry_tags(row):
+    """Tags a row as 'expired' or 'expiring_soon' while expiry highlighting is on."""
+    status = row[8]  # expiry_status, worked out by the database
+    if expiry_highlight and status != 'ok':
+        return (status,)
+    return ()
+
+
+# --- Low-Stock Alerts ---
+def note_rows(rows, deleted_ids=()):
+    """Keeps the low-stock set current with rows written or synced, and announces any that just went low."""
+    newly_low = low_stock.apply_rows(rows, deleted_ids)
+    show_low_stock_badge()
+    if newly_low:
+        notify_low_stock([row[1] for row in newly_low])
+
+
+def check_low_stock():
+    """Periodic background check: reconciles the low-stock set with the database's index."""
+    horizon = expiry_horizon
+    known = set(low_stock.low_ids)
+
+    def read_low(store, cursor):
+        ids = store.read_low_stock_ids(cursor)
+        # Names only for the ones this terminal did not know about yet
+        names = {}
+        for medicine_id in ids - known:
+            row = store.read_medicine(cursor, medicine_id, horizon)
+            if row is not None:
+                names[medicine_id] = row[1]
+        return ids, names
+
+    def show_low(result):
+        ids, names = result
+        new_ids = low_stock.reconcile(ids)
+        show_low_stock_badge()
+        if new_ids:
+            notify_low_stock([names.get(medicine_id, f"#{medicine_id}") for medicine_id in sorted(new_ids)])
+
+    storage.submit(read_low, show_low, key="low_stock", on_error=lambda err: print(f"Low-stock check failed: {err}"))
+    root.after(low_stock.LOW_STOCK_CHECK_MS, check_low_stock)
+
+
+def show_low_stock_badge():
+    count = len(low_stock.low_ids)
+    low_stock_badge.config(text=f"Low stock: {count}", bg='#c0392b' if count else '#a9a9a9')
+
+
+def notify_low_stock(names):
+    """Small self-closing note in the corner of the window; it does not take focus or block anything."""
+    toast = tk.Toplevel(root)
+    toast.overrideredirect(True)
+    toast.configure(bg='#c0392b')
+    shown = ", ".join(names[:5]) + (f" and {len(names) - 5} more" if len(names) > 5 else "")
+    tk.Label(toast, text=f"Below reorder point: {shown}", font=('Segoe UI', 10, 'bold'), bg='#c0392b', fg='white',
+             wraplength=360, justify='left', padx=12, pady=8).pack()
+    toast.update_idletasks()
+    x = root.winfo_rootx() + root.winfo_width() - toast.winfo_width() - 20
+    y = root.winfo_rooty() + root.winfo_height() - toast.winfo_height() - 20
+    toast.geometry(f"+{x}+{y}")
+    toast.after(LOW_STOCK_TOAST_MS, toast.destroy)
+
+
+# --- Stock-Out Forecast ---
+def forecast_values(row):
+    """Value of the "Stock Out In" column (see stock_forecast.py)."""
+    return (stock_forecast.describe(row),)
+
+
+def refresh_forecast():
+    """Periodic background pass: folds new history rows into the forecast, then redraws the column."""
+    def show_forecast(new_rows):
+        if new_rows:
+            medicine_grid.redraw()
+
+    storage.submit(stock_forecast.update, show_forecast, key="forecast",
+                   on_error=lambda err: print(f"Forecast update failed: {err}"))
+    root.after(FORECAST_INTERVAL_MS, refresh_forecast)
+
+
+def view_stockout_risk():
+    """Lists the medicines closest to running out (or to expiring unsold), most urgent first."""
+    horizon = expiry_horizon
+
+    def read_stockout(store, cursor):
+        stock_forecast.update(store, cursor)
+        levels = store.read_stock_levels(cursor)
+        if not levels:
+            return []
+        ids, quantities, exp_dates = zip(*levels)
+        return store.read_medicines(cursor, stock_forecast.stockout_order(ids, quantities, exp_dates, STOCKOUT_LIMIT),
+                                    horizon)
+
+    def show_stockout(records):
+        if not records:
+            messagebox.showinfo("Stock Out", "No medicine is being used fast enough to run out or expire unsold.")
+        populate_treeview(tree, records)
+
+    storage.submit(read_stockout, show_stockout, key="view",
+                   on_error=lambda err: messagebox.showerror("Error", f"Failed to forecast stock-outs: {err}"))
 
 
 # --- Core Functionalities ---
 def fetch_all_medicines():
-    """Fetches all records from the Medicines table and displays them."""
-    db_cursor.execute("SELECT * FROM Medicines")
-    records = db_cursor.fetchall()
-    populate_treeview(tree, records)
-    # Clear any previous tags like 'expired' or 'expiring_soon'
-    for item in tree.get_children():
-        tree.item(item, tags=())
+    """Shows all medicines in the paged virtual grid, without expiry colouring."""
+    global expiry_highlight
+    expiry_highlight = False
+    storage.submit(read_page_index, show_page_index, on_error=show_load_error, key="view")
 
 
 def add_medicine():
@@ -82,22 +239,15 @@ def add_medicine():
         return
 
     try:
-        # SQL query to insert a new record
-        sql = "INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier) VALUES (%s, %s, %s, %s, %s, %s, %s)"
         values = (name, category, float(price), int(quantity), mfg_date, exp_date, supplier)
-        db_cursor.execute(sql, values)
-        db_connection.commit()
-        # Also add initial stock to history
-        new_med_id = db_cursor.lastrowid
-        history_sql = "INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (%s, %s, %s)"
-        history_values = (new_med_id, date.today(), int(quantity))
-        db_cursor.execute(history_sql, history_values)
-        db_connection.commit()
+        # The medicine, its opening stock in the history and the snapshots are one transaction
+        new_row = storage.add_medicine(values, expiry_horizon)
 
         messagebox.showinfo("Success", "Medicine added successfully!")
         add_window.destroy()  # Close the add window
-        fetch_all_medicines()  # Refresh the main view
-    except mysql.connector.Error as err:
+        medicine_grid.patch_insert_row(new_row)  # Only the new row is drawn
+        note_rows([new_row])
+    except storage.Error as err:
         messagebox.showerror("Database Error", f"Failed to add medicine: {err}")
     except ValueError:
         messagebox.showerror("Input Error", "Please check Price and Quantity fields for correct numeric values.")
@@ -118,35 +268,29 @@ def update_medicine():
     mfg_date = update_mfg_date_entry.get()
     exp_date = update_exp_date_entry.get()
     supplier = update_supplier_entry.get()
+    reorder_point = update_reorder_entry.get().strip()
 
     selected_values = tree.item(selected_item, 'values')
     medicine_id = selected_values[0]
+    original_category = selected_values[2]
     original_quantity = selected_values[4]
 
     try:
-        sql = """
-            UPDATE Medicines 
-            SET name=%s, category=%s, price=%s, quantity=%s, mfg_date=%s, exp_date=%s, supplier=%s 
-            WHERE id=%s
-        """
-        values = (name, category, float(price), int(quantity), mfg_date, exp_date, supplier, medicine_id)
-        db_cursor.execute(sql, values)
-        db_connection.commit()
-
-        # If quantity changed, add a record to history
-        if int(quantity) != int(original_quantity):
-            history_sql = "INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (%s, %s, %s)"
-            history_values = (medicine_id, date.today(), int(quantity))
-            db_cursor.execute(history_sql, history_values)
-            db_connection.commit()
+        values = (name, category, float(price), int(quantity), mfg_date, exp_date, supplier)
+        # Row, history (if the quantity changed) and snapshots commit together
+        # Blank reorder point: the category's (or the default) applies
+        reorder_point = int(reorder_point) if reorder_point else None
+        row = storage.update_medicine(medicine_id, values, int(original_quantity), original_category, reorder_point,
+                                      expiry_horizon)
 
         messagebox.showinfo("Success", "Medicine updated successfully!")
         update_window.destroy()
-        fetch_all_medicines()
-    except mysql.connector.Error as err:
+        medicine_grid.patch_update_row(row)
+        note_rows([row])
+    except storage.Error as err:
         messagebox.showerror("Database Error", f"Failed to update medicine: {err}")
     except ValueError:
-        messagebox.showerror("Input Error", "Please ensure Price and Quantity are valid numbers.")
+        messagebox.showerror("Input Error", "Please ensure Price, Quantity and Reorder Point are valid numbers.")
 
 
 def delete_medicine():
@@ -163,137 +307,231 @@ def delete_medicine():
     try:
         selected_values = tree.item(selected_item, 'values')
         medicine_id = selected_values[0]
-        # ON DELETE CASCADE will handle the StockHistory table
-        sql = "DELETE FROM Medicines WHERE id = %s"
-        db_cursor.execute(sql, (medicine_id,))
-        db_connection.commit()
+        # ON DELETE CASCADE will handle the StockHistory and StockDailySnapshot tables
+        storage.delete_medicine(int(medicine_id), selected_values[2], int(selected_values[4]))
         messagebox.showinfo("Success", "Medicine deleted successfully!")
-        fetch_all_medicines()
-    except mysql.connector.Error as err:
+        medicine_grid.patch_remove_row(int(medicine_id))
+        note_rows([], [int(medicine_id)])
+    except storage.Error as err:
         messagebox.showerror("Database Error", f"Failed to delete medicine: {err}")
 
 
-def search_medicine():
-    """Searches for medicines based on the query in the search bar."""
+def search_medicine(interactive=True):
+    """Searches for medicines based on the query in the search bar.
+
+    interactive is False for search-as-you-type, which reports an empty result
+    in the status bar instead of a message box.
+    """
     query = search_entry.get()
-    if not query:
+    if not query.strip():
         fetch_all_medicines()
         return
 
-    try:
-        sql = "SELECT * FROM Medicines WHERE name LIKE %s OR category LIKE %s OR supplier LIKE %s"
-        search_term = f"%{query}%"
-        db_cursor.execute(sql, (search_term, search_term, search_term))
-        records = db_cursor.fetchall()
+    horizon = expiry_horizon
+    tokens = medicine_search.search_tokens(query)
+
+    def read_matches(store, cursor):
+        # Prefix search, best matches first
+        return inventory_core.search(store, cursor, query, horizon)
+
+    def show_matches(records):
         if not records:
-            messagebox.showinfo("Not Found", "No medicines found matching your search.")
-        populate_treeview(tree, records)
-    except mysql.connector.Error as err:
-        messagebox.showerror("Search Error", f"An error occurred during search: {err}")
+            if interactive:
+                messagebox.showinfo("Not Found", "No medicines found matching your search.")
+            else:
+                status_label.config(text="No matches")
+        # Same test in Python, so edited rows can join or leave the results without a re-query
+        populate_treeview(tree, records, keep=lambda row: medicine_search.row_matches(row, tokens))
+
+    # Same key as the other main-view loads, so a new search cancels the one still running
+    storage.submit(read_matches, show_matches, key="view",
+                   on_error=lambda err: messagebox.showerror("Search Error",
+                                                             f"An error occurred during search: {err}"))
+
+
+def on_search_key(event):
+    """Search-as-you-type: runs the search once typing pauses for SEARCH_DEBOUNCE_MS."""
+    global search_after_id
+    if event.keysym == "Return":
+        return
+    if search_after_id is not None:
+        root.after_cancel(search_after_id)
+    search_after_id = root.after(SEARCH_DEBOUNCE_MS, run_debounced_search)
+
+
+def run_debounced_search():
+    global search_after_id
+    search_after_id = None
+    search_medicine(interactive=False)
 
 
 def check_expiry_status():
     """Checks and highlights medicines that are expired or expiring soon."""
-    fetch_all_medicines()  # Start with a clean slate
-    today = date.today()
-    thirty_days_later = today + timedelta(days=30)
+    global expiry_highlight
+    # Rows are tagged by expiry_tags() from the status the database worked out, so the
+    # colours also survive scrolling and incremental refreshes
+    expiry_highlight = True
+    horizon = expiry_horizon
+    message = f"Expiry status has been updated.\nRed: Expired\nOrange: Expiring within {horizon} days"
+
+    if at_risk_only.get():
+        # Only the exp_date index range up to the horizon is read, not the whole table
+        def read_at_risk(store, cursor):
+            return inventory_core.expiring(store, cursor, horizon)
+
+        def show_at_risk(records):
+            populate_treeview(tree, records, keep=lambda row: row[8] != 'ok')
+            messagebox.showinfo("Expiry Check", message if records else "No medicines are expired or expiring soon.")
+
+        storage.submit(read_at_risk, show_at_risk, on_error=show_load_error, key="view")
+        return
 
-    for item in tree.get_children():
-        values = tree.item(item, 'values')
-        exp_date_str = values[6]  # exp_date is the 7th column (index 6)
-        try:
-            # Handle both date objects from DB and string objects
-            if isinstance(exp_date_str, str):
-                exp_date_obj = datetime.strptime(exp_date_str, '%Y-%m-%d').date()
-            else:
-                exp_date_obj = exp_date_str
+    def show_expiry(result):
+        show_page_index(result)
+        messagebox.showinfo("Expiry Check", message)
+
+    storage.submit(read_page_index, show_expiry, on_error=show_load_error, key="view")
 
-            if exp_date_obj < today:
-                tree.item(item, tags=('expired',))
-            elif today <= exp_date_obj <= thirty_days_later:
-                tree.item(item, tags=('expiring_soon',))
-        except (ValueError, IndexError, TypeError) as e:
-            print(f"Could not parse date for item: {values}. Error: {e}")
-            continue
 
-    messagebox.showinfo("Expiry Check",
-                        "Expiry status has been updated.\nRed: Expired\nOrange: Expiring within 30 days")
+def set_expiry_horizon():
+    """Reads the horizon from the control bar and re-runs the check if it is showing."""
+    global expiry_horizon
+    try:
+        expiry_horizon = max(0, int(horizon_spinbox.get()))
+    except ValueError:
+        return
+    if expiry_highlight:
+        check_expiry_status()
 
 
 def view_low_stock():
-    """Filters the view to show only medicines with low stock."""
-    try:
-        threshold = 10  # Setting a default threshold
-        sql = "SELECT * FROM Medicines WHERE quantity < %s"
-        db_cursor.execute(sql, (threshold,))
-        records = db_cursor.fetchall()
+    """Filters the view to show only medicines below their reorder point."""
+    horizon = expiry_horizon
+
+    def read_low_stock(store, cursor):
+        # An index range over the low rows only, not a table scan
+        return inventory_core.low_stock(store, cursor, horizon)
+
+    def show_low_stock(records):
         if not records:
-            messagebox.showinfo("Low Stock", f"No medicines are below the stock threshold of {threshold}.")
-        populate_treeview(tree, records)
-    except mysql.connector.Error as err:
-        messagebox.showerror("Error", f"Failed to fetch low stock items: {err}")
+            messagebox.showinfo("Low Stock", "No medicines are below their reorder point.")
+        populate_treeview(tree, records, keep=low_stock.is_low)
+
+    storage.submit(read_low_stock, show_low_stock, key="view",
+                   on_error=lambda err: messagebox.showerror("Error", f"Failed to fetch low stock items: {err}"))
+
+
+def import_delivery():
+    """Imports a supplier delivery CSV on a worker thread, then reloads the table."""
+    if not storage.has_server():
+        messagebox.showinfo("Import Delivery", "Importing deliveries needs the MySQL server "
+                                               "(STORAGE_MODE is \"sqlite\" in db_config.py).")
+        return
+    path = filedialog.askopenfilename(title="Import Delivery",
+                                      filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+    if not path:
+        return
+
+    def run_import(cursor):
+        # The import commits batch by batch, so it gets a connection of its own
+        connection = db_worker.get_connection()
+        try:
+            return bulk_import.import_csv(connection, path), None
+        except (ValueError, OSError) as err:  # Unreadable file or missing columns
+            return None, err
+        finally:
+            connection.close()
+
+    def show_import(result):
+        summary, err = result
+        if err is not None:
+            messagebox.showerror("Import Error", f"Could not import {path}: {err}")
+            return
+        show = messagebox.showwarning if summary["errors"] else messagebox.showinfo
+        show("Import Delivery", bulk_import.format_summary(summary))
+        fetch_all_medicines()
+
+    storage.submit_server(run_import, show_import,
+                          on_error=lambda err: messagebox.showerror("Import Error", f"Import failed: {err}"))
 
 
 # --- Graphing Functionality (Corrected for Time-Series) ---
-def generate_timeline_graph(selection_window, listbox, all_medicines):
-    """Generates and displays a line plot of stock quantity over time."""
+def read_date_range(window, from_entry, to_entry):
+    """Reads the optional From/To dates (blank means open-ended), or None if they are invalid."""
+    try:
+        return [datetime.strptime(entry.get().strip(), '%Y-%m-%d').date() if entry.get().strip() else None
+                for entry in (from_entry, to_entry)]
+    except ValueError:
+        messagebox.showerror("Input Error", "Please enter dates as YYYY-MM-DD (or leave them blank).", parent=window)
+        return None
+
+
+def generate_timeline_graph(selection_window, listbox, all_medicines, from_entry, to_entry, resolution, live=False):
+    """Reads the selected medicines' history in the background and shows it in the chart window.
+
+    live is set when the selection changes while the chart is open; an empty
+    selection then just clears the chart.
+    """
     selected_indices = listbox.curselection()
-    if not selected_indices:
+    if not selected_indices and not live:
         messagebox.showwarning("Selection Error", "Please select at least one medicine to plot.",
                                parent=selection_window)
         return
 
-    selected_med_tuples = [all_medicines[i] for i in selected_indices]
+    date_range = read_date_range(selection_window, from_entry, to_entry)
+    if date_range is None:
+        return
+    start, end = date_range
 
-    selection_window.destroy()
+    # The legend follows the list order
+    names = dict(all_medicines[i] for i in selected_indices)
 
-    plt.figure(figsize=(12, 7))
-    ax = plt.gca()  # Get current axes
+    # Cached series are reused, only medicines with new history are read again
+    storage.submit(lambda store, cursor: timeline_chart.prepare(store, cursor, list(names), start, end, resolution),
+                   lambda series: timeline_chart.show(root, series, names, on_close=close_timeline_chart), key="graph",
+                   on_error=lambda err: messagebox.showerror("Graph Error", f"Could not fetch stock history: {err}"))
 
-    for med_id, med_name in selected_med_tuples:
-        try:
-            sql = "SELECT change_date, quantity FROM StockHistory WHERE medicine_id = %s ORDER BY change_date ASC"
-            db_cursor.execute(sql, (med_id,))
-            history = db_cursor.fetchall()
 
-            if history:
-                dates = [row[0] for row in history]
-                quantities = [row[1] for row in history]
-                plt.plot(dates, quantities, marker='o', linestyle='-', label=med_name)
+def close_timeline_chart():
+    # A redraw still on its way would open the window again
+    storage.cancel("graph")
+    timeline_chart.close()
 
-        except mysql.connector.Error as err:
-            messagebox.showerror("Graph Error", f"Could not fetch history for {med_name}: {err}")
-            return
 
-    # Formatting the plot
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-    plt.gcf().autofmt_xdate()  # Auto-formats the x-axis labels to fit
+def generate_category_trend_graph(selection_window, from_entry, to_entry):
+    """Plots total stock per category over time from the daily snapshots."""
+    date_range = read_date_range(selection_window, from_entry, to_entry)
+    if date_range is None:
+        return
+    start, end = date_range
+    selection_window.destroy()
+
+    def show_trend(trend):
+        if not trend:
+            messagebox.showinfo("No Data", "There is no stock history to plot yet.")
+            return
+        timeline_chart.show_trend(root, trend)
 
-    plt.ylabel('Stock Quantity')
-    plt.xlabel('Date')
-    plt.title('Medicine Stock Quantity Over Time')
-    plt.legend()
-    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
-    plt.tight_layout()
-    plt.show()
+    storage.submit(lambda store, cursor: store.read_category_trend(cursor, start, end), show_trend, key="graph",
+                   on_error=lambda err: messagebox.showerror("Graph Error", f"Could not fetch stock trend: {err}"))
 
 
 def open_timeline_graph_selection_window():
+    """Loads the medicine names in the background, then opens the selection window."""
+    storage.submit(lambda store, cursor: store.read_names(cursor), show_timeline_graph_selection_window, key="graph",
+                   on_error=lambda err: messagebox.showerror("Database Error",
+                                                             f"Failed to fetch medicines for graph: {err}"))
+
+
+def show_timeline_graph_selection_window(all_medicines):
     """Opens a Toplevel window to select medicines for time-series graphing."""
-    try:
-        db_cursor.execute("SELECT id, name FROM Medicines")
-        all_medicines = db_cursor.fetchall()
-        if not all_medicines:
-            messagebox.showinfo("No Data", "There are no medicines in the database to graph.")
-            return
-    except mysql.connector.Error as err:
-        messagebox.showerror("Database Error", f"Failed to fetch medicines for graph: {err}")
+    if not all_medicines:
+        messagebox.showinfo("No Data", "There are no medicines in the database to graph.")
         return
 
     graph_window = tk.Toplevel(root)
     graph_window.title("Select Medicines to Plot")
-    graph_window.geometry("400x450")
+    graph_window.geometry("400x570")
     graph_window.configure(bg='#eaf2f8')
     graph_window.resizable(False, False)
 
@@ -314,10 +552,33 @@ def open_timeline_graph_selection_window():
     listbox.config(yscrollcommand=scrollbar.set)
     listbox.pack(side="left", fill="both", expand=True)
 
+    range_frame = tk.Frame(graph_window, bg='#eaf2f8')
+    range_frame.pack(padx=10, pady=(10, 0))
+    tk.Label(range_frame, text="From (YYYY-MM-DD):", font=('Segoe UI', 9), bg='#eaf2f8').grid(row=0, column=0, sticky='w')
+    from_entry = tk.Entry(range_frame, font=('Segoe UI', 9), width=12)
+    from_entry.grid(row=0, column=1, padx=5)
+    tk.Label(range_frame, text="To:", font=('Segoe UI', 9), bg='#eaf2f8').grid(row=0, column=2, sticky='w')
+    to_entry = tk.Entry(range_frame, font=('Segoe UI', 9), width=12)
+    to_entry.grid(row=0, column=3, padx=5)
+    tk.Label(range_frame, text="Resolution:", font=('Segoe UI', 9), bg='#eaf2f8').grid(row=1, column=0, sticky='w',
+                                                                                       pady=(5, 0))
+    resolution = tk.StringVar(value="auto")
+    resolution_menu = tk.OptionMenu(range_frame, resolution, *stock_history.RESOLUTIONS)
+    resolution_menu.config(font=('Segoe UI', 9))
+    resolution_menu.grid(row=1, column=1, columnspan=3, sticky='w', padx=5, pady=(5, 0))
+
     plot_button = tk.Button(graph_window, text="Generate Graph",
-                            command=lambda: generate_timeline_graph(graph_window, listbox, all_medicines),
+                            command=lambda: generate_timeline_graph(graph_window, listbox, all_medicines,
+                                                                    from_entry, to_entry, resolution.get()),
                             font=('Segoe UI', 10, 'bold'), bg='#16a085', fg='white', relief='flat')
-    plot_button.pack(pady=15)
+    plot_button.pack(pady=(15, 5))
+    # With the chart open, toggling a medicine redraws it straight away (mostly from the cache)
+    listbox.bind("<<ListboxSelect>>", lambda event: timeline_chart.is_open() and generate_timeline_graph(
+        graph_window, listbox, all_medicines, from_entry, to_entry, resolution.get(), live=True))
+    trend_button = tk.Button(graph_window, text="Category Trend",
+                             command=lambda: generate_category_trend_graph(graph_window, from_entry, to_entry),
+                             font=('Segoe UI', 10, 'bold'), bg='#5dade2', fg='white', relief='flat')
+    trend_button.pack(pady=(0, 15))
 
 
 # --- UI Window Functions ---
@@ -359,11 +620,11 @@ def open_update_window():
         messagebox.showwarning("Selection Error", "Please select a medicine to update.")
         return
 
-    global update_window, update_name_entry, update_category_entry, update_price_entry, update_quantity_entry, update_mfg_date_entry, update_exp_date_entry, update_supplier_entry
+    global update_window, update_name_entry, update_category_entry, update_price_entry, update_quantity_entry, update_mfg_date_entry, update_exp_date_entry, update_supplier_entry, update_reorder_entry
 
     update_window = tk.Toplevel(root)
     update_window.title("Update Medicine Details")
-    update_window.geometry("400x350")
+    update_window.geometry("400x390")
     update_window.configure(bg='#eaf2f8')
     update_window.resizable(False, False)
 
@@ -371,7 +632,7 @@ def open_update_window():
     frame.pack(pady=20, padx=20, fill="both", expand=True)
 
     labels = ["Name:", "Category:", "Price (₹):", "Quantity:", "Mfg Date (YYYY-MM-DD):", "Exp Date (YYYY-MM-DD):",
-              "Supplier:"]
+              "Supplier:", "Reorder Point (blank = default):"]
     entries = []
 
     for i, text in enumerate(labels):
@@ -381,136 +642,232 @@ def open_update_window():
         entry.grid(row=i, column=1, pady=5, padx=5)
         entries.append(entry)
 
-    update_name_entry, update_category_entry, update_price_entry, update_quantity_entry, update_mfg_date_entry, update_exp_date_entry, update_supplier_entry = entries
+    update_name_entry, update_category_entry, update_price_entry, update_quantity_entry, update_mfg_date_entry, update_exp_date_entry, update_supplier_entry, update_reorder_entry = entries
 
     # Pre-fill the form with data from the selected treeview item
     selected_values = tree.item(selected_item, 'values')
-    for entry, value in zip(entries, selected_values[1:]):  # Skip ID
+    for entry, value in zip(entries, selected_values[1:medicine_grid.DATA_COLUMNS]):  # Skip ID and the forecast
         entry.insert(0, value)
+    # The medicine's own reorder point is not a grid column, it comes from the full row
+    row = medicine_grid.row_store.get(int(selected_values[0]))
+    if row is not None and row[10] is not None:
+        update_reorder_entry.insert(0, row[10])
 
     update_btn = tk.Button(frame, text="Update Details", command=update_medicine, font=('Segoe UI', 10, 'bold'),
                            bg='#2874a6', fg='white', relief='flat')
     update_btn.grid(row=len(labels), columnspan=2, pady=20)
 
 
+# --- Debug Panel ---
+def open_debug_panel(event=None):
+    """F12: the latest database statements and UI refreshes with their timings (see instrumentation.py)."""
+    panel = tk.Toplevel(root)
+    panel.title("Debug: Recent Operations")
+    panel.geometry("1000x520")
+
+    summary_label = tk.Label(panel, text="", font=('Consolas', 9), justify='left', anchor='w')
+    summary_label.pack(fill='x', padx=10, pady=(10, 0))
+    table_frame = tk.Frame(panel)
+    table_frame.pack(fill='both', expand=True, padx=10, pady=10)
+    scroll = tk.Scrollbar(table_frame)
+    scroll.pack(side='right', fill='y')
+    columns = ("time", "kind", "ms", "rows", "bytes", "name")
+    table = ttk.Treeview(table_frame, columns=columns, show='headings', yscrollcommand=scroll.set)
+    scroll.config(command=table.yview)
+    for column, width in zip(columns, (80, 40, 70, 60, 80, 650)):
+        table.heading(column, text=column.title())
+        table.column(column, width=width, anchor='w' if column == "name" else 'center')
+    table.tag_configure('slow', foreground='red')
+    table.pack(fill='both', expand=True)
+
+    def export_metrics(prometheus):
+        path = filedialog.asksaveasfilename(parent=panel, defaultextension=".prom" if prometheus else ".jsonl")
+        if not path:
+            return
+        if prometheus:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(instrumentation.prometheus_text())
+        else:
+            instrumentation.write_jsonl(path)
+
+    buttons = tk.Frame(panel)
+    buttons.pack(fill='x', padx=10, pady=(0, 10))
+    tk.Button(buttons, text="Export Prometheus...", command=lambda: export_metrics(True)).pack(side='left')
+    tk.Button(buttons, text="Export JSONL...", command=lambda: export_metrics(False)).pack(side='left', padx=5)
+
+    def refresh():
+        if not panel.winfo_exists():
+            return
+        operations = list(instrumentation.recent)[-DEBUG_PANEL_ROWS:][::-1]  # Newest first
+        table.delete(*table.get_children())
+        for stamp, kind, name, seconds, rows, nbytes in operations:
+            ms = seconds * 1000
+            table.insert("", "end", values=(time.strftime("%H:%M:%S", time.localtime(stamp)), kind, f"{ms:.2f}",
+                                            rows, nbytes, name),
+                         tags=('slow',) if ms >= instrumentation.SLOW_QUERY_MS else ())
+        top = instrumentation.summary()[:5]
+        summary_label.config(text="\n".join(f"{item['total_ms']:10.1f} ms total  p50 {item['p50_ms']:8.2f}  "
+                                            f"p99 {item['p99_ms']:8.2f}  x{item['count']:<6} {item['name'][:80]}"
+                                            for item in top) or "Nothing measured yet.")
+        panel.after(DEBUG_REFRESH_MS, refresh)
+
+    refresh()
+
+
 # --- Main Application Window Setup ---
-root = tk.Tk()
-root.title("Medicine Expiry and Stock Management System")
-root.geometry("1200x600")  # Increased width for the new button
-root.configure(bg='#f0f0f0')
-
-# --- Style Configuration ---
-style = ttk.Style()
-style.theme_use("clam")
-style.configure("Treeview",
-                background="#ffffff",
-                foreground="#333333",
-                rowheight=25,
-                fieldbackground="#ffffff",
-                font=('Segoe UI', 10))
-style.map('Treeview', background=[('selected', '#3498db')])
-style.configure("Treeview.Heading", font=('Segoe UI', 11, 'bold'), background='#d3d3d3', relief='flat')
-style.map("Treeview.Heading",
-          background=[('active', '#c1c1c1')])
-
-# --- Top Frame for Controls ---
-control_frame = tk.Frame(root, bg='#d6eaf8', pady=10, padx=10)
-control_frame.pack(fill='x')
-
-# --- Search Bar ---
-search_label = tk.Label(control_frame, text="Search:", font=('Segoe UI', 10), bg='#d6eaf8')
-search_label.pack(side='left', padx=(0, 5))
-search_entry = tk.Entry(control_frame, font=('Segoe UI', 10), width=30)
-search_entry.pack(side='left', padx=5, ipady=4)
-search_button = tk.Button(control_frame, text="Search", command=search_medicine, font=('Segoe UI', 9, 'bold'),
-                          bg='#5dade2', fg='white', relief='flat', padx=10)
-search_button.pack(side='left', padx=5)
-clear_button = tk.Button(control_frame, text="View All", command=fetch_all_medicines, font=('Segoe UI', 9, 'bold'),
-                         bg='#a9a9a9', fg='white', relief='flat', padx=10)
-clear_button.pack(side='left', padx=5)
-
-# --- Treeview Frame for Data Display ---
-tree_frame = tk.Frame(root, bg='#f0f0f0')
-tree_frame.pack(pady=10, padx=10, fill='both', expand=True)
-
-# Scrollbars
-tree_scroll_y = tk.Scrollbar(tree_frame)
-tree_scroll_y.pack(side='right', fill='y')
-tree_scroll_x = tk.Scrollbar(tree_frame, orient='horizontal')
-tree_scroll_x.pack(side='bottom', fill='x')
-
-# Treeview Widget
-columns = ("id", "name", "category", "price", "quantity", "mfg_date", "exp_date", "supplier")
-tree = ttk.Treeview(tree_frame, columns=columns, show='headings', yscrollcommand=tree_scroll_y.set,
-                    xscrollcommand=tree_scroll_x.set)
-tree_scroll_y.config(command=tree.yview)
-tree_scroll_x.config(command=tree.xview)
-
-# Define Headings
-tree.heading("id", text="ID")
-tree.heading("name", text="Name")
-tree.heading("category", text="Category")
-tree.heading("price", text="Price (₹)")
-tree.heading("quantity", text="Quantity")
-tree.heading("mfg_date", text="Mfg Date")
-tree.heading("exp_date", text="Exp Date")
-tree.heading("supplier", text="Supplier")
-
-# Define Column widths
-tree.column("id", width=40, anchor='center')
-tree.column("name", width=200)
-tree.column("category", width=120)
-tree.column("price", width=80, anchor='center')
-tree.column("quantity", width=80, anchor='center')
-tree.column("mfg_date", width=100, anchor='center')
-tree.column("exp_date", width=100, anchor='center')
-tree.column("supplier", width=150)
-
-tree.pack(fill='both', expand=True)
-
-# Add tags for coloring rows
-tree.tag_configure('expired', background='#ffdddd', foreground='red')
-tree.tag_configure('expiring_soon', background='#fff8dc', foreground='#e67e22')
-
-# --- Bottom Frame for Action Buttons ---
-action_frame = tk.Frame(root, bg='#f0f0f0', pady=10)
-action_frame.pack(fill='x', padx=10)
-
-button_font = ('Segoe UI', 10, 'bold')
-btn_style = {'fg': 'white', 'relief': 'flat', 'padx': 15, 'pady': 5, 'width': 18}  # Adjusted width
-
-add_btn = tk.Button(action_frame, text="Add Medicine", command=open_add_window, font=button_font, bg='#27ae60',
-                    **btn_style)
-update_btn = tk.Button(action_frame, text="Update Selected", command=open_update_window, font=button_font, bg='#2980b9',
-                       **btn_style)
-delete_btn = tk.Button(action_frame, text="Delete Selected", command=delete_medicine, font=button_font, bg='#c0392b',
-                       **btn_style)
-expiry_btn = tk.Button(action_frame, text="Check Expiry", command=check_expiry_status, font=button_font, bg='#f39c12',
-                       **btn_style)
-low_stock_btn = tk.Button(action_frame, text="View Low Stock", command=view_low_stock, font=button_font, bg='#8e44ad',
-                          **btn_style)
-graph_btn = tk.Button(action_frame, text="View Graph", command=open_timeline_graph_selection_window, font=button_font,
-                      bg='#16a085', **btn_style)
-
-# Pack buttons with space in between
-action_frame.pack_propagate(False)
-action_frame.grid_columnconfigure((0, 1, 2, 3, 4, 5), weight=1)
-add_btn.grid(row=0, column=0, padx=5)
-update_btn.grid(row=0, column=1, padx=5)
-delete_btn.grid(row=0, column=2, padx=5)
-expiry_btn.grid(row=0, column=3, padx=5)
-low_stock_btn.grid(row=0, column=4, padx=5)
-graph_btn.grid(row=0, column=5, padx=5)
-
-# --- Start Application ---
-# It's better to connect to DB after setting up the main window.
-root.after(100, connect_to_database)  # Delay connection slightly
-root.after(200, fetch_all_medicines)  # Populate tree after connection
-root.mainloop()
-
-# Close database connection when the application is closed
-if db_connection and db_connection.is_connected():
-    db_cursor.close()
-    db_connection.close()
+# Only when run as the app: importing main.py builds no window (the logic itself lives in inventory_core.py)
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Medicine Expiry and Stock Management System")
+    root.geometry("1350x600")  # Wide enough for the row of action buttons
+    root.configure(bg='#f0f0f0')
+
+    # --- Style Configuration ---
+    style = ttk.Style()
+    style.theme_use("clam")
+    style.configure("Treeview",
+                    background="#ffffff",
+                    foreground="#333333",
+                    rowheight=medicine_grid.ROW_HEIGHT,
+                    fieldbackground="#ffffff",
+                    font=('Segoe UI', 10))
+    style.map('Treeview', background=[('selected', '#3498db')])
+    style.configure("Treeview.Heading", font=('Segoe UI', 11, 'bold'), background='#d3d3d3', relief='flat')
+    style.map("Treeview.Heading",
+              background=[('active', '#c1c1c1')])
+
+    # --- Top Frame for Controls ---
+    control_frame = tk.Frame(root, bg='#d6eaf8', pady=10, padx=10)
+    control_frame.pack(fill='x')
+
+    # --- Search Bar ---
+    search_label = tk.Label(control_frame, text="Search:", font=('Segoe UI', 10), bg='#d6eaf8')
+    search_label.pack(side='left', padx=(0, 5))
+    search_entry = tk.Entry(control_frame, font=('Segoe UI', 10), width=30)
+    search_entry.pack(side='left', padx=5, ipady=4)
+    search_entry.bind("<KeyRelease>", on_search_key)
+    search_entry.bind("<Return>", lambda event: search_medicine())
+    search_button = tk.Button(control_frame, text="Search", command=search_medicine, font=('Segoe UI', 9, 'bold'),
+                              bg='#5dade2', fg='white', relief='flat', padx=10)
+    search_button.pack(side='left', padx=5)
+    clear_button = tk.Button(control_frame, text="View All", command=fetch_all_medicines, font=('Segoe UI', 9, 'bold'),
+                             bg='#a9a9a9', fg='white', relief='flat', padx=10)
+    clear_button.pack(side='left', padx=5)
+
+    # --- Expiry Options ---
+    horizon_label = tk.Label(control_frame, text="Expiring within (days):", font=('Segoe UI', 10), bg='#d6eaf8')
+    horizon_label.pack(side='left', padx=(20, 5))
+    horizon_spinbox = tk.Spinbox(control_frame, from_=0, to=365, width=5, font=('Segoe UI', 10),
+                                 command=set_expiry_horizon)
+    horizon_spinbox.delete(0, tk.END)
+    horizon_spinbox.insert(0, str(expiry_horizon))
+    horizon_spinbox.bind("<Return>", lambda event: set_expiry_horizon())
+    horizon_spinbox.pack(side='left', padx=5, ipady=2)
+    at_risk_only = tk.BooleanVar(value=False)
+    at_risk_check = tk.Checkbutton(control_frame, text="At-risk only", variable=at_risk_only, font=('Segoe UI', 10),
+                                   bg='#d6eaf8', activebackground='#d6eaf8')
+    at_risk_check.pack(side='left', padx=5)
+
+    # Busy indicator for the background queries
+    status_label = tk.Label(control_frame, text="", font=('Segoe UI', 9, 'italic'), bg='#d6eaf8', fg='#555555')
+    status_label.pack(side='right', padx=5)
+    # Count of medicines below their reorder point, kept current without querying
+    low_stock_badge = tk.Button(control_frame, text="Low stock: 0", command=view_low_stock, font=('Segoe UI', 9, 'bold'),
+                                bg='#a9a9a9', fg='white', relief='flat', padx=10)
+    low_stock_badge.pack(side='right', padx=5)
+
+    # --- Treeview Frame for Data Display ---
+    tree_frame = tk.Frame(root, bg='#f0f0f0')
+    tree_frame.pack(pady=10, padx=10, fill='both', expand=True)
+
+    # Scrollbars
+    tree_scroll_y = tk.Scrollbar(tree_frame)
+    tree_scroll_y.pack(side='right', fill='y')
+    tree_scroll_x = tk.Scrollbar(tree_frame, orient='horizontal')
+    tree_scroll_x.pack(side='bottom', fill='x')
+
+    # Treeview Widget
+    columns = ("id", "name", "category", "price", "quantity", "mfg_date", "exp_date", "supplier", "stockout")
+    tree = ttk.Treeview(tree_frame, columns=columns, show='headings', yscrollcommand=tree_scroll_y.set,
+                        xscrollcommand=tree_scroll_x.set)
+    tree_scroll_y.config(command=tree.yview)
+    tree_scroll_x.config(command=tree.xview)
+
+    # Define Headings
+    tree.heading("id", text="ID")
+    tree.heading("name", text="Name")
+    tree.heading("category", text="Category")
+    tree.heading("price", text="Price (₹)")
+    tree.heading("quantity", text="Quantity")
+    tree.heading("mfg_date", text="Mfg Date")
+    tree.heading("exp_date", text="Exp Date")
+    tree.heading("supplier", text="Supplier")
+    tree.heading("stockout", text="Stock Out In", command=view_stockout_risk)  # Click to sort by it
+
+    # Define Column widths
+    tree.column("id", width=40, anchor='center')
+    tree.column("name", width=200)
+    tree.column("category", width=120)
+    tree.column("price", width=80, anchor='center')
+    tree.column("quantity", width=80, anchor='center')
+    tree.column("mfg_date", width=100, anchor='center')
+    tree.column("exp_date", width=100, anchor='center')
+    tree.column("supplier", width=150)
+    tree.column("stockout", width=190)
+
+    tree.pack(fill='both', expand=True)
+    medicine_grid.attach(tree, tree_scroll_y, load_page)
+    medicine_grid.row_tags = expiry_tags
+    medicine_grid.extra_values = forecast_values
+    root.bind("<F12>", open_debug_panel)  # Debug panel with the latest operation timings
+
+    # Add tags for coloring rows
+    tree.tag_configure('expired', background='#ffdddd', foreground='red')
+    tree.tag_configure('expiring_soon', background='#fff8dc', foreground='#e67e22')
+
+    # --- Bottom Frame for Action Buttons ---
+    action_frame = tk.Frame(root, bg='#f0f0f0', pady=10)
+    action_frame.pack(fill='x', padx=10)
+
+    button_font = ('Segoe UI', 10, 'bold')
+    btn_style = {'fg': 'white', 'relief': 'flat', 'padx': 15, 'pady': 5, 'width': 18}  # Adjusted width
+
+    add_btn = tk.Button(action_frame, text="Add Medicine", command=open_add_window, font=button_font, bg='#27ae60',
+                        **btn_style)
+    update_btn = tk.Button(action_frame, text="Update Selected", command=open_update_window, font=button_font, bg='#2980b9',
+                           **btn_style)
+    delete_btn = tk.Button(action_frame, text="Delete Selected", command=delete_medicine, font=button_font, bg='#c0392b',
+                           **btn_style)
+    expiry_btn = tk.Button(action_frame, text="Check Expiry", command=check_expiry_status, font=button_font, bg='#f39c12',
+                           **btn_style)
+    low_stock_btn = tk.Button(action_frame, text="View Low Stock", command=view_low_stock, font=button_font, bg='#8e44ad',
+                              **btn_style)
+    graph_btn = tk.Button(action_frame, text="View Graph", command=open_timeline_graph_selection_window, font=button_font,
+                          bg='#16a085', **btn_style)
+    import_btn = tk.Button(action_frame, text="Import Delivery", command=import_delivery, font=button_font,
+                           bg='#34495e', **btn_style)
+
+    # Pack buttons with space in between
+    action_frame.pack_propagate(False)
+    action_frame.grid_columnconfigure((0, 1, 2, 3, 4, 5, 6), weight=1)
+    add_btn.grid(row=0, column=0, padx=5)
+    update_btn.grid(row=0, column=1, padx=5)
+    delete_btn.grid(row=0, column=2, padx=5)
+    expiry_btn.grid(row=0, column=3, padx=5)
+    low_stock_btn.grid(row=0, column=4, padx=5)
+    graph_btn.grid(row=0, column=5, padx=5)
+    import_btn.grid(row=0, column=6, padx=5)
+
+    # --- Start Application ---
+    # It's better to connect to DB after setting up the main window.
+    root.after(100, connect_to_database)  # Delay connection slightly
+    root.after(200, fetch_all_medicines)  # Populate tree after connection
+    root.after(SYNC_INTERVAL_MS, sync_changes)  # Then keep it current with small incremental syncs
+    root.after(300, check_low_stock)  # Fills the low-stock badge, then re-checks in the background
+    root.after(400, refresh_forecast)  # First pass reads all history, later ones only the new rows
+    root.mainloop()
+
+    # Close database connection when the application is closed
+    storage.close()
     print("Database connection closed.")
 
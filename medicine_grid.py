@@ -0,0 +1,463 @@
+# Virtual scrolling for the main medicine Treeview.
+# Loading the whole Medicines table into Tk does not work once the inventory
+# gets big, so the grid only keeps enough Tk items alive to fill the visible
+# area and swaps their values as you scroll. Rows are read from the database
+# one keyset page at a time and recently used pages stay in a small LRU cache,
+# so scrolling back and forth does not hit MySQL again.
+#
+# The rows the grid holds live in a row store keyed by medicine id. After an
+# add/update/delete only the affected row is patched (plus the page counts),
+# so a refresh costs O(changed rows) instead of reloading the whole table.
+#
+# Pages are requested through a callback, so they can be loaded on a
+# background worker. Until a page arrives its rows show as placeholders.
+
+from bisect import bisect_right, insort
+from collections import OrderedDict
+from itertools import accumulate
+
+import instrumentation
+
+PAGE_SIZE = 200  # Rows per keyset page
+PREFETCH_PAGES = 1  # Extra pages loaded above and below the visible window
+PAGE_CACHE_LIMIT = 50  # Pages kept in the LRU cache
+ROW_HEIGHT = 25  # Must match the rowheight in the Treeview style
+WHEEL_STEP = 3  # Rows scrolled per mouse wheel notch
+
+# --- Grid State ---
+# Same function-based approach as main.py, so the state is kept in globals.
+tree = None
+scrollbar = None
+page_loader = None  # (first_id, limit, on_loaded) -> None, calls on_loaded(rows) when done
+row_tags = lambda row: ()  # row -> Treeview tags, main.py plugs in the expiry colouring
+extra_values = lambda row: ()  # row -> values of the columns after the database ones (the stock-out forecast)
+DATA_COLUMNS = 8  # Values of a row shown as they are, the rest of a row is bookkeeping (expiry status, reorder level)
+
+virtual_mode = False
+offset = 0  # Index of the first visible row
+total_rows = 0
+page_starts = []  # First medicine id of every page
+page_counts = []  # Number of rows in every page (changes as rows are patched in/out)
+page_offsets = []  # Row index of the first row of every page
+page_cache = OrderedDict()  # page start id -> sorted list of medicine ids
+pending_pages = set()  # Page start ids requested but not loaded yet
+generation = 0  # Bumped on every reload, so pages from an older index are ignored
+rendering = False
+LOADING_ROW = ("", "Loading...", "", "", "", "", "", "")
+
+row_store = {}  # medicine id -> row, for every row the grid currently holds
+item_ids = {}  # medicine id -> Tk item currently showing it
+list_ids = []  # Ids shown in list mode, in display order
+list_filter = None  # row -> bool, decides if a patched row belongs in the list
+last_known_id = 0  # Highest id in the table at the last reload (or patched in since), anything above it is new
+removed_ids = set()  # Ids patched out since the last reload, or already gone at it (makes removals idempotent)
+
+
+def attach(treeview, y_scrollbar, load_page):
+    """Hooks the grid up to a Treeview, its vertical scrollbar and the page loader."""
+    global tree, scrollbar, page_loader
+    tree = treeview
+    scrollbar = y_scrollbar
+    page_loader = load_page
+
+    tree.bind("<Configure>", on_resize, add="+")
+    tree.bind("<MouseWheel>", on_mousewheel)
+    tree.bind("<Button-4>", on_mousewheel)
+    tree.bind("<Button-5>", on_mousewheel)
+    tree.bind("<Up>", on_arrow_key)
+    tree.bind("<Down>", on_arrow_key)
+    tree.bind("<Prior>", on_page_key)
+    tree.bind("<Next>", on_page_key)
+
+
+# --- Item Helpers ---
+def item_values(row):
+    if row is LOADING_ROW:
+        return row
+    return tuple(row[:DATA_COLUMNS]) + tuple(extra_values(row))
+
+
+@instrumentation.timed("ui", "grid.fill_items", rows_of=lambda args: len(args[0]))
+def fill_items(rows):
+    """Writes rows into the Treeview, reusing the existing item ids."""
+    items = tree.get_children()
+    item_ids.clear()
+    for i, row in enumerate(rows):
+        tags = () if row is LOADING_ROW else row_tags(row)
+        if i < len(items):
+            item = items[i]
+            tree.item(item, values=item_values(row), tags=tags)
+        else:
+            item = tree.insert("", "end", values=item_values(row), tags=tags)
+        if row is not LOADING_ROW:
+            item_ids[row[0]] = item
+    if len(items) > len(rows):
+        tree.delete(*items[len(rows):])
+
+
+def focused_medicine_id():
+    """Returns the id of the medicine under the Treeview focus, if any."""
+    item = tree.focus()
+    if not item or not tree.exists(item):
+        return None
+    values = tree.item(item, 'values')
+    return str(values[0]) if values else None
+
+
+def restore_focus(medicine_id):
+    """Moves the focus/selection back to the item showing medicine_id, or clears it."""
+    for item in tree.get_children():
+        values = tree.item(item, 'values')
+        if medicine_id is not None and values and str(values[0]) == medicine_id:
+            tree.focus(item)
+            tree.selection_set(item)
+            return
+    if tree.selection():
+        tree.selection_remove(tree.selection())
+
+
+def refresh_item(row):
+    """Redraws the single Tk item showing row, if it is on screen."""
+    item = item_ids.get(row[0])
+    if item is not None and tree.exists(item):
+        tree.item(item, values=item_values(row), tags=row_tags(row))
+
+
+# --- List Mode ---
+def show_rows(records, keep=None):
+    """Shows a plain list of records (search results, low stock, ...) without paging.
+
+    keep is an optional row -> bool check used to decide whether patched rows
+    still belong in (or should join) the list.
+    """
+    global virtual_mode, list_filter
+    virtual_mode = False
+    list_filter = keep
+    for medicine_id in list_ids:
+        if not in_cached_page(medicine_id):
+            row_store.pop(medicine_id, None)
+    list_ids[:] = [row[0] for row in records]
+    for row in records:
+        row_store[row[0]] = row
+    tree.configure(yscrollcommand=scrollbar.set)
+    scrollbar.config(command=tree.yview)
+    fill_items(records)
+    tree.yview_moveto(0)
+
+
+def render_list():
+    """Redraws list mode from the row store, keeping the focused medicine."""
+    medicine_id = focused_medicine_id()
+    fill_items([row_store[i] for i in list_ids])
+    restore_focus(medicine_id)
+
+
+# --- Virtual Mode ---
+def reload(starts, total, max_id, gone_ids=()):
+    """Shows the whole table in virtual mode, given the first id of every page, the row count and the highest id.
+
+    max_id has to come from the same read as the page index: a synced row at or
+    below it is an update, whether or not its page has been loaded. gone_ids are
+    medicines already deleted at that read, which the overlapping syncs report again.
+    """
+    global virtual_mode, total_rows, page_starts, page_counts, last_known_id, generation
+    generation += 1
+    page_starts, total_rows = list(starts), total
+    page_counts = [PAGE_SIZE] * len(page_starts)
+    if page_counts:
+        page_counts[-1] = total_rows - PAGE_SIZE * (len(page_starts) - 1)
+    rebuild_offsets()
+    page_cache.clear()
+    pending_pages.clear()
+    row_store.clear()
+    list_ids.clear()
+    removed_ids.clear()
+    removed_ids.update(gone_ids)
+    last_known_id = max_id
+    virtual_mode = True
+    # The tree only ever holds the visible rows, so its own yview is useless here
+    tree.configure(yscrollcommand="")
+    scrollbar.config(command=on_scrollbar)
+    tree.yview_moveto(0)
+    scroll_to(offset)
+
+
+def rebuild_offsets():
+    """Recomputes where every page starts, O(pages) rather than O(rows)."""
+    global page_offsets
+    page_offsets = [0] + list(accumulate(page_counts))[:-1] if page_counts else []
+
+
+def visible_rows():
+    """Number of rows that fit in the Treeview at its current size."""
+    height = tree.winfo_height()
+    if height <= 1:  # Not mapped yet, fall back to the configured height
+        return int(tree.cget("height"))
+    return max(1, height // ROW_HEIGHT - 1)  # Minus one row for the headings
+
+
+def page_of(medicine_id):
+    """Index of the page a medicine id falls into."""
+    return max(0, bisect_right(page_starts, medicine_id) - 1)
+
+
+def in_cached_page(medicine_id):
+    return bool(page_starts) and medicine_id in page_cache.get(page_starts[page_of(medicine_id)], ())
+
+
+def get_page(page_no):
+    """Returns the ids of a page from the LRU cache, or None while it is still loading."""
+    start = page_starts[page_no]
+    if start in page_cache:
+        page_cache.move_to_end(start)
+        return page_cache[start]
+    if start not in pending_pages:
+        pending_pages.add(start)
+        page_loader(start, page_counts[page_no],
+                    lambda rows, start=start, gen=generation: page_loaded(start, rows, gen))
+    return page_cache.get(start)  # The loader may have answered straight away
+
+
+def page_loaded(start, rows, gen):
+    """Stores a page that arrived from the loader and redraws if it is on screen."""
+    if gen != generation or start not in pending_pages:
+        return  # Requested before the last reload
+    pending_pages.discard(start)
+    for row in rows:
+        row_store[row[0]] = row
+    page_cache[start] = [row[0] for row in rows]
+    while len(page_cache) > PAGE_CACHE_LIMIT:
+        evict_page()
+    if virtual_mode and not rendering:
+        render()
+
+
+def evict_page():
+    """Drops the least recently used page and its rows from the store."""
+    start, ids = page_cache.popitem(last=False)
+    keep = set(list_ids)
+    for medicine_id in ids:
+        if medicine_id not in keep:
+            row_store.pop(medicine_id, None)
+
+
+def window_rows(start, count):
+    """Collects count rows starting at row index start, prefetching neighbouring pages."""
+    if total_rows == 0:
+        return []
+    end = min(start + count, total_rows)
+    first_page = bisect_right(page_offsets, start) - 1
+    last_page = bisect_right(page_offsets, end - 1) - 1
+
+    rows = []
+    position = page_offsets[first_page]
+    for page_no in range(first_page, last_page + 1):
+        ids = get_page(page_no)
+        count = page_counts[page_no]
+        lo = max(start - position, 0)
+        hi = min(end - position, count)
+        if ids is None:
+            rows.extend([LOADING_ROW] * (hi - lo))
+        else:
+            rows.extend(row_store[i] for i in ids[lo:hi])
+        position += count
+
+    for page_no in range(first_page - PREFETCH_PAGES, last_page + PREFETCH_PAGES + 1):
+        if 0 <= page_no < len(page_starts) and page_starts[page_no] not in page_cache:
+            get_page(page_no)
+    return rows
+
+
+def render():
+    """Fills the reusable Tk items with the rows of the current window."""
+    global rendering
+    rendering = True
+    try:
+        medicine_id = focused_medicine_id()
+        fill_items(window_rows(offset, visible_rows()))
+        restore_focus(medicine_id)
+        update_scrollbar()
+    finally:
+        rendering = False
+
+
+def update_scrollbar():
+    """Sizes the scrollbar thumb to the visible part of the table."""
+    if total_rows == 0:
+        scrollbar.set(0, 1)
+        return
+    shown = min(visible_rows(), total_rows)
+    scrollbar.set(offset / total_rows, (offset + shown) / total_rows)
+
+
+def scroll_to(new_offset):
+    """Moves the window so that it starts at row new_offset (clamped) and redraws."""
+    global offset
+    offset = max(0, min(int(new_offset), total_rows - visible_rows()))
+    render()
+
+
+def redraw():
+    """Redraws whichever mode is active from the data already in memory."""
+    if virtual_mode:
+        scroll_to(offset)
+    else:
+        render_list()
+
+
+# --- Patch API ---
+# Called by the add/update/delete paths (and the sync pass) with the row as it
+# is now in the database. Each call touches one row plus the page bookkeeping.
+def patch_insert_row(row):
+    """Adds a new medicine row to the grid."""
+    global total_rows, last_known_id
+    medicine_id = row[0]
+    last_known_id = max(last_known_id, medicine_id)
+    removed_ids.discard(medicine_id)
+
+    if page_starts:
+        page_no = page_of(medicine_id)
+        if medicine_id < page_starts[0]:
+            # New smallest id, the first page now starts here
+            ids = page_cache.pop(page_starts[0], None)
+            page_starts[0] = medicine_id
+            if ids is not None:
+                page_cache[medicine_id] = ids
+        page_counts[page_no] += 1
+        ids = page_cache.get(page_starts[page_no])
+        if ids is not None:
+            insort(ids, medicine_id)
+            row_store[medicine_id] = row
+    else:
+        page_starts.append(medicine_id)
+        page_counts.append(1)
+        page_cache[medicine_id] = [medicine_id]
+        row_store[medicine_id] = row
+    total_rows += 1
+    rebuild_offsets()
+
+    if list_filter is not None and list_filter(row):
+        list_ids.append(medicine_id)
+        row_store[medicine_id] = row
+    if virtual_mode or medicine_id in list_ids:
+        redraw()
+
+
+def patch_update_row(row):
+    """Replaces the values of an existing medicine row."""
+    medicine_id = row[0]
+    if medicine_id in row_store:
+        row_store[medicine_id] = row
+
+    if not virtual_mode and list_filter is not None:
+        shown = medicine_id in list_ids
+        belongs = list_filter(row)
+        if shown and not belongs:
+            list_ids.remove(medicine_id)
+            render_list()
+            return
+        if belongs and not shown:
+            list_ids.append(medicine_id)
+            row_store[medicine_id] = row
+            render_list()
+            return
+    refresh_item(row)
+
+
+def patch_remove_row(medicine_id):
+    """Removes a deleted medicine from the grid."""
+    global total_rows
+    if medicine_id in removed_ids:
+        return
+    removed_ids.add(medicine_id)
+
+    if page_starts:
+        page_no = page_of(medicine_id)
+        start = page_starts[page_no]
+        ids = page_cache.get(start)
+        if ids is not None and medicine_id in ids:
+            ids.remove(medicine_id)
+        page_counts[page_no] -= 1
+        if page_counts[page_no] <= 0:
+            del page_starts[page_no]
+            del page_counts[page_no]
+            page_cache.pop(start, None)
+        total_rows = max(0, total_rows - 1)
+        rebuild_offsets()
+
+    was_listed = medicine_id in list_ids
+    if was_listed:
+        list_ids.remove(medicine_id)
+    row_store.pop(medicine_id, None)
+    if virtual_mode or was_listed:
+        redraw()
+
+
+def apply_changes(changed_rows, deleted_ids=()):
+    """Reconciliation pass: patches in rows changed elsewhere since the last sync."""
+    # Deletions first, and none of an id that is still there (a changed row is read after its deletion)
+    changed_ids = {row[0] for row in changed_rows}
+    for medicine_id in deleted_ids:
+        if medicine_id not in changed_ids:
+            patch_remove_row(medicine_id)
+    for row in changed_rows:
+        if row[0] > last_known_id:
+            patch_insert_row(row)
+        else:
+            patch_update_row(row)
+
+
+# --- Event Handlers ---
+def on_scrollbar(*args):
+    """Scrollbar command while in virtual mode ('moveto' or 'scroll')."""
+    if args[0] == "moveto":
+        scroll_to(float(args[1]) * total_rows)
+    elif args[0] == "scroll":
+        step = int(args[1])
+        if args[2] == "pages":
+            step *= visible_rows()
+        scroll_to(offset + step)
+
+
+def on_mousewheel(event):
+    if not virtual_mode:
+        return None
+    if event.num == 4 or event.delta > 0:
+        scroll_to(offset - WHEEL_STEP)
+    else:
+        scroll_to(offset + WHEEL_STEP)
+    return "break"
+
+
+def on_arrow_key(event):
+    """Scrolls by one row when the focus is about to leave the visible window."""
+    if not virtual_mode:
+        return None
+    items = tree.get_children()
+    if not items:
+        return None
+    focus = tree.focus()
+    if event.keysym == "Up" and focus == items[0] and offset > 0:
+        scroll_to(offset - 1)
+        edge = tree.get_children()[0]
+    elif event.keysym == "Down" and focus == items[-1] and offset + len(items) < total_rows:
+        scroll_to(offset + 1)
+        edge = tree.get_children()[-1]
+    else:
+        return None
+    tree.focus(edge)
+    tree.selection_set(edge)
+    return "break"
+
+
+def on_page_key(event):
+    if not virtual_mode:
+        return None
+    step = visible_rows() if event.keysym == "Next" else -visible_rows()
+    scroll_to(offset + step)
+    return "break"
+
+
+def on_resize(event):
+    if virtual_mode:
+        scroll_to(offset)
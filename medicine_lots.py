@@ -0,0 +1,47 @@
+# Medicine lots.
+# A medicine used to have a single quantity and expiry date, so a second
+# delivery of the same drug either overwrote the expiry of the first or had to
+# become a duplicate medicine. Stock can now be kept per lot (MedicineLots:
+# lot number, quantity, expiry) and is dispensed first-expired-first-out: the
+# lot expiring soonest goes first, expired lots are never dispensed.
+#
+# The main view still reads Medicines alone. Once a medicine has lots, its
+# quantity is their total and its exp_date the earliest expiry among them.
+# Every lot operation keeps both up to date on the same cursor: the quantity
+# moves by the change and exp_date is one index seek on (medicine_id,
+# exp_date), so nothing ever has to add lots up to show the grid, however
+# many lots a medicine has. A medicine's first lot operation turns the stock
+# it already had into an OPENING lot, so its total never jumps. Lots that run
+# out are deleted.
+#
+# The SQL lives with each backend (medicine_writes.py for MySQL, sqlite_store.py);
+# this module has what they share.
+
+OPENING_LOT = "OPENING"  # Lot number of the stock a medicine had before its first lot
+
+
+class LotError(Exception):
+    """A lot operation that cannot be done: not enough stock, a bad quantity, ..."""
+
+
+def allocate(lots, quantity):
+    """FEFO plan taking quantity from lots, given as (id, lot_number, quantity, exp_date) soonest expiry first.
+
+    Returns (lot id, lot number, exp_date, taken) for every lot touched.
+    Raises LotError if the lots hold less than quantity.
+    """
+    plan, left = [], quantity
+    for lot_id, lot_number, available, exp_date in lots:
+        if left == 0:
+            break
+        taken = min(available, left)
+        plan.append((lot_id, lot_number, exp_date, taken))
+        left -= taken
+    if left:
+        raise LotError(f"Only {quantity - left} unexpired units in stock, {quantity} asked for.")
+    return plan
+
+
+def check_quantity(quantity):
+    if quantity <= 0:
+        raise LotError("The quantity must be a positive whole number.")
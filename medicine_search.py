@@ -0,0 +1,71 @@
+# Medicine search.
+# A leading-wildcard LIKE ('%q%') on name, category and supplier cannot use
+# any index, so every search was a full table scan. Searches now go through
+# MySQL FULLTEXT indexes with prefix matching in boolean mode: each word typed
+# must start a word in the name, category or supplier. Matches are ranked with
+# name hits first.
+#
+# InnoDB does not index words shorter than innodb_ft_min_token_size (3 by
+# default). Those words are still checked, but only against the rows the
+# FULLTEXT part already found. A query made only of short words falls back to
+# an indexed prefix LIKE on the name.
+
+import re
+
+MIN_TOKEN_SIZE = 3  # Keep in line with innodb_ft_min_token_size
+SEARCH_LIMIT = 500  # Most results a search returns (best ranked first)
+SEARCH_COLUMNS = (1, 2, 7)  # name, category, supplier in a grid row
+
+SEARCH_MATCH = "MATCH(name, category, supplier) AGAINST (%s IN BOOLEAN MODE)"
+NAME_MATCH = "MATCH(name) AGAINST (%s IN BOOLEAN MODE)"
+
+
+def search_tokens(query):
+    """Lower-cased words of the query; FULLTEXT operators and punctuation are dropped."""
+    return re.findall(r"\w+", query.lower())
+
+
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_search(query, limit=SEARCH_LIMIT):
+    """Returns the WHERE/ORDER BY/LIMIT part of the search query and its parameters."""
+    tokens = search_tokens(query)
+    long_tokens = [t for t in tokens if len(t) >= MIN_TOKEN_SIZE]
+    short_tokens = [t for t in tokens if len(t) < MIN_TOKEN_SIZE]
+
+    if not long_tokens:
+        # Nothing the FULLTEXT index can use, match the start of the name instead
+        prefix = " ".join(tokens) if tokens else query.strip()
+        return "WHERE name LIKE %s ORDER BY name LIMIT %s", [like_escape(prefix) + "%", limit]
+
+    against = " ".join(f"+{t}*" for t in long_tokens)
+    where = f"WHERE {SEARCH_MATCH}"
+    params = [against]
+    for token in short_tokens:
+        where += " AND CONCAT_WS(' ', name, category, supplier) LIKE %s"
+        params.append(f"%{like_escape(token)}%")
+    # Hits in the name count double, then overall relevance, then alphabetical
+    order = f"ORDER BY {NAME_MATCH} * 2 + {SEARCH_MATCH} DESC, name LIMIT %s"
+    return f"{where} {order}", params + [against, against, limit]
+
+
+def row_matches(row, tokens):
+    """Python version of the search test, used to keep results current as rows are patched."""
+    if not any(len(t) >= MIN_TOKEN_SIZE for t in tokens):
+        return str(row[1] or "").lower().startswith(" ".join(tokens))
+    words = []
+    text = []
+    for i in SEARCH_COLUMNS:
+        value = str(row[i] or "").lower()
+        text.append(value)
+        words.extend(re.findall(r"\w+", value))
+    text = " ".join(text)
+    for token in tokens:
+        if len(token) >= MIN_TOKEN_SIZE:
+            if not any(word.startswith(token) for word in words):
+                return False
+        elif token not in text:
+            return False
+    return True
@@ -0,0 +1,210 @@
+# Medicine writes.
+# Adding or updating a medicine used to commit the Medicines row first and its
+# StockHistory row in a second transaction: two fsyncs per edit, and a medicine
+# could end up without its history if the second half failed. Each operation
+# here writes the row, its history and the snapshot rollups on one cursor, and
+# run_transaction() commits them together (or rolls all of it back).
+#
+# run_transaction() also takes several operations at once, all or nothing.
+# run_group() is group commit for independent writers (api_server.py batches
+# the writes that arrive together): each operation runs under its own
+# savepoint, so one failing is rolled back alone, and they share one commit.
+#
+# Receiving and dispensing lots (see medicine_lots.py) work the same way.
+
+from datetime import date
+
+import instrumentation
+import stock_snapshots
+from medicine_lots import OPENING_LOT, LotError, allocate, check_quantity
+
+HISTORY_SQL = "INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (%s, %s, %s)"
+
+
+# --- Operations ---
+# Each takes a cursor and leaves committing to run_transaction()
+def add_medicine(cursor, name, category, price, quantity, mfg_date, exp_date, supplier, day=None):
+    """Inserts a medicine with its opening stock in the history; returns the new id."""
+    day = day or date.today()
+    cursor.execute("INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier) "
+                   "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                   (name, category, price, quantity, mfg_date, exp_date, supplier))
+    medicine_id = cursor.lastrowid
+    cursor.execute(HISTORY_SQL, (medicine_id, day, quantity))
+    stock_snapshots.record_change(cursor, medicine_id, day, quantity, category)
+    return medicine_id
+
+
+def update_medicine(cursor, medicine_id, name, category, price, quantity, mfg_date, exp_date, supplier,
+                    original_quantity, original_category, day=None):
+    """Updates a medicine; a quantity change is added to the history, and either change to the snapshots.
+
+    original_quantity is the quantity the edit started from: if quantity is
+    still that, the stock is left as it is in the database now (a lot may have
+    been dispensed meanwhile). A medicine with lots keeps the expiry of its
+    lots, and its quantity can only change by receiving or dispensing them.
+    """
+    day = day or date.today()
+    row = lock_row(cursor, medicine_id)
+    if row is None:
+        raise LotError(f"There is no medicine with id {medicine_id}.")
+    stored_quantity, stored_category, _ = row
+    if quantity == original_quantity:
+        quantity = stored_quantity
+    elif has_lots(cursor, medicine_id):
+        raise LotError("This medicine's stock is kept in lots; receive or dispense a lot to change it.")
+    cursor.execute("UPDATE Medicines SET name=%s, category=%s, price=%s, quantity=%s, mfg_date=%s, "
+                   "exp_date=COALESCE((SELECT MIN(exp_date) FROM MedicineLots WHERE medicine_id = %s), %s), "
+                   "supplier=%s WHERE id=%s",
+                   (name, category, price, quantity, mfg_date, medicine_id, exp_date, supplier, medicine_id))
+    if quantity != stored_quantity:
+        cursor.execute(HISTORY_SQL, (medicine_id, day, quantity))
+    # A category change moves the stock between categories
+    if quantity != stored_quantity or category != stored_category:
+        stock_snapshots.record_change(cursor, medicine_id, day, quantity, category,
+                                      stored_quantity, stored_category)
+    return medicine_id
+
+
+def delete_medicine(cursor, medicine_id, category, quantity, day=None):
+    """Deletes a medicine; ON DELETE CASCADE takes its history and snapshot rows with it."""
+    cursor.execute("DELETE FROM Medicines WHERE id = %s", (medicine_id,))
+    stock_snapshots.record_removal(cursor, category, quantity, day or date.today())
+    return medicine_id
+
+
+def set_reorder_point(cursor, medicine_id, reorder_point):
+    """Sets (or with None clears) a medicine's own reorder point; the trigger works out reorder_level."""
+    cursor.execute("UPDATE Medicines SET reorder_point = %s WHERE id = %s", (reorder_point, medicine_id))
+    return medicine_id
+
+
+def set_category_reorder_point(cursor, category, reorder_point):
+    """Sets (or with None clears) a category's reorder point; returns the number of medicines it applies to."""
+    category = category or ''
+    if reorder_point is None:
+        cursor.execute("DELETE FROM CategoryReorderPoints WHERE category = %s", (category,))
+    else:
+        cursor.execute("INSERT INTO CategoryReorderPoints (category, reorder_point) VALUES (%s, %s) "
+                       "ON DUPLICATE KEY UPDATE reorder_point = VALUES(reorder_point)", (category, reorder_point))
+    # Touching the rows lets the update trigger pick up the new point (and bumps updated_at for the sync)
+    cursor.execute("UPDATE Medicines SET reorder_level = -1 WHERE COALESCE(category, '') = %s "
+                   "AND reorder_point IS NULL", (category,))
+    return cursor.rowcount
+
+
+# --- Lots ---
+def has_lots(cursor, medicine_id):
+    cursor.execute("SELECT 1 FROM MedicineLots WHERE medicine_id = %s LIMIT 1", (medicine_id,))
+    return cursor.fetchone() is not None
+
+
+def lock_row(cursor, medicine_id):
+    """(quantity, category, exp_date) of a medicine, its row locked until the commit; None if there is no such row."""
+    cursor.execute("SELECT quantity, category, exp_date FROM Medicines WHERE id = %s FOR UPDATE", (medicine_id,))
+    return cursor.fetchone()
+
+
+def lock_medicine(cursor, medicine_id):
+    """(quantity, category) of a medicine, its row locked until the commit; turns its stock into lots if it has none.
+
+    The lock makes lot operations (and edits, see update_medicine) on one medicine take turns.
+    """
+    row = lock_row(cursor, medicine_id)
+    if row is None:
+        raise LotError(f"There is no medicine with id {medicine_id}.")
+    quantity, category, exp_date = row
+    if quantity > 0 and not has_lots(cursor, medicine_id):
+        cursor.execute("INSERT INTO MedicineLots (medicine_id, lot_number, quantity, exp_date) VALUES (%s, %s, %s, %s)",
+                       (medicine_id, OPENING_LOT, quantity, exp_date))
+    return quantity, category
+
+
+def move_stock(cursor, medicine_id, category, old_quantity, delta, day):
+    """Moves a medicine's total by delta and re-reads its earliest expiry; the history and snapshots follow."""
+    quantity = old_quantity + delta
+    # MIN() on idx_lots_medicine_exp is a single index seek, however many lots there are
+    cursor.execute("UPDATE Medicines SET quantity = %s, "
+                   "exp_date = COALESCE((SELECT MIN(exp_date) FROM MedicineLots WHERE medicine_id = %s), exp_date) "
+                   "WHERE id = %s", (quantity, medicine_id, medicine_id))
+    cursor.execute(HISTORY_SQL, (medicine_id, day, quantity))
+    stock_snapshots.record_change(cursor, medicine_id, day, quantity, category, old_quantity, category)
+
+
+def receive_lot(cursor, medicine_id, lot_number, quantity, exp_date, day=None):
+    """Adds quantity to a medicine's lot, creating the lot if it is new; returns the lot id."""
+    check_quantity(quantity)
+    old_quantity, category = lock_medicine(cursor, medicine_id)
+    cursor.execute("SELECT id, exp_date FROM MedicineLots WHERE medicine_id = %s AND lot_number = %s",
+                   (medicine_id, lot_number))
+    lot = cursor.fetchone()
+    if lot is None:
+        cursor.execute("INSERT INTO MedicineLots (medicine_id, lot_number, quantity, exp_date) VALUES (%s, %s, %s, %s)",
+                       (medicine_id, lot_number, quantity, exp_date))
+        lot_id = cursor.lastrowid
+    elif str(lot[1]) != str(exp_date):
+        raise LotError(f"Lot {lot_number} is already in stock with expiry {lot[1]}.")
+    else:
+        lot_id = lot[0]
+        cursor.execute("UPDATE MedicineLots SET quantity = quantity + %s WHERE id = %s", (quantity, lot_id))
+    move_stock(cursor, medicine_id, category, old_quantity, quantity, day or date.today())
+    return lot_id
+
+
+def dispense(cursor, medicine_id, quantity, day=None):
+    """Takes quantity from the unexpired lots, soonest expiry first; returns (lot_number, exp_date, taken) per lot."""
+    check_quantity(quantity)
+    old_quantity, category = lock_medicine(cursor, medicine_id)
+    cursor.execute("SELECT id, lot_number, quantity, exp_date FROM MedicineLots "
+                   "WHERE medicine_id = %s AND exp_date >= CURDATE() ORDER BY exp_date, id", (medicine_id,))
+    plan = allocate(cursor.fetchall(), quantity)
+    cursor.executemany("UPDATE MedicineLots SET quantity = quantity - %s WHERE id = %s",
+                       [(taken, lot_id) for lot_id, _, _, taken in plan])
+    cursor.execute("DELETE FROM MedicineLots WHERE medicine_id = %s AND quantity = 0", (medicine_id,))
+    move_stock(cursor, medicine_id, category, old_quantity, -quantity, day or date.today())
+    return [(lot_number, exp_date, taken) for _, lot_number, exp_date, taken in plan]
+
+
+# --- Transactions ---
+def run_transaction(connection, *operations):
+    """Runs operation(cursor) for each operation in one transaction with a single commit.
+
+    Returns their results in order. If any of them fails nothing is kept and
+    the error is raised.
+    """
+    cursor = instrumentation.timed_cursor(connection.cursor())
+    try:
+        results = [operation(cursor) for operation in operations]
+        connection.commit()
+        return results
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_group(connection, operations):
+    """Runs independent operations in one transaction with a single commit; returns (result, error) for each.
+
+    A failing operation is rolled back to its savepoint and gets its exception
+    as error, the others still commit. If the commit itself fails, it is raised.
+    """
+    cursor = instrumentation.timed_cursor(connection.cursor())
+    outcomes = []
+    try:
+        for operation in operations:
+            cursor.execute("SAVEPOINT grouped")
+            try:
+                outcomes.append((operation(cursor), None))
+            except Exception as err:
+                cursor.execute("ROLLBACK TO SAVEPOINT grouped")
+                outcomes.append((None, err))
+            cursor.execute("RELEASE SAVEPOINT grouped")
+        connection.commit()
+        return outcomes
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,162 @@
+# MySQL storage backend.
+# The reads and writes behind the main window, written for the MySQL server.
+# sqlite_store.py has the same functions for the embedded SQLite database and
+# storage.py decides which one main.py talks to. Every read takes a cursor and
+# no Tk, so it can run on a db_worker thread. NumPy is only loaded by the
+# history reads, so text-only users (inventory_cli.py) start quickly.
+
+import medicine_search
+import stock_snapshots
+from inventory_queries import LOW_STOCK, SYNC_OVERLAP_SECONDS, select_medicines
+from medicine_writes import (add_medicine, update_medicine, delete_medicine, set_reorder_point,  # noqa: F401
+                             set_category_reorder_point, receive_lot, dispense, run_transaction, run_group)
+
+
+# --- Main View ---
+def read_page_index(cursor, page_size):
+    """Returns the sync mark, the first id of every page, the total number of medicines, the highest id
+    and the ids deleted in the overlap window before the mark (see read_changes)."""
+    # Everything changed after this point is picked up by the next sync
+    cursor.execute("SELECT NOW(6)")
+    mark = cursor.fetchone()[0]
+    # Only walks the primary key, so this stays cheap even on big tables
+    sql = """
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS row_no FROM Medicines
+        ) AS numbered
+        WHERE MOD(row_no - 1, %s) = 0
+        ORDER BY id
+    """
+    cursor.execute(sql, (page_size,))
+    page_starts = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT COUNT(*), MAX(id) FROM Medicines")
+    total, max_id = cursor.fetchone()
+    # The next sync reports these again; the worker's transaction reads them from the same snapshot as the pages
+    cursor.execute("SELECT medicine_id FROM MedicineDeletions WHERE deleted_at >= %s - INTERVAL %s SECOND",
+                   (mark, SYNC_OVERLAP_SECONDS))
+    return mark, page_starts, total, max_id or 0, [row[0] for row in cursor.fetchall()]
+
+
+def read_page(cursor, first_id, limit, horizon):
+    """Keyset query for one page of medicines starting at first_id."""
+    cursor.execute(select_medicines("WHERE id >= %s ORDER BY id LIMIT %s"), (horizon, first_id, limit))
+    return cursor.fetchall()
+
+
+def read_medicine(cursor, medicine_id, horizon):
+    """A single medicine by its primary key (used to patch the grid)."""
+    cursor.execute(select_medicines("WHERE id = %s"), (horizon, medicine_id))
+    return cursor.fetchone()
+
+
+def read_changes(cursor, since, horizon):
+    """Rows changed and ids deleted since the given mark, plus the new mark."""
+    cursor.execute("SELECT NOW(6)")
+    new_mark = cursor.fetchone()[0]
+    # Overlaps the last read, so rows committed late with an older updated_at are
+    # picked up too; the rows read twice are patched in again, which is harmless
+    cursor.execute(select_medicines("WHERE updated_at >= %s - INTERVAL %s SECOND ORDER BY id"),
+                   (horizon, since, SYNC_OVERLAP_SECONDS))
+    changed = cursor.fetchall()
+    cursor.execute("SELECT medicine_id FROM MedicineDeletions WHERE deleted_at >= %s - INTERVAL %s SECOND",
+                   (since, SYNC_OVERLAP_SECONDS))
+    deleted = [row[0] for row in cursor.fetchall()]
+    return new_mark, changed, deleted
+
+
+def search(cursor, query, horizon):
+    """FULLTEXT prefix search, best matches first."""
+    rest, params = medicine_search.build_search(query)
+    cursor.execute(select_medicines(rest), [horizon] + params)
+    return cursor.fetchall()
+
+
+def read_at_risk(cursor, horizon):
+    """Expired and expiring medicines, soonest first; only the exp_date index range up to the horizon is read."""
+    cursor.execute(select_medicines("WHERE exp_date <= CURDATE() + INTERVAL %s DAY ORDER BY exp_date"),
+                   (horizon, horizon))
+    return cursor.fetchall()
+
+
+def read_low_stock(cursor, horizon):
+    """Medicines below their reorder point, furthest below first (a range on idx_medicines_stock_margin)."""
+    cursor.execute(select_medicines(f"WHERE {LOW_STOCK} ORDER BY quantity - reorder_level"), (horizon,))
+    return cursor.fetchall()
+
+
+def read_low_stock_ids(cursor):
+    """Ids of the medicines below their reorder point, read from the index alone."""
+    cursor.execute(f"SELECT id FROM Medicines WHERE {LOW_STOCK}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def read_report_batches(cursor, horizon, batch_size):
+    """Expired, expiring and low-stock medicines in batches, streamed off the cursor (for the expiry report)."""
+    import expiry_report
+    return expiry_report.stream_at_risk(cursor, horizon, None, batch_size)
+
+
+def read_medicines(cursor, medicine_ids, horizon):
+    """Rows for the given ids, in the order given (ids no longer there are left out)."""
+    if not medicine_ids:
+        return []
+    cursor.execute(select_medicines(f"WHERE id IN ({', '.join(['%s'] * len(medicine_ids))})"),
+                   [horizon] + list(medicine_ids))
+    rows = {row[0]: row for row in cursor.fetchall()}
+    return [rows[medicine_id] for medicine_id in medicine_ids if medicine_id in rows]
+
+
+# --- Lots ---
+def read_lots(cursor, medicine_id):
+    """(id, lot_number, quantity, exp_date) of a medicine's lots, soonest expiry first."""
+    cursor.execute("SELECT id, lot_number, quantity, exp_date FROM MedicineLots WHERE medicine_id = %s "
+                   "ORDER BY exp_date, id", (medicine_id,))
+    return cursor.fetchall()
+
+
+# --- Forecast ---
+def read_history_since(cursor, after_id, chunk):
+    """Yields StockHistory rows (id, medicine_id, change_date, quantity) with id > after_id, chunk rows at a time."""
+    while True:
+        cursor.execute("SELECT id, medicine_id, change_date, quantity FROM StockHistory "
+                       "WHERE id > %s ORDER BY id LIMIT %s", (after_id, chunk))
+        rows = cursor.fetchall()
+        if rows:
+            yield rows
+        if len(rows) < chunk:
+            return
+        after_id = rows[-1][0]
+
+
+def read_stock_levels(cursor):
+    """(id, quantity, exp_date) of every medicine, what the forecast needs besides the history."""
+    cursor.execute("SELECT id, quantity, exp_date FROM Medicines")
+    return cursor.fetchall()
+
+
+# --- Graphs ---
+def read_names(cursor):
+    cursor.execute("SELECT id, name FROM Medicines")
+    return cursor.fetchall()
+
+
+def read_stock_history(cursor, medicine_ids, start=None, end=None):
+    import stock_history
+    return stock_history.read_stock_history(cursor, medicine_ids, start, end)
+
+
+def read_last_history_ids(cursor, medicine_ids):
+    """{medicine id: id of its newest StockHistory row}, for the medicines that have history."""
+    from stock_history import HISTORY_CHUNK
+    ids = sorted(set(medicine_ids))
+    last_ids = {}
+    for i in range(0, len(ids), HISTORY_CHUNK):
+        chunk = ids[i:i + HISTORY_CHUNK]
+        cursor.execute(f"SELECT medicine_id, MAX(id) FROM StockHistory WHERE medicine_id IN "
+                       f"({', '.join(['%s'] * len(chunk))}) GROUP BY medicine_id", chunk)
+        last_ids.update(cursor.fetchall())
+    return last_ids
+
+
+read_category_trend = stock_snapshots.read_category_trend
+read_total_stock_on = stock_snapshots.read_total_stock_on
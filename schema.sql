@@ -0,0 +1,138 @@
+-- Database schema for the Medicine Expiry and Stock Management System.
+-- Run this once on a fresh MySQL server:  mysql -u root -p < schema.sql
+-- Changes for databases created before a feature was added are at the bottom.
+
+CREATE DATABASE IF NOT EXISTS `pharmacy-final`;
+USE `pharmacy-final`;
+
+CREATE TABLE IF NOT EXISTS Medicines (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    category VARCHAR(50),
+    price DECIMAL(10, 2) NOT NULL,
+    quantity INT NOT NULL,
+    mfg_date DATE NOT NULL,
+    exp_date DATE NOT NULL,
+    supplier VARCHAR(100),
+    -- Reorder point of this medicine; NULL means its category's (CategoryReorderPoints) or the default of 10
+    reorder_point INT NULL,
+    -- The reorder point that applies, filled in by the trigger below
+    reorder_level INT NOT NULL DEFAULT 10,
+    -- Bumped on every insert/update, the app syncs changed rows with it
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    INDEX idx_medicines_updated_at (updated_at),
+    -- Expiry checks and the "at-risk only" view are range scans on this
+    INDEX idx_medicines_exp_date (exp_date),
+    -- Search: FULLTEXT prefix matching, name hits are ranked higher,
+    -- and a plain index for prefix LIKE on short queries
+    FULLTEXT INDEX ft_medicines_search (name, category, supplier),
+    FULLTEXT INDEX ft_medicines_name (name),
+    INDEX idx_medicines_name (name),
+    -- Bulk import looks deliveries up by name and supplier
+    INDEX idx_medicines_name_supplier (name, supplier),
+    -- Low stock is "quantity - reorder_level < 0", an index range (the id comes with it, so counting is index-only)
+    INDEX idx_medicines_stock_margin ((quantity - reorder_level))
+);
+
+-- Reorder points per category, for medicines without their own
+CREATE TABLE IF NOT EXISTS CategoryReorderPoints (
+    category VARCHAR(50) NOT NULL PRIMARY KEY,  -- '' for medicines without a category
+    reorder_point INT NOT NULL
+);
+
+-- Keeps reorder_level in step however a row is written (app, bulk import, other tools)
+DROP TRIGGER IF EXISTS trg_medicines_reorder_insert;
+CREATE TRIGGER trg_medicines_reorder_insert BEFORE INSERT ON Medicines
+    FOR EACH ROW SET NEW.reorder_level = COALESCE(NEW.reorder_point, (
+        SELECT reorder_point FROM CategoryReorderPoints WHERE category = COALESCE(NEW.category, '')), 10);
+
+DROP TRIGGER IF EXISTS trg_medicines_reorder_update;
+CREATE TRIGGER trg_medicines_reorder_update BEFORE UPDATE ON Medicines
+    FOR EACH ROW SET NEW.reorder_level = COALESCE(NEW.reorder_point, (
+        SELECT reorder_point FROM CategoryReorderPoints WHERE category = COALESCE(NEW.category, '')), 10);
+
+CREATE TABLE IF NOT EXISTS StockHistory (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    medicine_id INT NOT NULL,
+    change_date DATE NOT NULL,
+    quantity INT NOT NULL,
+    -- The timeline graph reads history by medicine and date range
+    INDEX idx_stockhistory_medicine_date (medicine_id, change_date),
+    FOREIGN KEY (medicine_id) REFERENCES Medicines(id) ON DELETE CASCADE
+);
+
+-- Daily rollups of StockHistory, maintained by the app (see stock_snapshots.py)
+CREATE TABLE IF NOT EXISTS StockDailySnapshot (
+    medicine_id INT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    quantity INT NOT NULL,  -- Stock at the end of the day
+    PRIMARY KEY (medicine_id, snapshot_date),
+    FOREIGN KEY (medicine_id) REFERENCES Medicines(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS CategoryDailySnapshot (
+    category VARCHAR(50) NOT NULL,  -- '' for medicines without a category
+    snapshot_date DATE NOT NULL,
+    total_quantity INT NOT NULL,  -- Total stock of the category at the end of the day
+    PRIMARY KEY (category, snapshot_date),
+    INDEX idx_category_snapshot_date (snapshot_date)
+);
+
+-- Deleted rows cannot carry an updated_at, so deletions are logged here for the sync
+CREATE TABLE IF NOT EXISTS MedicineDeletions (
+    medicine_id INT NOT NULL,
+    deleted_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_deletions_deleted_at (deleted_at)
+);
+
+DROP TRIGGER IF EXISTS trg_medicines_deleted;
+CREATE TRIGGER trg_medicines_deleted AFTER DELETE ON Medicines
+    FOR EACH ROW INSERT INTO MedicineDeletions (medicine_id) VALUES (OLD.id);
+
+-- Stock per lot (see medicine_lots.py). A medicine with lots has their total as
+-- its quantity and the earliest of their expiry dates as its exp_date.
+CREATE TABLE IF NOT EXISTS MedicineLots (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    medicine_id INT NOT NULL,
+    lot_number VARCHAR(50) NOT NULL,
+    quantity INT NOT NULL,
+    exp_date DATE NOT NULL,
+    UNIQUE INDEX uq_lots_medicine_lot (medicine_id, lot_number),
+    -- First-expired-first-out dispensing and the earliest expiry are range scans/seeks on this
+    INDEX idx_lots_medicine_exp (medicine_id, exp_date),
+    FOREIGN KEY (medicine_id) REFERENCES Medicines(id) ON DELETE CASCADE
+);
+
+
+-- --- Upgrading an existing database ---
+-- Incremental refresh (updated_at + deletion log). The deletion log table and
+-- trigger above are safe to re-run; the column needs:
+-- ALTER TABLE Medicines
+--     ADD COLUMN updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+--     ADD INDEX idx_medicines_updated_at (updated_at);
+--
+-- Server-side expiry classification:
+-- ALTER TABLE Medicines ADD INDEX idx_medicines_exp_date (exp_date);
+--
+-- Batched timeline history:
+-- ALTER TABLE StockHistory ADD INDEX idx_stockhistory_medicine_date (medicine_id, change_date);
+--
+-- Search indexes:
+-- ALTER TABLE Medicines ADD FULLTEXT INDEX ft_medicines_search (name, category, supplier);
+-- ALTER TABLE Medicines ADD FULLTEXT INDEX ft_medicines_name (name);
+-- ALTER TABLE Medicines ADD INDEX idx_medicines_name (name);
+--
+-- Daily snapshots: create the two snapshot tables above, then fill them with
+--   python stock_snapshots.py --backfill
+--
+-- Reorder points: create CategoryReorderPoints and the two reorder triggers above, then
+-- ALTER TABLE Medicines
+--     ADD COLUMN reorder_point INT NULL AFTER supplier,
+--     ADD COLUMN reorder_level INT NOT NULL DEFAULT 10 AFTER reorder_point,
+--     ADD INDEX idx_medicines_stock_margin ((quantity - reorder_level));
+--
+-- Bulk import lookups:
+-- ALTER TABLE Medicines ADD INDEX idx_medicines_name_supplier (name, supplier);
+--
+-- Lots: create MedicineLots above. Existing stock becomes a medicine's
+-- OPENING lot the first time it receives or dispenses a lot.
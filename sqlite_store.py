@@ -0,0 +1,710 @@
+# Embedded SQLite storage backend.
+# Same functions as mysql_store.py, on a local SQLite file instead of the
+# MySQL server. Used two ways (see storage.py):
+#   - on its own, as the whole database of an offline/branch terminal
+#   - as a read replica: pull_from_mysql() copies the rows changed on the
+#     server since the last pull, so search, expiry and low stock are answered
+#     from the local file without a network round trip
+#
+# The file runs in WAL mode, so a background pull can write while the Tk
+# thread reads. Queries are parameterised and sqlite3 keeps the compiled
+# statements of each connection in a cache, so the hot reads are prepared once.
+# Dates are stored as ISO text (which sorts like a date) and prices come back
+# formatted to two places, so rows look the same as the MySQL ones in the grid.
+# Search goes through an FTS5 word index (MedicineSearch) instead of scanning
+# the table with '%word%' LIKEs.
+
+import sqlite3
+from datetime import date
+
+import instrumentation
+import medicine_search
+from inventory_queries import LOW_STOCK, LOW_STOCK_THRESHOLD, MEDICINE_COLUMNS, SYNC_OVERLAP_SECONDS, select_medicines
+from medicine_lots import OPENING_LOT, LotError, allocate, check_quantity
+
+STATEMENT_CACHE = 256  # Compiled statements kept per connection
+BUSY_TIMEOUT_MS = 5000  # How long a writer waits for the other one (Tk thread vs. replica pull)
+PULL_CHUNK = 50000  # StockHistory rows copied per query during a replica pull
+HISTORY_OVERLAP = 10000  # StockHistory ids a pull re-reads below the last one it got (see pull_from_mysql)
+RECONCILE_EVERY = 120  # Pulls between full checks of the replica (10 minutes at the default sync interval)
+# Cheap checksum a replica table is compared with on the server by
+CHECKSUM = "SELECT COUNT(*), COALESCE(SUM(id), 0), COALESCE(SUM(quantity), 0) FROM {}"
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Medicines and StockHistory ids are AUTOINCREMENT, so the id of a deleted last
+# row is never handed out again: the sync and the "id > last id" cursors rely on it
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS Medicines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL COLLATE NOCASE,
+    category TEXT,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    mfg_date TEXT NOT NULL CHECK (date(mfg_date) IS NOT NULL),
+    exp_date TEXT NOT NULL CHECK (date(exp_date) IS NOT NULL),
+    supplier TEXT,
+    reorder_point INTEGER,
+    reorder_level INTEGER NOT NULL DEFAULT {LOW_STOCK_THRESHOLD},
+    updated_at TEXT NOT NULL DEFAULT ({NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_medicines_updated_at ON Medicines (updated_at);
+CREATE INDEX IF NOT EXISTS idx_medicines_exp_date ON Medicines (exp_date);
+CREATE INDEX IF NOT EXISTS idx_medicines_quantity ON Medicines (quantity);
+CREATE INDEX IF NOT EXISTS idx_medicines_name ON Medicines (name);
+
+CREATE TABLE IF NOT EXISTS CategoryReorderPoints (
+    category TEXT NOT NULL PRIMARY KEY,
+    reorder_point INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS StockHistory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    medicine_id INTEGER NOT NULL REFERENCES Medicines (id) ON DELETE CASCADE,
+    change_date TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stockhistory_medicine_date ON StockHistory (medicine_id, change_date);
+
+CREATE TABLE IF NOT EXISTS MedicineDeletions (
+    medicine_id INTEGER NOT NULL,
+    deleted_at TEXT NOT NULL DEFAULT ({NOW})
+);
+CREATE INDEX IF NOT EXISTS idx_deletions_deleted_at ON MedicineDeletions (deleted_at);
+CREATE TRIGGER IF NOT EXISTS trg_medicines_deleted AFTER DELETE ON Medicines
+BEGIN
+    INSERT INTO MedicineDeletions (medicine_id) VALUES (OLD.id);
+END;
+
+CREATE TABLE IF NOT EXISTS MedicineLots (
+    id INTEGER PRIMARY KEY,
+    medicine_id INTEGER NOT NULL REFERENCES Medicines (id) ON DELETE CASCADE,
+    lot_number TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    exp_date TEXT NOT NULL CHECK (date(exp_date) IS NOT NULL),
+    UNIQUE (medicine_id, lot_number)
+);
+CREATE INDEX IF NOT EXISTS idx_lots_medicine_exp ON MedicineLots (medicine_id, exp_date);
+
+-- Replica bookkeeping: where the last pull from MySQL got to
+CREATE TABLE IF NOT EXISTS ReplicaState (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Grid columns plus the expiry status, the first parameter is the horizon in days
+SELECT_MEDICINES = f"""SELECT {MEDICINE_COLUMNS.replace('price', "printf('%.2f', price)")},
+    CASE
+        WHEN exp_date < date('now', 'localtime') THEN 'expired'
+        WHEN exp_date <= date('now', 'localtime', '+' || ? || ' days') THEN 'expiring_soon'
+        ELSE 'ok'
+    END AS expiry_status, reorder_level, reorder_point
+FROM Medicines """
+
+# Word index for search(), the SQLite counterpart of the MySQL FULLTEXT index.
+# External content: the text stays in Medicines, the triggers keep the index in step.
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE MedicineSearch USING fts5(
+    name, category, supplier, content='Medicines', content_rowid='id', prefix='{medicine_search.MIN_TOKEN_SIZE}'
+);
+CREATE TRIGGER trg_search_insert AFTER INSERT ON Medicines
+BEGIN
+    INSERT INTO MedicineSearch (rowid, name, category, supplier) VALUES (NEW.id, NEW.name, NEW.category, NEW.supplier);
+END;
+CREATE TRIGGER trg_search_delete AFTER DELETE ON Medicines
+BEGIN
+    INSERT INTO MedicineSearch (MedicineSearch, rowid, name, category, supplier)
+    VALUES ('delete', OLD.id, OLD.name, OLD.category, OLD.supplier);
+END;
+CREATE TRIGGER trg_search_update AFTER UPDATE OF name, category, supplier ON Medicines
+BEGIN
+    INSERT INTO MedicineSearch (MedicineSearch, rowid, name, category, supplier)
+    VALUES ('delete', OLD.id, OLD.name, OLD.category, OLD.supplier);
+    INSERT INTO MedicineSearch (rowid, name, category, supplier) VALUES (NEW.id, NEW.name, NEW.category, NEW.supplier);
+END;
+INSERT INTO MedicineSearch (MedicineSearch) VALUES ('rebuild');
+"""
+
+HISTORY_SQL = "INSERT INTO StockHistory (medicine_id, change_date, quantity) VALUES (?, ?, ?)"
+
+
+def connect(path):
+    """Opens (and if needed creates) the local database."""
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, one fsync per checkpoint instead of per commit
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    upgrade(connection)
+    return connection
+
+
+def upgrade(connection):
+    """Adds what files created by an older version are missing."""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(Medicines)")}
+    if "reorder_level" not in columns:
+        connection.execute("ALTER TABLE Medicines ADD COLUMN reorder_point INTEGER")
+        connection.execute(f"ALTER TABLE Medicines ADD COLUMN reorder_level INTEGER NOT NULL "
+                           f"DEFAULT {LOW_STOCK_THRESHOLD}")
+    reused_ids = [table for table in ("Medicines", "StockHistory") if "AUTOINCREMENT" not in table_sql(connection, table)]
+    if reused_ids:
+        add_autoincrement(connection, reused_ids)
+    # Expression index, so the low-stock query is a range scan like on MySQL
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_medicines_stock_margin ON Medicines (quantity - reorder_level)")
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'MedicineSearch'").fetchone() is None:
+        # Created here rather than in SCHEMA, so a file from before it gets its rows indexed ('rebuild')
+        connection.executescript(SEARCH_SCHEMA)
+    connection.commit()
+
+
+def table_sql(connection, table):
+    return connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+
+
+def add_autoincrement(connection, tables):
+    """Rebuilds tables from before their ids were AUTOINCREMENT (SQLite cannot ALTER that in)."""
+    connection.commit()
+    # Dropping the old Medicines would otherwise cascade to its history and lots
+    connection.execute("PRAGMA foreign_keys=OFF")
+    try:
+        connection.execute("BEGIN")
+        # Its triggers go with Medicines, upgrade() creates it again and reindexes
+        connection.execute("DROP TABLE IF EXISTS MedicineSearch")
+        for table in tables:
+            sql = table_sql(connection, table)
+            sql = sql[sql.index("("):].replace("id INTEGER PRIMARY KEY,", "id INTEGER PRIMARY KEY AUTOINCREMENT,", 1)
+            connection.execute(f"CREATE TABLE {table}_new {sql}")
+            connection.execute(f"INSERT INTO {table}_new SELECT * FROM {table}")
+            connection.execute(f"DROP TABLE {table}")
+            connection.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        if "Medicines" in tables:
+            # The ids deleted before the upgrade are known too, none of them is handed out again
+            last_id, = connection.execute("SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM Medicines UNION ALL "
+                                          "SELECT MAX(medicine_id) FROM MedicineDeletions)").fetchone()
+            connection.execute("DELETE FROM sqlite_sequence WHERE name = 'Medicines'")
+            connection.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('Medicines', ?)", (last_id or 0,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)  # The indexes and the deletion trigger went with the old tables
+
+
+def reorder_level_sql(point, category):
+    """The reorder point that applies (the MySQL triggers do this there): own, else the category's, else the default.
+
+    category is a parameter or a qualified column (Medicines.category); a bare
+    category would be CategoryReorderPoints' own column inside the subquery.
+    """
+    return (f"COALESCE({point}, (SELECT CategoryReorderPoints.reorder_point FROM CategoryReorderPoints "
+            f"WHERE CategoryReorderPoints.category = IFNULL({category}, '')), {LOW_STOCK_THRESHOLD})")
+
+
+def day_text(value):
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+# --- Main View ---
+def read_page_index(cursor, page_size):
+    cursor.execute("BEGIN")  # One snapshot for all of it, like the MySQL worker's transaction
+    try:
+        cursor.execute(f"SELECT {NOW}")
+        mark = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS row_no FROM Medicines
+            )
+            WHERE (row_no - 1) % ? = 0
+            ORDER BY id
+        """, (page_size,))
+        page_starts = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(*), MAX(id) FROM Medicines")
+        total, max_id = cursor.fetchone()
+        cursor.execute("SELECT medicine_id FROM MedicineDeletions "
+                       f"WHERE deleted_at >= strftime('%Y-%m-%d %H:%M:%f', ?, '-{SYNC_OVERLAP_SECONDS} seconds')",
+                       (mark,))
+        gone_ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.connection.rollback()  # Nothing was written; also ends it if the read was interrupted
+    return mark, page_starts, total, max_id or 0, gone_ids
+
+
+def read_page(cursor, first_id, limit, horizon):
+    cursor.execute(SELECT_MEDICINES + "WHERE id >= ? ORDER BY id LIMIT ?", (horizon, first_id, limit))
+    return cursor.fetchall()
+
+
+def read_medicine(cursor, medicine_id, horizon):
+    cursor.execute(SELECT_MEDICINES + "WHERE id = ?", (horizon, medicine_id))
+    return cursor.fetchone()
+
+
+def read_changes(cursor, since, horizon):
+    cursor.execute(f"SELECT {NOW}")
+    new_mark = cursor.fetchone()[0]
+    # Overlapping the last read, like on MySQL
+    overlap = f"strftime('%Y-%m-%d %H:%M:%f', ?, '-{SYNC_OVERLAP_SECONDS} seconds')"
+    cursor.execute(SELECT_MEDICINES + f"WHERE updated_at >= {overlap} ORDER BY id", (horizon, str(since)))
+    changed = cursor.fetchall()
+    cursor.execute(f"SELECT medicine_id FROM MedicineDeletions WHERE deleted_at >= {overlap}", (str(since),))
+    return new_mark, changed, [row[0] for row in cursor.fetchall()]
+
+
+def search(cursor, query, horizon):
+    """Same matching as the MySQL FULLTEXT search: every word must start a word in name, category or supplier."""
+    tokens = medicine_search.search_tokens(query)
+    if not any(len(token) >= medicine_search.MIN_TOKEN_SIZE for token in tokens):
+        prefix = " ".join(tokens) if tokens else query.strip()
+        # name is NOCASE, so this prefix LIKE is answered from idx_medicines_name
+        cursor.execute(SELECT_MEDICINES + "WHERE name LIKE ? ESCAPE '\\' ORDER BY name LIMIT ?",
+                       (horizon, medicine_search.like_escape(prefix) + "%", medicine_search.SEARCH_LIMIT))
+        return cursor.fetchall()
+
+    # Long words are prefix queries on the FTS5 index, like the FULLTEXT search;
+    # short ones are checked only on the rows it found
+    match = " AND ".join(f'"{token}"*' for token in tokens if len(token) >= medicine_search.MIN_TOKEN_SIZE)
+    short = [token for token in tokens if len(token) < medicine_search.MIN_TOKEN_SIZE]
+    where = "".join(" AND (name || ' ' || IFNULL(category, '') || ' ' || IFNULL(supplier, '')) LIKE ? ESCAPE '\\'"
+                    for _ in short)
+    # bm25 is lower for better matches; hits in the name weigh more, as in the MySQL ranking
+    cursor.execute(SELECT_MEDICINES + "JOIN (SELECT rowid, bm25(MedicineSearch, 3.0, 1.0, 1.0) AS score "
+                                      "FROM MedicineSearch WHERE MedicineSearch MATCH ?) AS hits ON hits.rowid = id "
+                                      f"WHERE 1{where} ORDER BY hits.score, name LIMIT ?",
+                   [horizon, match] + [f"%{medicine_search.like_escape(token)}%" for token in short]
+                   + [medicine_search.SEARCH_LIMIT])
+    return cursor.fetchall()
+
+
+def read_at_risk(cursor, horizon):
+    cursor.execute(SELECT_MEDICINES + "WHERE exp_date <= date('now', 'localtime', '+' || ? || ' days') "
+                                      "ORDER BY exp_date", (horizon, horizon))
+    return cursor.fetchall()
+
+
+def read_low_stock(cursor, horizon):
+    cursor.execute(SELECT_MEDICINES + f"WHERE {LOW_STOCK} ORDER BY quantity - reorder_level", (horizon,))
+    return cursor.fetchall()
+
+
+def read_low_stock_ids(cursor):
+    cursor.execute(f"SELECT id FROM Medicines WHERE {LOW_STOCK}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def read_report_batches(cursor, horizon, batch_size):
+    cursor.execute(SELECT_MEDICINES + f"WHERE exp_date <= date('now', 'localtime', '+' || ? || ' days') "
+                                      f"OR {LOW_STOCK}", (horizon, horizon))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def read_medicines(cursor, medicine_ids, horizon):
+    if not medicine_ids:
+        return []
+    cursor.execute(SELECT_MEDICINES + f"WHERE id IN ({', '.join('?' * len(medicine_ids))})",
+                   [horizon] + list(medicine_ids))
+    rows = {row[0]: row for row in cursor.fetchall()}
+    return [rows[medicine_id] for medicine_id in medicine_ids if medicine_id in rows]
+
+
+# --- Lots ---
+def read_lots(cursor, medicine_id):
+    cursor.execute("SELECT id, lot_number, quantity, exp_date FROM MedicineLots WHERE medicine_id = ? "
+                   "ORDER BY exp_date, id", (medicine_id,))
+    return cursor.fetchall()
+
+
+# --- Forecast ---
+def read_history_since(cursor, after_id, chunk):
+    while True:
+        cursor.execute("SELECT id, medicine_id, change_date, quantity FROM StockHistory "
+                       "WHERE id > ? ORDER BY id LIMIT ?", (after_id, chunk))
+        rows = cursor.fetchall()
+        if rows:
+            yield rows
+        if len(rows) < chunk:
+            return
+        after_id = rows[-1][0]
+
+
+def read_stock_levels(cursor):
+    cursor.execute("SELECT id, quantity, exp_date FROM Medicines")
+    return cursor.fetchall()
+
+
+# --- Graphs ---
+def read_names(cursor):
+    cursor.execute("SELECT id, name FROM Medicines")
+    return cursor.fetchall()
+
+
+def read_stock_history(cursor, medicine_ids, start=None, end=None):
+    """Same result as stock_history.read_stock_history, taken straight from StockHistory (last change of each day)."""
+    import stock_history  # NumPy, only the graphs need it
+    ids = sorted(set(int(medicine_id) for medicine_id in medicine_ids))
+    date_filter = ""
+    date_params = []
+    if start is not None:
+        date_filter += " AND change_date >= ?"
+        date_params.append(day_text(start))
+    if end is not None:
+        date_filter += " AND change_date <= ?"
+        date_params.append(day_text(end))
+
+    rows = []
+    for i in range(0, len(ids), stock_history.HISTORY_CHUNK):
+        chunk = ids[i:i + stock_history.HISTORY_CHUNK]
+        cursor.execute(f"""
+            SELECT medicine_id, change_date, quantity FROM (
+                SELECT medicine_id, change_date, quantity,
+                       ROW_NUMBER() OVER (PARTITION BY medicine_id, change_date ORDER BY id DESC) AS row_no
+                FROM StockHistory
+                WHERE medicine_id IN ({", ".join("?" * len(chunk))}){date_filter}
+            )
+            WHERE row_no = 1
+            ORDER BY medicine_id, change_date
+        """, chunk + date_params)
+        rows.extend(cursor.fetchall())
+    return stock_history.history_arrays(rows)
+
+
+def read_last_history_ids(cursor, medicine_ids):
+    from stock_history import HISTORY_CHUNK
+    ids = sorted(set(medicine_ids))
+    last_ids = {}
+    for i in range(0, len(ids), HISTORY_CHUNK):
+        chunk = ids[i:i + HISTORY_CHUNK]
+        cursor.execute(f"SELECT medicine_id, MAX(id) FROM StockHistory WHERE medicine_id IN "
+                       f"({', '.join('?' * len(chunk))}) GROUP BY medicine_id", chunk)
+        last_ids.update(cursor.fetchall())
+    return last_ids
+
+
+def read_category_trend(cursor, start=None, end=None):
+    """Same result as stock_snapshots.read_category_trend, worked out from StockHistory on the fly."""
+    cursor.execute("""
+        SELECT category, change_date, SUM(SUM(delta)) OVER (PARTITION BY category ORDER BY change_date)
+        FROM (
+            SELECT IFNULL(m.category, '') AS category, h.change_date,
+                   h.quantity - IFNULL(LAG(h.quantity) OVER (PARTITION BY h.medicine_id ORDER BY h.change_date), 0)
+                       AS delta
+            FROM (
+                SELECT medicine_id, change_date, quantity,
+                       ROW_NUMBER() OVER (PARTITION BY medicine_id, change_date ORDER BY id DESC) AS row_no
+                FROM StockHistory
+            ) AS h
+            JOIN Medicines m ON m.id = h.medicine_id
+            WHERE h.row_no = 1
+        )
+        GROUP BY category, change_date
+        ORDER BY category, change_date
+    """)
+    start = day_text(start) if start is not None else None
+    end = day_text(end) if end is not None else None
+    trend = {}
+    for category, day, total in cursor.fetchall():
+        if end is not None and day > end:
+            continue
+        dates, totals = trend.setdefault(category, ([], []))
+        if start is not None and day < start:
+            # Level going into the range, so lines do not start at zero
+            dates[:], totals[:] = [date.fromisoformat(start)], [total]
+            continue
+        if dates and dates[-1] == date.fromisoformat(day):
+            totals[-1] = total
+        else:
+            dates.append(date.fromisoformat(day))
+            totals.append(total)
+    return trend
+
+
+def read_total_stock_on(cursor, day):
+    """Total stock at the end of day, from every medicine's last history row by then (medicines still on file)."""
+    cursor.execute("""
+        SELECT IFNULL(SUM(quantity), 0) FROM (
+            SELECT quantity, ROW_NUMBER() OVER (PARTITION BY medicine_id ORDER BY change_date DESC, id DESC) AS row_no
+            FROM StockHistory WHERE change_date <= ?
+        )
+        WHERE row_no = 1
+    """, (day_text(day),))
+    return int(cursor.fetchone()[0])
+
+
+# --- Writes ---
+def add_medicine(cursor, name, category, price, quantity, mfg_date, exp_date, supplier, day=None):
+    cursor.execute(f"INSERT INTO Medicines (name, category, price, quantity, mfg_date, exp_date, supplier, "
+                   f"reorder_level) VALUES (?, ?, ?, ?, ?, ?, ?, {reorder_level_sql('NULL', '?')})",
+                   (name, category, price, quantity, day_text(mfg_date), day_text(exp_date), supplier, category))
+    medicine_id = cursor.lastrowid
+    cursor.execute(HISTORY_SQL, (medicine_id, day_text(day or date.today()), quantity))
+    return medicine_id
+
+
+def update_medicine(cursor, medicine_id, name, category, price, quantity, mfg_date, exp_date, supplier,
+                    original_quantity, original_category, day=None):
+    row = lock_row(cursor, medicine_id)
+    if row is None:
+        raise LotError(f"There is no medicine with id {medicine_id}.")
+    stored_quantity = row[0]
+    if quantity == original_quantity:
+        quantity = stored_quantity  # Not edited: keep the stock as it is now, not as the grid showed it
+    elif has_lots(cursor, medicine_id):
+        raise LotError("This medicine's stock is kept in lots; receive or dispense a lot to change it.")
+    # reorder_point on the right-hand side is still the stored one
+    cursor.execute(f"UPDATE Medicines SET name=?, category=?, price=?, quantity=?, mfg_date=?, "
+                   f"exp_date=COALESCE((SELECT MIN(exp_date) FROM MedicineLots WHERE medicine_id = ?), ?), "
+                   f"supplier=?, reorder_level={reorder_level_sql('reorder_point', '?')}, "
+                   f"updated_at={NOW} WHERE id=?",
+                   (name, category, price, quantity, day_text(mfg_date), medicine_id, day_text(exp_date), supplier,
+                    category, medicine_id))
+    if quantity != stored_quantity:
+        cursor.execute(HISTORY_SQL, (medicine_id, day_text(day or date.today()), quantity))
+    return medicine_id
+
+
+def delete_medicine(cursor, medicine_id, category, quantity, day=None):
+    cursor.execute("DELETE FROM Medicines WHERE id = ?", (medicine_id,))
+    return medicine_id
+
+
+def set_reorder_point(cursor, medicine_id, reorder_point):
+    cursor.execute(f"UPDATE Medicines SET reorder_point = ?, "
+                   f"reorder_level = {reorder_level_sql('?', 'Medicines.category')}, "
+                   f"updated_at = {NOW} WHERE id = ?", (reorder_point, reorder_point, medicine_id))
+    return medicine_id
+
+
+def set_category_reorder_point(cursor, category, reorder_point):
+    category = category or ''
+    if reorder_point is None:
+        cursor.execute("DELETE FROM CategoryReorderPoints WHERE category = ?", (category,))
+    else:
+        cursor.execute("INSERT OR REPLACE INTO CategoryReorderPoints (category, reorder_point) VALUES (?, ?)",
+                       (category, reorder_point))
+    cursor.execute(f"UPDATE Medicines SET reorder_level = {reorder_level_sql('NULL', '?')}, "
+                   f"updated_at = {NOW} WHERE IFNULL(category, '') = ? AND reorder_point IS NULL",
+                   (category, category))
+    return cursor.rowcount
+
+
+def has_lots(cursor, medicine_id):
+    cursor.execute("SELECT 1 FROM MedicineLots WHERE medicine_id = ? LIMIT 1", (medicine_id,))
+    return cursor.fetchone() is not None
+
+
+def lock_row(cursor, medicine_id):
+    """Same as in medicine_writes.py; writing the row first takes the database's write lock."""
+    cursor.execute(f"UPDATE Medicines SET updated_at = {NOW} WHERE id = ?", (medicine_id,))
+    if cursor.rowcount == 0:
+        return None
+    cursor.execute("SELECT quantity, category, exp_date FROM Medicines WHERE id = ?", (medicine_id,))
+    return cursor.fetchone()
+
+
+def lock_medicine(cursor, medicine_id):
+    row = lock_row(cursor, medicine_id)
+    if row is None:
+        raise LotError(f"There is no medicine with id {medicine_id}.")
+    quantity, category, exp_date = row
+    if quantity > 0 and not has_lots(cursor, medicine_id):
+        cursor.execute("INSERT INTO MedicineLots (medicine_id, lot_number, quantity, exp_date) VALUES (?, ?, ?, ?)",
+                       (medicine_id, OPENING_LOT, quantity, exp_date))
+    return quantity, category
+
+
+def move_stock(cursor, medicine_id, old_quantity, delta, day):
+    quantity = old_quantity + delta
+    cursor.execute("UPDATE Medicines SET quantity = ?, "
+                   "exp_date = COALESCE((SELECT MIN(exp_date) FROM MedicineLots WHERE medicine_id = ?), exp_date) "
+                   "WHERE id = ?", (quantity, medicine_id, medicine_id))
+    cursor.execute(HISTORY_SQL, (medicine_id, day_text(day or date.today()), quantity))
+
+
+def receive_lot(cursor, medicine_id, lot_number, quantity, exp_date, day=None):
+    check_quantity(quantity)
+    old_quantity, _ = lock_medicine(cursor, medicine_id)
+    cursor.execute("SELECT id, exp_date FROM MedicineLots WHERE medicine_id = ? AND lot_number = ?",
+                   (medicine_id, lot_number))
+    lot = cursor.fetchone()
+    if lot is None:
+        cursor.execute("INSERT INTO MedicineLots (medicine_id, lot_number, quantity, exp_date) VALUES (?, ?, ?, ?)",
+                       (medicine_id, lot_number, quantity, day_text(exp_date)))
+        lot_id = cursor.lastrowid
+    elif lot[1] != day_text(exp_date):
+        raise LotError(f"Lot {lot_number} is already in stock with expiry {lot[1]}.")
+    else:
+        lot_id = lot[0]
+        cursor.execute("UPDATE MedicineLots SET quantity = quantity + ? WHERE id = ?", (quantity, lot_id))
+    move_stock(cursor, medicine_id, old_quantity, quantity, day)
+    return lot_id
+
+
+def dispense(cursor, medicine_id, quantity, day=None):
+    check_quantity(quantity)
+    old_quantity, _ = lock_medicine(cursor, medicine_id)
+    cursor.execute("SELECT id, lot_number, quantity, exp_date FROM MedicineLots "
+                   "WHERE medicine_id = ? AND exp_date >= date('now', 'localtime') ORDER BY exp_date, id",
+                   (medicine_id,))
+    plan = allocate(cursor.fetchall(), quantity)
+    cursor.executemany("UPDATE MedicineLots SET quantity = quantity - ? WHERE id = ?",
+                       [(taken, lot_id) for lot_id, _, _, taken in plan])
+    cursor.execute("DELETE FROM MedicineLots WHERE medicine_id = ? AND quantity = 0", (medicine_id,))
+    move_stock(cursor, medicine_id, old_quantity, -quantity, day)
+    return [(lot_number, exp_date, taken) for _, lot_number, exp_date, taken in plan]
+
+
+def run_transaction(connection, *operations):
+    """Runs operation(cursor) for each operation in one transaction with a single commit."""
+    cursor = instrumentation.timed_cursor(connection.cursor())
+    try:
+        results = [operation(cursor) for operation in operations]
+        connection.commit()
+        return results
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def run_group(connection, operations):
+    """Same as in medicine_writes.py."""
+    cursor = instrumentation.timed_cursor(connection.cursor())
+    outcomes = []
+    try:
+        if not connection.in_transaction:
+            # Otherwise the first SAVEPOINT would start the transaction and its RELEASE commit it
+            cursor.execute("BEGIN")
+        for operation in operations:
+            cursor.execute("SAVEPOINT grouped")
+            try:
+                outcomes.append((operation(cursor), None))
+            except Exception as err:
+                cursor.execute("ROLLBACK TO SAVEPOINT grouped")
+                outcomes.append((None, err))
+            cursor.execute("RELEASE SAVEPOINT grouped")
+        connection.commit()
+        return outcomes
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# --- Read Replica ---
+def store_rows(cursor, rows):
+    """Writes medicine rows (grid rows from either backend) into the local copy."""
+    # An upsert, not INSERT OR REPLACE: REPLACE deletes the old row first, and the
+    # delete cascades to its StockHistory and MedicineLots
+    cursor.executemany("INSERT INTO Medicines (id, name, category, price, quantity, mfg_date, exp_date, "
+                       "supplier, reorder_level, reorder_point) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                       "ON CONFLICT(id) DO UPDATE SET name=excluded.name, category=excluded.category, "
+                       "price=excluded.price, quantity=excluded.quantity, mfg_date=excluded.mfg_date, "
+                       "exp_date=excluded.exp_date, supplier=excluded.supplier, "
+                       f"reorder_level=excluded.reorder_level, reorder_point=excluded.reorder_point, updated_at={NOW}",
+                       [(row[0], row[1], row[2], float(row[3]), row[4], day_text(row[5]), day_text(row[6]), row[7],
+                         row[9], row[10]) for row in rows])
+
+
+def remove_rows(cursor, medicine_ids):
+    cursor.executemany("DELETE FROM Medicines WHERE id = ?", [(medicine_id,) for medicine_id in medicine_ids])
+
+
+def replica_state(cursor, name, default=None):
+    cursor.execute("SELECT value FROM ReplicaState WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+
+def pull_from_mysql(mysql_cursor, connection, horizon):
+    """Copies what changed on the MySQL server since the last pull into the local file.
+
+    Returns the same (mark, changed rows, deleted ids) as read_changes, so the
+    grid can be patched with it. The first pull copies everything.
+
+    Both marks are re-read with an overlap: a server transaction still open at
+    the last pull commits rows stamped before medicines_mark (read_changes
+    covers those) and StockHistory ids below history_id (HISTORY_OVERLAP).
+    Rows read twice are simply written again. Every RECONCILE_EVERY pulls the
+    whole copy is checked against the server as well, see reconcile_replica().
+    """
+    import mysql_store  # Only replicas talk to MySQL from here
+
+    cursor = connection.cursor()
+    try:
+        since = replica_state(cursor, "medicines_mark", "1970-01-01 00:00:00")
+        last_history_id = int(replica_state(cursor, "history_id", 0))
+        pulls = int(replica_state(cursor, "pulls", 0)) + 1
+        # History first: every row read here belongs to a medicine the change query below will know about
+        history, after_id = [], max(0, last_history_id - HISTORY_OVERLAP)
+        while True:
+            mysql_cursor.execute("SELECT id, medicine_id, change_date, quantity FROM StockHistory "
+                                 "WHERE id > %s ORDER BY id LIMIT %s", (after_id, PULL_CHUNK))
+            rows = mysql_cursor.fetchall()
+            history.extend(rows)
+            if len(rows) < PULL_CHUNK:
+                break
+            after_id = rows[-1][0]
+        mark, changed, deleted = mysql_store.read_changes(mysql_cursor, since, horizon)
+
+        store_rows(cursor, changed)
+        remove_rows(cursor, deleted)
+        # Skips history of medicines deleted on the server in the meantime
+        cursor.executemany("INSERT OR REPLACE INTO StockHistory (id, medicine_id, change_date, quantity) "
+                           "SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM Medicines WHERE id = ?)",
+                           [(row[0], row[1], day_text(row[2]), row[3], row[1]) for row in history])
+        if history:
+            last_history_id = max(last_history_id, history[-1][0])
+        if pulls % RECONCILE_EVERY == 0:
+            repaired, removed, history_drifted = reconcile_replica(mysql_cursor, cursor, horizon)
+            changed, deleted = changed + repaired, deleted + removed
+            if history_drifted:
+                last_history_id = 0  # The next pull copies all of it again
+        cursor.executemany("INSERT OR REPLACE INTO ReplicaState (name, value) VALUES (?, ?)",
+                           [("medicines_mark", str(mark)), ("history_id", str(last_history_id)),
+                            ("pulls", str(pulls))])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return mark, changed, deleted
+
+
+def reconcile_replica(mysql_cursor, cursor, horizon):
+    """Checks the whole local copy against the server, for whatever the pulls still missed.
+
+    Medicines that differ are repaired here and returned as (changed rows,
+    deleted ids) for the grid. The last value is True if StockHistory differs,
+    the caller then pulls it all again. The server side is read in the pull's
+    transaction, so the checksums and rows all come from one snapshot.
+    """
+    drifted = []
+    for table in ("Medicines", "StockHistory"):
+        mysql_cursor.execute(CHECKSUM.format(table))
+        cursor.execute(CHECKSUM.format(table))
+        if tuple(mysql_cursor.fetchone()) != tuple(cursor.fetchone()):
+            drifted.append(table)
+    changed, deleted = [], []
+    if "Medicines" in drifted:
+        mysql_cursor.execute(select_medicines("ORDER BY id"), (horizon,))
+        server_rows = mysql_cursor.fetchall()
+        cursor.execute(SELECT_MEDICINES + "ORDER BY id", (horizon,))
+        # As text, prices and dates come back as Decimal and date from MySQL
+        local_rows = {row[0]: tuple(map(str, row)) for row in cursor.fetchall()}
+        changed = [row for row in server_rows if local_rows.get(row[0]) != tuple(map(str, row))]
+        server_ids = {row[0] for row in server_rows}
+        # Rows above the server's last id were written here after its snapshot, the next pull brings them
+        newest_id = max(server_ids, default=0)
+        deleted = [medicine_id for medicine_id in local_rows
+                   if medicine_id not in server_ids and medicine_id <= newest_id]
+        store_rows(cursor, changed)
+        remove_rows(cursor, deleted)
+    return changed, deleted, "StockHistory" in drifted
@@ -0,0 +1,166 @@
+# Stock-out forecasting.
+# Works out how fast every medicine is being used from its StockHistory, and
+# from that when it will run out and whether some of it will expire before it
+# is sold. Everything is done on NumPy arrays over all medicines at once; no
+# Python loop over history rows or medicines.
+#
+# Consumption rate: every drop in quantity between two history rows counts as
+# units used (rises are deliveries and are ignored). Recent use counts more,
+# with weights decaying exponentially over DECAY_DAYS:
+#
+#   rate = sum(used * exp(-age / DECAY_DAYS)) / integral of exp(-age / DECAY_DAYS) over the days observed
+#
+# The weighted sum decays by the same factor for every medicine as time moves
+# on, so it is cached at a reference day and only medicines with new history
+# rows have anything added to it. update() reads history rows past the last id
+# it has seen, so after the first run it only touches what changed.
+#
+# No Tk in here; update() is meant to run on a db_worker thread.
+
+import numpy as np
+
+DECAY_DAYS = 30.0  # Weight of past consumption halves about every three weeks
+MIN_SPAN_DAYS = 7  # Rates from less history than this are treated as this long, so one sale is not a trend
+READ_CHUNK = 50000  # History rows converted to arrays at a time
+
+# --- Forecast State ---
+# Replaced as a whole by update(), so the Tk thread always sees a consistent set
+state = {
+    "ids": np.empty(0, dtype=np.int64),  # Sorted medicine ids
+    "ew_sum": np.empty(0),  # Decayed consumption at ref_day
+    "first_day": np.empty(0, dtype=np.int64),  # First history day (days since 1970-01-01)
+    "last_day": np.empty(0, dtype=np.int64),  # Day and quantity of the last history row seen
+    "last_quantity": np.empty(0, dtype=np.int64),
+    "ref_day": 0,
+    "last_history_id": 0,
+}
+
+
+def today_number():
+    return int(np.datetime64('today', 'D').astype(np.int64))
+
+
+def read_history(store, cursor, after_id):
+    """StockHistory rows with id > after_id as (history ids, medicine ids, day numbers, quantities) arrays."""
+    chunks = []
+    for rows in store.read_history_since(cursor, after_id, READ_CHUNK):
+        history_ids, med_ids, dates, quantities = zip(*rows)
+        chunks.append((np.array(history_ids, dtype=np.int64), np.array(med_ids, dtype=np.int64),
+                       np.array(dates, dtype='datetime64[D]').astype(np.int64),
+                       np.array(quantities, dtype=np.int64)))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+
+def consumption(med_ids, days, quantities, ref_day):
+    """Per-medicine decayed consumption of rows sorted by medicine (then time).
+
+    Returns (unique ids, weighted sums at ref_day, first day, last day, last quantity).
+    """
+    cuts = np.flatnonzero(np.diff(med_ids)) + 1
+    firsts = np.concatenate(([0], cuts))
+    lasts = np.append(cuts - 1, len(med_ids) - 1)
+    group = np.repeat(np.arange(len(firsts)), np.diff(np.append(firsts, len(med_ids))))
+
+    used = np.maximum(-np.diff(quantities), 0).astype(float)
+    used[cuts - 1] = 0.0  # A difference across two medicines is not consumption
+    weights = np.exp(-(ref_day - days[1:]) / DECAY_DAYS)
+    sums = np.bincount(group[1:], weights=used * weights, minlength=len(firsts))
+    return med_ids[firsts], sums, days[firsts], days[lasts], quantities[lasts]
+
+
+def update(store, cursor):
+    """Folds the history rows added since the last update into the forecast state."""
+    global state
+    old = state
+    ref_day = today_number()
+    history_ids, med_ids, days, quantities = read_history(store, cursor, old["last_history_id"])
+    # Everything seen so far just ages
+    ew_sum = old["ew_sum"] * np.exp(-(ref_day - old["ref_day"]) / DECAY_DAYS)
+    if len(history_ids) == 0:
+        state = dict(old, ew_sum=ew_sum, ref_day=ref_day)
+        return 0
+
+    # Each changed medicine starts from its last known row, so the first new change has something to compare with
+    known = np.isin(old["ids"], med_ids)
+    med_ids = np.concatenate((old["ids"][known], med_ids))
+    days = np.concatenate((old["last_day"][known], days))
+    quantities = np.concatenate((old["last_quantity"][known], quantities))
+    order_ids = np.concatenate((np.full(known.sum(), -1), history_ids))
+    order = np.lexsort((order_ids, med_ids))
+    ids, sums, first_day, last_day, last_quantity = consumption(med_ids[order], days[order], quantities[order],
+                                                                ref_day)
+
+    # Merge into the sorted state arrays
+    all_ids = np.union1d(old["ids"], ids)
+    old_at = np.searchsorted(all_ids, old["ids"])
+    new_at = np.searchsorted(all_ids, ids)
+    merged = {name: np.zeros(len(all_ids), dtype=old[name].dtype)
+              for name in ("ew_sum", "first_day", "last_day", "last_quantity")}
+    merged["ew_sum"][old_at] = ew_sum
+    for name in ("first_day", "last_day", "last_quantity"):
+        merged[name][old_at] = old[name]
+    merged["ew_sum"][new_at] += sums
+    merged["first_day"][new_at] = np.where(np.isin(ids, old["ids"]), merged["first_day"][new_at], first_day)
+    merged["last_day"][new_at] = last_day
+    merged["last_quantity"][new_at] = last_quantity
+    state = dict(merged, ids=all_ids, ref_day=ref_day, last_history_id=int(history_ids.max()))
+    return len(history_ids)
+
+
+def rates(med_ids):
+    """Units used per day for med_ids (0 where there is no history)."""
+    current = state
+    med_ids = np.asarray(med_ids, dtype=np.int64)
+    if len(current["ids"]) == 0:
+        return np.zeros(len(med_ids))
+    at = np.minimum(np.searchsorted(current["ids"], med_ids), len(current["ids"]) - 1)
+    found = current["ids"][at] == med_ids
+    span = np.maximum(current["ref_day"] - current["first_day"][at], MIN_SPAN_DAYS)
+    # Integral of the weights over the days observed
+    observed = DECAY_DAYS * (1 - np.exp(-span / DECAY_DAYS))
+    return np.where(found, current["ew_sum"][at] / observed, 0.0)
+
+
+def forecast(med_ids, quantities, exp_days):
+    """Days until stock-out and units left unsold at expiry for each medicine (arrays in, arrays out).
+
+    exp_days are expiry dates as day numbers. Medicines that are not being
+    used get an infinite stock-out and all their stock counts as unsold.
+    """
+    rate = rates(med_ids)
+    quantities = np.asarray(quantities, dtype=float)
+    with np.errstate(divide='ignore'):
+        days_left = np.where(rate > 0, quantities / rate, np.inf)
+    days_to_expiry = np.maximum(np.asarray(exp_days, dtype=np.int64) - today_number(), 0)
+    unsold = np.maximum(quantities - rate * days_to_expiry, 0)
+    return days_left, unsold
+
+
+def describe(row):
+    """Text for the forecast column of a grid row."""
+    exp_day = np.datetime64(str(row[6]), 'D').astype(np.int64)
+    days_left, unsold = forecast([row[0]], [row[4]], [exp_day])
+    if row[4] == 0:
+        text = "out of stock"
+    elif np.isinf(days_left[0]):
+        text = "no recent use"
+    else:
+        text = f"{days_left[0]:.0f} days"
+    if unsold[0] >= 1 and row[4] > 0 and not np.isinf(days_left[0]):
+        text += f" ({unsold[0]:.0f} expire unsold)"
+    return text
+
+
+def stockout_order(med_ids, quantities, exp_dates, limit):
+    """The limit medicines closest to running out, then the ones that will expire with stock left."""
+    med_ids = np.asarray(med_ids, dtype=np.int64)
+    exp_days = np.array(exp_dates, dtype='datetime64[D]').astype(np.int64)
+    days_left, unsold = forecast(med_ids, quantities, exp_days)
+    # Running out soonest first; stock that will outlive its expiry ranks as urgent as running out that day
+    urgency = np.minimum(days_left, np.where(unsold >= 1, exp_days - today_number(), np.inf))
+    order = np.argsort(urgency, kind='stable')[:limit]
+    order = order[np.isfinite(urgency[order])]
+    return med_ids[order].tolist()
@@ -0,0 +1,155 @@
+# Stock history loading for the timeline graph.
+# The history of every selected medicine is fetched with a handful of batched
+# IN (...) queries instead of one query per medicine, and split into one NumPy
+# array pair per medicine in a single vectorised pass. No Tk in here, so it can
+# run on a db_worker thread.
+#
+# Reads come from the StockDailySnapshot rollup (see stock_snapshots.py),
+# which holds one row per medicine and day instead of one per change.
+
+import numpy as np
+
+from inventory_queries import RESOLUTIONS  # noqa: F401  (re-exported for main.py)
+
+HISTORY_CHUNK = 500  # Medicine ids per IN (...) list, keeps each statement well under max_allowed_packet
+
+
+def read_stock_history(cursor, medicine_ids, start=None, end=None):
+    """Fetches the history of all medicine_ids, optionally limited to [start, end].
+
+    Returns three aligned arrays (medicine ids, dates as datetime64[D], end of
+    day quantities) sorted by medicine and date. The date range is applied in
+    SQL, so history outside the plotted window is never transferred.
+    """
+    ids = sorted(set(int(medicine_id) for medicine_id in medicine_ids))
+    date_filter = ""
+    date_params = []
+    if start is not None:
+        date_filter += " AND snapshot_date >= %s"
+        date_params.append(start)
+    if end is not None:
+        date_filter += " AND snapshot_date <= %s"
+        date_params.append(end)
+
+    rows = []
+    for i in range(0, len(ids), HISTORY_CHUNK):
+        chunk = ids[i:i + HISTORY_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        # Primary key order is (medicine_id, snapshot_date), already the plotting order
+        sql = (f"SELECT medicine_id, snapshot_date, quantity FROM StockDailySnapshot "
+               f"WHERE medicine_id IN ({placeholders}){date_filter} "
+               f"ORDER BY medicine_id, snapshot_date")
+        cursor.execute(sql, chunk + date_params)
+        rows.extend(cursor.fetchall())
+    return history_arrays(rows)
+
+
+def history_arrays(rows):
+    """(medicine_id, date, quantity) rows to the three aligned arrays read_stock_history returns."""
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=np.int64)
+    med_ids, dates, quantities = zip(*rows)
+    return (np.array(med_ids, dtype=np.int64),
+            np.array(dates, dtype='datetime64[D]'),
+            np.array(quantities, dtype=np.int64))
+
+
+def group_series(med_ids, dates, quantities):
+    """Splits the sorted arrays into {medicine_id: (dates, quantities)} without a Python loop over rows."""
+    if len(med_ids) == 0:
+        return {}
+    cuts = np.flatnonzero(np.diff(med_ids)) + 1  # Where one medicine's rows end and the next begin
+    firsts = np.concatenate(([0], cuts))
+    return dict(zip(med_ids[firsts].tolist(), zip(np.split(dates, cuts), np.split(quantities, cuts))))
+
+
+# --- Downsampling ---
+# Years of history can mean tens of thousands of points per line, far more
+# than the plot has pixels. Each series is reduced to at most about one point
+# per horizontal pixel before it reaches matplotlib, so drawing time stays
+# roughly the same however long the history is. The resolutions are listed in
+# inventory_queries.RESOLUTIONS.
+
+
+def bucket_starts(dates, unit):
+    """Start date of the daily/weekly (Monday)/monthly bucket each date falls into."""
+    if unit == "daily":
+        return dates
+    if unit == "weekly":
+        days = dates.astype(np.int64)
+        # Day 0 (1970-01-01) was a Thursday, shift by 3 so weeks start on Monday
+        return ((days + 3) // 7 * 7 - 3).astype('datetime64[D]')
+    return dates.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def last_per_bucket(dates, quantities, unit):
+    """Stock level at the end of every day/week/month (the last recorded quantity)."""
+    starts = bucket_starts(dates, unit)
+    last = np.append(np.flatnonzero(starts[1:] != starts[:-1]), len(starts) - 1)
+    return starts[last], quantities[last]
+
+
+def min_max_envelope(dates, quantities, buckets):
+    """Keeps the lowest and highest point of each of `buckets` equal time slices."""
+    days = dates.astype(np.int64)
+    span = max(int(days[-1] - days[0]), 1)
+    slot = np.minimum((days - days[0]) * buckets // (span + 1), buckets - 1)
+    # Sorting by (slot, quantity) puts each slot's minimum first and maximum last
+    order = np.lexsort((quantities, slot))
+    sorted_slots = slot[order]
+    edges = np.flatnonzero(sorted_slots[1:] != sorted_slots[:-1])
+    firsts = order[np.concatenate(([0], edges + 1))]
+    lasts = order[np.append(edges, len(order) - 1)]
+    keep = np.unique(np.concatenate((firsts, lasts)))  # Back in time order
+    return dates[keep], quantities[keep]
+
+
+def lttb(dates, quantities, threshold):
+    """Largest-Triangle-Three-Buckets: keeps the points that best preserve the line's shape."""
+    n = len(dates)
+    if threshold >= n or threshold < 3:
+        return dates, quantities
+    x = dates.astype(np.int64).astype(np.float64)
+    y = quantities.astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # Buckets between the fixed end points
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nxt_lo, nxt_hi = hi, max(edges[i + 2] if i + 2 < len(edges) else n, hi + 1)
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        # Twice the triangle area for every candidate in the bucket, in one go
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        keep[i + 1] = a
+    return dates[keep], quantities[keep]
+
+
+def choose_resolution(dates, max_points):
+    """Finest of raw/daily/weekly/monthly that fits in max_points, else LTTB."""
+    if len(dates) <= max_points:
+        return "raw"
+    days = int(dates[-1].astype(np.int64) - dates[0].astype(np.int64)) + 1
+    if days <= max_points:
+        return "daily"
+    if days / 7 <= max_points:
+        return "weekly"
+    if days / 30 <= max_points:
+        return "monthly"
+    return "lttb"
+
+
+def downsample(dates, quantities, resolution="auto", max_points=1000):
+    """Reduces one series for plotting. resolution is one of RESOLUTIONS."""
+    if len(dates) == 0:
+        return dates, quantities
+    if resolution == "auto":
+        resolution = choose_resolution(dates, max_points)
+    if resolution in ("daily", "weekly", "monthly"):
+        return last_per_bucket(dates, quantities, resolution)
+    if resolution == "envelope":
+        return min_max_envelope(dates, quantities, max(max_points // 2, 1))
+    if resolution == "lttb":
+        return lttb(dates, quantities, max_points)
+    return dates, quantities
@@ -0,0 +1,201 @@
+# Daily stock snapshots.
+# StockHistory only stores the absolute quantity at every change, so questions
+# like "total stock on date X" or "stock trend by category" used to mean
+# scanning all of it. These two rollup tables answer them in O(days):
+#   StockDailySnapshot     - quantity of each medicine at the end of each day it changed
+#   CategoryDailySnapshot  - total quantity of each category at the end of each day it changed
+# Both are kept up to date by the add/update/delete paths (record_change and
+# record_removal, run on the same cursor before the commit), and can be rebuilt
+# in bulk from StockHistory with:
+#
+#   python stock_snapshots.py --backfill
+
+import argparse
+import time
+
+
+# --- Incremental Maintenance ---
+def add_category_delta(cursor, category, day, delta):
+    """Moves the category total for day (and any later snapshot days) by delta."""
+    if not delta:
+        return
+    category = category or ''
+    # The day's row starts from the category's last known total before it
+    sql = """
+        INSERT INTO CategoryDailySnapshot (category, snapshot_date, total_quantity)
+        SELECT %s, %s, COALESCE((
+            SELECT total_quantity FROM CategoryDailySnapshot
+            WHERE category = %s AND snapshot_date < %s
+            ORDER BY snapshot_date DESC LIMIT 1
+        ), 0) + %s
+        ON DUPLICATE KEY UPDATE total_quantity = total_quantity + %s
+    """
+    cursor.execute(sql, (category, day, category, day, delta, delta))
+    # Only matters when back-dating a change; normally there are no later days
+    cursor.execute("UPDATE CategoryDailySnapshot SET total_quantity = total_quantity + %s "
+                   "WHERE category = %s AND snapshot_date > %s", (delta, category, day))
+
+
+def record_change(cursor, medicine_id, day, quantity, category, old_quantity=0, old_category=None):
+    """Rolls one medicine change into both snapshot tables.
+
+    old_quantity/old_category describe the medicine before the change
+    (0/None for a new medicine).
+    """
+    if quantity != old_quantity:
+        sql = """
+            INSERT INTO StockDailySnapshot (medicine_id, snapshot_date, quantity) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+        """
+        cursor.execute(sql, (medicine_id, day, quantity))
+    if old_category is not None and (old_category or '') != (category or ''):
+        # Moved to another category: its stock leaves the old one and joins the new one
+        add_category_delta(cursor, old_category, day, -old_quantity)
+        add_category_delta(cursor, category, day, quantity)
+    else:
+        add_category_delta(cursor, category, day, quantity - old_quantity)
+
+
+def record_changes(cursor, day, changes):
+    """Batched record_change for bulk writes.
+
+    changes is a list of (medicine_id, quantity, category, old_quantity, old_category)
+    tuples. Medicine rows go in with one executemany, category totals get one
+    update per category instead of one per medicine.
+    """
+    medicine_rows = [(medicine_id, day, quantity) for medicine_id, quantity, _, old_quantity, _ in changes
+                     if quantity != old_quantity]
+    if medicine_rows:
+        cursor.executemany("""
+            INSERT INTO StockDailySnapshot (medicine_id, snapshot_date, quantity) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+        """, medicine_rows)
+    deltas = {}
+    for _, quantity, category, old_quantity, old_category in changes:
+        if old_category is not None and (old_category or '') != (category or ''):
+            deltas[old_category or ''] = deltas.get(old_category or '', 0) - old_quantity
+            deltas[category or ''] = deltas.get(category or '', 0) + quantity
+        else:
+            deltas[category or ''] = deltas.get(category or '', 0) + quantity - old_quantity
+    for category, delta in deltas.items():
+        add_category_delta(cursor, category, day, delta)
+
+
+def record_removal(cursor, category, quantity, day):
+    """A deleted medicine's stock leaves its category on the day it is deleted.
+
+    Its own StockDailySnapshot rows go with it through ON DELETE CASCADE.
+    """
+    add_category_delta(cursor, category, day, -quantity)
+
+
+# --- Bulk Backfill ---
+def rebuild_snapshots(cursor):
+    """Rebuilds both snapshot tables from StockHistory in a few set-based statements.
+
+    Medicines deleted before the snapshots existed have no history left, so
+    the category totals only cover medicines that still exist.
+    """
+    cursor.execute("DELETE FROM CategoryDailySnapshot")
+    cursor.execute("DELETE FROM StockDailySnapshot")
+    # Last history row of every medicine and day
+    cursor.execute("""
+        INSERT INTO StockDailySnapshot (medicine_id, snapshot_date, quantity)
+        SELECT medicine_id, change_date, quantity FROM (
+            SELECT medicine_id, change_date, quantity,
+                   ROW_NUMBER() OVER (PARTITION BY medicine_id, change_date ORDER BY id DESC) AS row_no
+            FROM StockHistory
+        ) AS last_of_day
+        WHERE row_no = 1
+    """)
+    medicine_days = cursor.rowcount
+    # Day-to-day change of every medicine, summed per category and accumulated over the days
+    cursor.execute("""
+        INSERT INTO CategoryDailySnapshot (category, snapshot_date, total_quantity)
+        SELECT category, snapshot_date, SUM(SUM(delta)) OVER (PARTITION BY category ORDER BY snapshot_date)
+        FROM (
+            SELECT COALESCE(m.category, '') AS category, s.snapshot_date,
+                   s.quantity - COALESCE(LAG(s.quantity) OVER (PARTITION BY s.medicine_id
+                                                               ORDER BY s.snapshot_date), 0) AS delta
+            FROM StockDailySnapshot s
+            JOIN Medicines m ON m.id = s.medicine_id
+        ) AS changes
+        GROUP BY category, snapshot_date
+    """)
+    return medicine_days, cursor.rowcount
+
+
+# --- Reading ---
+def read_category_trend(cursor, start=None, end=None):
+    """Returns {category: (dates, totals)} for the range, starting from each category's level before start."""
+    trend = {}
+    if start is not None:
+        # Level going into the range, so lines do not start at zero
+        cursor.execute("""
+            SELECT c.category, c.total_quantity
+            FROM CategoryDailySnapshot c
+            JOIN (
+                SELECT category, MAX(snapshot_date) AS snapshot_date
+                FROM CategoryDailySnapshot WHERE snapshot_date < %s GROUP BY category
+            ) AS before_start ON before_start.category = c.category AND before_start.snapshot_date = c.snapshot_date
+        """, (start,))
+        for category, total in cursor.fetchall():
+            trend[category] = ([start], [total])
+
+    sql = "SELECT category, snapshot_date, total_quantity FROM CategoryDailySnapshot WHERE 1 = 1"
+    params = []
+    if start is not None:
+        sql += " AND snapshot_date >= %s"
+        params.append(start)
+    if end is not None:
+        sql += " AND snapshot_date <= %s"
+        params.append(end)
+    cursor.execute(sql + " ORDER BY category, snapshot_date", params)
+    for category, day, total in cursor.fetchall():
+        dates, totals = trend.setdefault(category, ([], []))
+        if dates and dates[-1] == day:  # The carried-in level is replaced by the day's own row
+            totals[-1] = total
+        else:
+            dates.append(day)
+            totals.append(total)
+    return trend
+
+
+def read_total_stock_on(cursor, day):
+    """Total stock across all categories at the end of day."""
+    cursor.execute("""
+        SELECT COALESCE(SUM(c.total_quantity), 0)
+        FROM CategoryDailySnapshot c
+        JOIN (
+            SELECT category, MAX(snapshot_date) AS snapshot_date
+            FROM CategoryDailySnapshot WHERE snapshot_date <= %s GROUP BY category
+        ) AS latest ON latest.category = c.category AND latest.snapshot_date = c.snapshot_date
+    """, (day,))
+    return int(cursor.fetchone()[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the daily stock snapshot tables.")
+    parser.add_argument("--backfill", action="store_true", help="rebuild both tables from StockHistory")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+    else:
+        import mysql.connector  # Only the command line talks to the server itself
+
+        from db_config import DB_CONFIG
+
+        connection = mysql.connector.connect(**DB_CONFIG)
+        cursor = connection.cursor()
+        started = time.perf_counter()
+        try:
+            medicine_days, category_days = rebuild_snapshots(cursor)
+            connection.commit()
+        except mysql.connector.Error as err:
+            connection.rollback()
+            raise SystemExit(f"Backfill failed: {err}")
+        finally:
+            cursor.close()
+            connection.close()
+        print(f"Rebuilt {medicine_days} medicine-day and {category_days} category-day snapshots "
+              f"in {time.perf_counter() - started:.1f}s.")
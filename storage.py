@@ -0,0 +1,150 @@
+# Storage backends.
+# main.py reads and writes through here instead of talking to MySQL directly.
+# STORAGE_MODE in db_config.py decides where things go:
+#   "mysql"   - everything goes to the MySQL server, reads on db_worker threads
+#   "sqlite"  - everything stays in a local SQLite file (offline/branch terminals, no server)
+#   "replica" - writes go to MySQL, reads come from a local SQLite copy that
+#               pulls the rows changed on the server in the background
+#
+# Reads are tasks that take (store, cursor), store being mysql_store or
+# sqlite_store, so the same task runs on either. Local reads run on db_worker's
+# SQLite reader threads, each with its own connection to the file, so a big
+# search or forecast never holds up the Tk thread; the Tk thread's connection
+# is only used for writes.
+
+import sqlite3
+
+import mysql.connector
+
+import db_worker
+import instrumentation
+import mysql_store
+import sqlite_store
+from medicine_lots import LotError
+
+MODES = ("mysql", "sqlite", "replica")
+Error = (mysql.connector.Error, sqlite3.Error, LotError)
+
+# --- Storage State ---
+mode = "mysql"
+root = None
+reads = mysql_store  # Backend the reads go to
+writes = mysql_store  # Backend add/update/delete go to
+write_connection = None  # Kept open for the add/update/delete windows
+local_connection = None  # SQLite connection of the Tk thread, for writes (sqlite and replica modes)
+local_path = None
+
+
+def init(tk_root, storage_mode="mysql", local_db_path=None, on_busy_change=None, **db_config):
+    """Opens the backends for the mode. Raises Error if the database cannot be reached."""
+    global mode, root, reads, writes, write_connection, local_connection, local_path
+    if storage_mode not in MODES:
+        raise ValueError(f"STORAGE_MODE must be one of {', '.join(MODES)}, not {storage_mode!r}")
+    mode, root, local_path = storage_mode, tk_root, local_db_path
+    if mode != "sqlite":
+        db_worker.init(root, on_busy_change=on_busy_change, **db_config)
+        write_connection = db_worker.get_connection()
+    if mode != "mysql":
+        local_connection = sqlite_store.connect(local_path)
+        db_worker.init_local(root, lambda: sqlite_store.connect(local_path), on_busy_change=on_busy_change)
+        reads = sqlite_store
+    if mode == "sqlite":
+        write_connection = local_connection
+        writes = sqlite_store
+    if mode == "replica" and sqlite_store.replica_state(local_connection.cursor(), "medicines_mark") is None:
+        # First start: copy the server once before the window shows anything, later pulls are incremental
+        cursor = write_connection.cursor()
+        try:
+            sqlite_store.pull_from_mysql(cursor, local_connection, 0)
+        finally:
+            cursor.close()
+
+
+def has_server():
+    """False for a standalone SQLite terminal, which has no MySQL to run server-only tools against."""
+    return mode != "sqlite"
+
+
+def submit(task, on_done, on_error=None, key=None):
+    """Runs task(store, cursor) on the read backend and calls on_done(result) on the Tk thread.
+
+    on_error(err) is called instead if the task raises a database error. A newer
+    job with the same key supersedes the older one (see db_worker).
+    """
+    if reads is mysql_store:
+        db_worker.submit(lambda cursor: task(mysql_store, cursor), on_done, on_error, key)
+    else:
+        db_worker.submit_local(lambda cursor: task(sqlite_store, cursor), on_done, on_error, key)
+
+
+def cancel(key):
+    """Drops the job running (or queued) under key, its callbacks are never called."""
+    db_worker.cancel(key)
+
+
+def submit_server(task, on_done, on_error=None, key=None):
+    """Runs task(cursor) on a MySQL worker, for the tools that only exist server side."""
+    db_worker.submit(task, on_done, on_error, key)
+
+
+def sync(since, horizon, on_done, on_error=None):
+    """Fetches (mark, changed rows, deleted ids) since the mark in the background.
+
+    A replica pulls from MySQL instead (keeping its own mark) and reports what
+    it copied, so the grid gets the same patches either way.
+    """
+    if mode == "replica":
+        def pull(cursor):
+            # Own SQLite connection, this runs on a worker thread
+            connection = sqlite_store.connect(local_path)
+            try:
+                return sqlite_store.pull_from_mysql(cursor, connection, horizon)
+            finally:
+                connection.close()
+        db_worker.submit(pull, on_done, on_error, key="sync")
+    else:
+        submit(lambda store, cursor: store.read_changes(cursor, since, horizon), on_done, on_error, key="sync")
+
+
+# --- Writes ---
+# Each runs as one transaction on the write backend and returns the fresh
+# grid row. A replica copies it straight in, so the local reads see it before
+# the next pull.
+def read_back(medicine_id, horizon):
+    cursor = instrumentation.timed_cursor(write_connection.cursor())
+    try:
+        row = writes.read_medicine(cursor, medicine_id, horizon)
+    finally:
+        cursor.close()
+    if mode == "replica" and row is not None:
+        sqlite_store.run_transaction(local_connection, lambda cursor: sqlite_store.store_rows(cursor, [row]))
+    return row
+
+
+def add_medicine(values, horizon):
+    medicine_id, = writes.run_transaction(write_connection, lambda cursor: writes.add_medicine(cursor, *values))
+    return read_back(medicine_id, horizon)
+
+
+def update_medicine(medicine_id, values, original_quantity, original_category, reorder_point, horizon):
+    """reorder_point is the medicine's own reorder point, None to follow its category."""
+    writes.run_transaction(
+        write_connection,
+        lambda cursor: writes.update_medicine(cursor, medicine_id, *values, original_quantity, original_category),
+        lambda cursor: writes.set_reorder_point(cursor, medicine_id, reorder_point))
+    return read_back(medicine_id, horizon)
+
+
+def delete_medicine(medicine_id, category, quantity):
+    writes.run_transaction(write_connection,
+                           lambda cursor: writes.delete_medicine(cursor, medicine_id, category, quantity))
+    if mode == "replica":
+        sqlite_store.run_transaction(local_connection,
+                                     lambda cursor: sqlite_store.remove_rows(cursor, [medicine_id]))
+
+
+def close():
+    db_worker.shutdown()
+    for connection in (write_connection, local_connection):
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,180 @@
+# Timeline chart.
+# The stock timeline used to be drawn with pyplot on the Tk thread and shown
+# with a blocking plt.show(), and every plot rebuilt everything. Now:
+#   - prepare() reads and downsamples the history as a storage task (on a
+#     db_worker thread with MySQL); only finished series reach the Tk thread
+#   - show() draws them on a FigureCanvasTkAgg embedded in a Toplevel that
+#     stays open; when the selection changes only the data of the line artists
+#     is swapped (lines are added for new medicines, removed for dropped ones)
+#   - downsampled series are kept in an LRU cache keyed by (medicine id, id of
+#     its last StockHistory row, range, resolution). Toggling a medicine in the
+#     selection window then costs one small query for the last history ids and
+#     a redraw; a new history row changes the key, so a stale line is never shown
+#
+# export_png() draws the same chart with the Agg backend and no Tk, for batch
+# jobs:  python -m inventory_cli chart 12 15 --output stock.png
+#
+# show_trend() puts the category trend (stock per category from the daily
+# snapshots) in a window of its own, embedded the same way.
+#
+# matplotlib is only imported once a chart is drawn.
+
+import threading
+from collections import OrderedDict
+
+import instrumentation
+import inventory_core
+import stock_history
+
+GRAPH_SIZE = (12, 7)  # Figure size in inches
+DPI = 100  # matplotlib's default figure dpi
+MAX_POINTS = GRAPH_SIZE[0] * DPI  # About one point per horizontal pixel is all that can be seen
+MARKER_LIMIT = 200  # Lines with more points than this are drawn without markers
+CACHE_LIMIT = 256  # Downsampled series kept
+
+# --- Chart State ---
+cache = OrderedDict()  # (medicine id, last history id, start, end, resolution) -> (dates, quantities)
+cache_lock = threading.Lock()  # prepare() runs on worker threads
+window = None
+canvas = None
+axes = None
+lines = {}  # medicine id -> Line2D currently on the chart
+
+
+# --- Data ---
+def prepare(store, cursor, medicine_ids, start=None, end=None, resolution="auto"):
+    """{medicine id: (dates, quantities)} ready to plot, for the medicines that have history.
+
+    Only the medicines missing from the cache (or with newer history) are read.
+    """
+    last_ids = store.read_last_history_ids(cursor, medicine_ids)
+    keys = {medicine_id: (medicine_id, last_ids[medicine_id], start, end, resolution)
+            for medicine_id in medicine_ids if medicine_id in last_ids}
+    series = {}
+    with cache_lock:
+        for medicine_id, key in keys.items():
+            if key in cache:
+                cache.move_to_end(key)
+                series[medicine_id] = cache[key]
+    missing = [medicine_id for medicine_id in keys if medicine_id not in series]
+    if missing:
+        fresh = inventory_core.stock_history(store, cursor, missing, start, end)
+        with cache_lock:
+            for medicine_id, (dates, quantities) in fresh.items():
+                series[medicine_id] = cache[keys[medicine_id]] = stock_history.downsample(dates, quantities,
+                                                                                          resolution, MAX_POINTS)
+            while len(cache) > CACHE_LIMIT:
+                cache.popitem(last=False)
+    # In the order asked for, so the legend follows the selection
+    return {medicine_id: series[medicine_id] for medicine_id in medicine_ids if medicine_id in series}
+
+
+# --- Drawing ---
+def new_axes(figure, title='Medicine Stock Quantity Over Time', ylabel='Stock Quantity'):
+    import matplotlib.dates as mdates
+
+    ax = figure.add_subplot()
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel('Date')
+    ax.set_title(title)
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+    ax.tick_params(axis='x', labelrotation=30)  # Kept for ticks made later, unlike autofmt_xdate()
+    return ax
+
+
+def update_lines(ax, drawn, series, names):
+    """Makes the lines on ax (drawn: medicine id -> line) show series, reusing the lines already there."""
+    for medicine_id in [medicine_id for medicine_id in drawn if medicine_id not in series]:
+        drawn.pop(medicine_id).remove()
+    for medicine_id, (dates, quantities) in series.items():
+        line = drawn.get(medicine_id)
+        if line is None:
+            line, = ax.plot(dates, quantities, linestyle='-', label=names.get(medicine_id, str(medicine_id)))
+            drawn[medicine_id] = line
+        else:
+            line.set_data(dates, quantities)
+        line.set_marker('o' if len(dates) <= MARKER_LIMIT else '')
+    ax.relim()
+    ax.autoscale_view()
+    if drawn:
+        shown = [drawn[medicine_id] for medicine_id in series]
+        ax.legend(shown, [line.get_label() for line in shown])
+    elif ax.get_legend() is not None:
+        ax.get_legend().remove()
+
+
+def is_open():
+    return window is not None and window.winfo_exists()
+
+
+def embed(parent, title):
+    """A Toplevel holding an empty figure on a FigureCanvasTkAgg with its toolbar; returns (window, figure, canvas)."""
+    import tkinter as tk
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+    from matplotlib.figure import Figure
+
+    toplevel = tk.Toplevel(parent)
+    toplevel.title(title)
+    figure = Figure(figsize=GRAPH_SIZE, dpi=DPI)
+    figure_canvas = FigureCanvasTkAgg(figure, master=toplevel)
+    NavigationToolbar2Tk(figure_canvas, toplevel).update()
+    figure_canvas.get_tk_widget().pack(fill="both", expand=True)
+    return toplevel, figure, figure_canvas
+
+
+@instrumentation.timed("ui", "graph.plot_timeline")
+def show(parent, series, names, on_close=None):
+    """Shows series ({medicine id: (dates, quantities)}) in the chart window, opening it if needed.
+
+    names maps medicine ids to the names used in the legend. on_close is
+    called when the window is closed (default: just close()).
+    """
+    global window, canvas, axes
+    if not is_open():
+        window, figure, canvas = embed(parent, "Medicine Stock Over Time")
+        axes = new_axes(figure)
+        window.protocol("WM_DELETE_WINDOW", on_close or close)
+        lines.clear()
+    update_lines(axes, lines, series, names)
+    canvas.draw_idle()
+    window.lift()
+
+
+def close():
+    global window, canvas, axes
+    if window is not None:
+        window.destroy()
+    window = canvas = axes = None
+    lines.clear()
+
+
+@instrumentation.timed("ui", "graph.plot_category_trend")
+def show_trend(parent, trend):
+    """Shows trend ({category: (dates, totals)}) in a new window."""
+    _, figure, trend_canvas = embed(parent, "Stock Trend by Category")
+    ax = new_axes(figure, 'Stock Trend by Category', 'Total Stock Quantity')
+    for category, (dates, totals) in sorted(trend.items()):
+        # Totals hold until the next day something changed, so draw them as steps
+        ax.step(dates, totals, where='post', label=category or "(no category)")
+    ax.legend()
+    figure.tight_layout()
+    trend_canvas.draw_idle()
+
+
+# --- Batch Export ---
+def export_png(store, cursor, medicine_ids, path, start=None, end=None, resolution="auto"):
+    """Draws the chart of medicine_ids to a PNG file (path or a binary file object); returns the lines drawn."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    series = prepare(store, cursor, medicine_ids, start, end, resolution)
+    names = {row[0]: row[1] for row in store.read_medicines(cursor, list(series), 0)}
+    figure = Figure(figsize=GRAPH_SIZE, dpi=DPI)
+    FigureCanvasAgg(figure)
+    ax = new_axes(figure)
+    update_lines(ax, {}, series, names)
+    figure.tight_layout()
+    figure.savefig(path, format="png")
+    return len(series)